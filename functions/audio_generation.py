@@ -5,11 +5,12 @@ import json
 import re
 import gc
 import traceback
+import shutil
 import sys
+import queue
+import threading
 from typing import List, Dict, Any, Optional, Tuple
 
-import streamlit as st # Streamlit 캐시 기능을 위해 추가
-
 try:
     # 1. ffmpeg.exe 파일이 있는 폴더 경로를 지정하세요.
     #    사용자님이 알려주신 경로를 사용합니다.
@@ -40,10 +41,15 @@ try:
     import torch
     import torchaudio
     import whisper
+    import numpy as np
     import librosa
     import librosa.effects
     import soundfile as sf
-    from rapidfuzz import process, fuzz
+    from functions import text_alignment # rapidfuzz + numpy 기반 단어-텍스트 정렬 (6단계 자막과 공용)
+    from functions import tts_cache
+    from functions import whisper_backend # Whisper 런타임 (openai-whisper / faster-whisper) 및 'auto' 모델 크기
+    from functions import model_registry # 모델 지연 로드 + LRU 메모리 예산 (Streamlit/헤드리스 공용)
+    from functions import time_stretch # 속도 조절 백엔드 (librosa / wsola / ffmpeg atempo)
     from zonos.model import Zonos
     from zonos.conditioning import make_cond_dict
     # phonemizer is needed by Zonos implicitly
@@ -56,6 +62,12 @@ except ImportError as e:
     # Raise an error or handle it gracefully if used within the Streamlit app
     # For now, functions will check this flag.
 
+# --- 선택: 강제 정렬 타임스탬프 백엔드 (torchaudio >= 2.1의 MMS_FA 필요) ---
+try:
+    from functions import forced_alignment
+except Exception:
+    forced_alignment = None
+
 # --- eSpeak NG 경로 설정 (Helper Function) ---
 # This function should be called once when the module is potentially used.
 # It's better than running at import time.
@@ -172,73 +184,137 @@ def preprocess_text_simple(original_text):
     processed_text = processed_text.replace(" '", "'").replace("' ", "'")
     return processed_text
 
-# --- Streamlit 캐시를 사용한 모델 로딩 함수 ---
-@st.cache_resource
-def cached_load_zonos_model(model_name: str, device: torch.device) -> Zonos:
-    """Caches and loads the Zonos TTS model."""
-    print(f"Cache miss: Loading Zonos model: {model_name} to {device}...")
-    _ensure_espeak_path() # eSpeak 경로 설정은 모델 로드 전에 필요
-    model = Zonos.from_pretrained(model_name, device=device)
-    print("Zonos model loaded and cached.")
-    return model
-
-@st.cache_resource
-def cached_load_whisper_model(model_size: str, device: torch.device) -> whisper.Whisper:
-    """Caches and loads the Whisper model."""
-    print(f"Cache miss: Loading Whisper model: {model_size} to {device}...")
-    model = whisper.load_model(model_size, device=device)
-    print("Whisper model loaded and cached.")
-    return model
-
-# Zonos TTS 오디오 생성 함수
-def generate_zonos_audio(
-    text: str,
-    output_path: str,
+# --- 모델 로딩 함수 (functions/model_registry.py: 프로세스 단위 보관, 헤드리스 실행에서도 재사용) ---
+def cached_load_zonos_model(model_name: str, device: torch.device, precision: str = "fp32") -> Zonos:
+    """Loads the Zonos TTS model through the process-wide model registry."""
+    def load():
+        _ensure_espeak_path() # eSpeak 경로 설정은 모델 로드 전에 필요
+        return model_registry.quantize_model(Zonos.from_pretrained(model_name, device=device), precision, device)
+    return model_registry.registry.get(("zonos", model_name, str(device), precision), load)
+
+def cached_load_alignment_model(device: torch.device) -> Any:
+    """Loads the forced alignment (MMS_FA) model through the model registry."""
+    return model_registry.registry.get(("forced_alignment", "MMS_FA", str(device), "fp32"), lambda: forced_alignment.load_alignment_model(device))
+
+def cached_load_whisper_model(model_size: str, device: torch.device, precision: str = "fp32", runtime: str = "openai",
+                              compute_type: Optional[str] = None) -> Any:
+    """Loads the Whisper model (openai-whisper or faster-whisper) through the model registry."""
+    if runtime == "faster": # CTranslate2 모델은 자체 정밀도(compute_type)를 사용하며 torch 메모리 예산에는 잡히지 않음
+        compute_type = compute_type or whisper_backend.default_compute_type(device)
+        return model_registry.registry.get(("faster_whisper", model_size, str(device), compute_type),
+                                           lambda: whisper_backend.load_model(model_size, device, "faster", compute_type))
+    return model_registry.registry.get(("whisper", model_size, str(device), precision),
+                                       lambda: model_registry.quantize_model(whisper_backend.load_model(model_size, device), precision, device))
+
+# Zonos TTS 오디오 생성 함수 (배치)
+def _make_zonos_cond_dict(texts: List[str], speaker_embed: Any, config: Dict[str, Any]) -> Dict[str, Any]:
+    """문장 N개의 conditioning dict. 텍스트(espeak)는 배치, 스피커/감정 등은 배치 1로 두어 prefix conditioner가 확장합니다."""
+    cond_dict_params = {
+        "text": texts[0],
+        "speaker": speaker_embed,
+        "language": config.get("language", "ko")
+    }
+    if config.get("emotion"): cond_dict_params["emotion"] = config["emotion"]
+    if config.get("speaking_rate"): cond_dict_params["speaking_rate"] = float(config["speaking_rate"])
+    if config.get("pitch_std"): cond_dict_params["pitch_std"] = float(config["pitch_std"])
+    cond_dict = make_cond_dict(**cond_dict_params)
+    cond_dict["espeak"] = (list(texts), [cond_dict_params["language"]] * len(texts))
+    return cond_dict
+
+
+def _valid_code_frames(codes: Any) -> List[int]:
+    """배치 생성 결과에서 문장별 유효 프레임 수. EOS 이후 프레임은 모든 코드북이 0으로 채워집니다."""
+    nonzero = (codes != 0).any(dim=1) # (batch, frames)
+    lengths = []
+    for row in nonzero:
+        idx = torch.nonzero(row).flatten()
+        lengths.append(int(idx[-1].item()) + 1 if idx.numel() else 0)
+    return lengths
+
+
+def synthesize_zonos_batch(
+    texts: List[str],
     zonos_model: Any, # Type hint for Zonos model object
     speaker_embed: Any, # Type hint for speaker embedding tensor
     config: Dict[str, Any] # TTS configuration dictionary
-    ) -> Tuple[bool, Optional[str], Optional[int]]:
+    ) -> Tuple[List[Optional[Any]], Optional[int]]:
     """
-    Generates TTS audio using the Zonos model and saves it.
+    Generates TTS audio for several sentences in one padded Zonos batch, in memory.
+    conditioning/생성/디코딩을 배치당 한 번 수행하고, 디코딩 결과를 문장별 유효 프레임 길이로 자른
+    모노 float32 배열 목록(실패한 문장은 None)과 샘플레이트를 반환합니다.
     """
     if not _libraries_available:
         print("Error: Required libraries not available for Zonos TTS.", file=sys.stderr)
-        return False, None, None
+        return [None] * len(texts), None
     try:
-        cond_dict_params = {
-            "text": text,
-            "speaker": speaker_embed,
-            "language": config.get("language", "ko")
-        }
-        if config.get("emotion"): cond_dict_params["emotion"] = config["emotion"]
-        if config.get("speaking_rate"): cond_dict_params["speaking_rate"] = float(config["speaking_rate"])
-        if config.get("pitch_std"): cond_dict_params["pitch_std"] = float(config["pitch_std"])
-        cond_dict = make_cond_dict(**cond_dict_params)
-        conditioning = zonos_model.prepare_conditioning(cond_dict)
-        print(f"  Generating Zonos audio for: '{text[:50]}...'")
+        conditioning = zonos_model.prepare_conditioning(_make_zonos_cond_dict(texts, speaker_embed, config))
+        print(f"  Generating Zonos audio for {len(texts)} sentence(s): '{texts[0][:50]}...'")
         codes = zonos_model.generate(
             conditioning,
+            batch_size=len(texts),
             disable_torch_compile=config.get("disable_torch_compile", True)
         )
+        frame_lengths = _valid_code_frames(codes)
         wavs = zonos_model.autoencoder.decode(codes).cpu()
         output_sampling_rate = zonos_model.autoencoder.sampling_rate
-        torchaudio.save(output_path, wavs[0], output_sampling_rate)
-        print(f"  Zonos TTS audio generated: {output_path}")
-        del codes, wavs, conditioning, cond_dict
-        if torch.cuda.is_available():
-             torch.cuda.empty_cache()
-        gc.collect()
-        return True, output_path, output_sampling_rate
+        samples_per_frame = wavs.shape[-1] / max(1, codes.shape[-1])
+        arrays: List[Optional[Any]] = []
+        for i, text in enumerate(texts):
+            wav = wavs[i][0, :int(round(frame_lengths[i] * samples_per_frame))].numpy().astype(np.float32)
+            if wav.shape[-1] == 0: print(f"  Zonos TTS produced empty audio: '{text[:40]}'", file=sys.stderr); wav = None
+            arrays.append(wav)
+        return arrays, output_sampling_rate
     except Exception as e:
-        print(f"Error generating Zonos TTS for {output_path}: {e}", file=sys.stderr)
+        print(f"Error generating Zonos TTS batch ({len(texts)} sentence(s)): {e}", file=sys.stderr)
         traceback.print_exc()
-        if os.path.exists(output_path):
-            try: os.remove(output_path)
-            except OSError: pass
-        return False, None, None
+        if len(texts) > 1: # 배치 실패(OOM 등) 시 문장 단위로 재시도
+            print("  Retrying batch one sentence at a time...")
+            if torch.cuda.is_available(): torch.cuda.empty_cache()
+            singles = [synthesize_zonos_batch([t], zonos_model, speaker_embed, config) for t in texts]
+            return [arrays[0] for arrays, _ in singles], next((sr for _, sr in singles if sr), None)
+        return [None], None
+
 
+def generate_zonos_audio_batch(
+    texts: List[str],
+    output_paths: List[str],
+    zonos_model: Any, # Type hint for Zonos model object
+    speaker_embed: Any, # Type hint for speaker embedding tensor
+    config: Dict[str, Any] # TTS configuration dictionary
+    ) -> List[Tuple[bool, Optional[str], Optional[int]]]:
+    """Generates TTS audio for several sentences in one Zonos batch and saves one file per sentence."""
+    arrays, output_sampling_rate = synthesize_zonos_batch(texts, zonos_model, speaker_embed, config)
+    results = []
+    for wav, output_path in zip(arrays, output_paths):
+        if wav is None: results.append((False, None, None)); continue
+        try:
+            sf.write(output_path, wav, output_sampling_rate)
+            print(f"  Zonos TTS audio generated: {output_path}")
+            results.append((True, output_path, output_sampling_rate))
+        except Exception as e:
+            print(f"Error saving Zonos TTS audio {output_path}: {e}", file=sys.stderr); results.append((False, None, None))
+    return results
+
+
+def generate_zonos_audio(
+    text: str,
+    output_path: str,
+    zonos_model: Any, # Type hint for Zonos model object
+    speaker_embed: Any, # Type hint for speaker embedding tensor
+    config: Dict[str, Any] # TTS configuration dictionary
+    ) -> Tuple[bool, Optional[str], Optional[int]]:
+    """
+    Generates TTS audio using the Zonos model and saves it.
+    """
+    return generate_zonos_audio_batch([text], [output_path], zonos_model, speaker_embed, config)[0]
 
-def speed_up_audio(input_path: str, output_path: str, speed_factor: float) -> bool:
+
+def time_stretch_array(y: Any, speed_factor: float, sr: int, backend: str = "librosa") -> Any:
+    """In-memory time stretch (pitch preserved) of a mono float32 array."""
+    return time_stretch.stretch(y, speed_factor, sr, backend)
+
+
+def speed_up_audio(input_path: str, output_path: str, speed_factor: float, backend: str = "librosa") -> bool:
     """Loads an audio file, changes its speed, and saves to a new file."""
     if not _libraries_available:
         print("Error: Librosa/Soundfile not available for audio speed up.", file=sys.stderr)
@@ -261,7 +337,7 @@ def speed_up_audio(input_path: str, output_path: str, speed_factor: float) -> bo
     print(f"  Speeding up audio: {os.path.basename(input_path)} by {speed_factor}x")
     try:
         y, sr = librosa.load(input_path, sr=None)
-        y_fast = librosa.effects.time_stretch(y, rate=speed_factor)
+        y_fast = time_stretch_array(y, speed_factor, sr, backend)
         sf.write(output_path, y_fast, sr)
         print(f"  Sped-up audio saved: {os.path.basename(output_path)}")
         return True
@@ -286,45 +362,29 @@ def get_audio_duration(file_path: str) -> float:
         return 0.0
 
 # Whisper 타임스탬프 추출 함수
+WHISPER_SAMPLE_RATE = 16000 # whisper.load_audio 출력 샘플레이트
+
 def extract_whisper_timestamps(
     audio_path: str,
     whisper_model: Any, # Type hint for Whisper model
-    language: str
+    language: str,
+    audio: Optional[Any] = None # 메모리의 16kHz 모노 float32 배열 (있으면 파일을 다시 읽지 않음)
     ) -> List[Dict[str, Any]]:
     """
     Runs Whisper transcription to get word-level timestamps.
     """
     if not _libraries_available: return []
-    word_timestamps = []
-    if not os.path.exists(audio_path):
+    if audio is None and not os.path.exists(audio_path):
         print(f"  Whisper Error: Audio file not found at {audio_path}", file=sys.stderr)
         return []
-    duration = get_audio_duration(audio_path)
+    duration = len(audio) / WHISPER_SAMPLE_RATE if audio is not None else get_audio_duration(audio_path)
     if duration <= 0.1:
         print(f"  Skipping Whisper for short/invalid audio: {audio_path} ({duration:.3f}s)")
         return []
     print(f"  Running Whisper on {os.path.basename(audio_path)}...")
     try:
-        result = whisper_model.transcribe(audio_path, language=language, word_timestamps=True)
-        # print("  Whisper Raw Output (Word Timestamps):") # Debug output - 주석 처리 (너무 길어질 수 있음)
-        for i, seg in enumerate(result.get('segments', [])):
-            # print(f"      Segment {i}:") # Debug - 주석 처리
-            for word_info in seg.get('words', []):
-                word_text = word_info.get('word', word_info.get('text', '')).strip()
-                start_time = word_info.get('start')
-                end_time = word_info.get('end')
-                confidence = word_info.get('probability', word_info.get('confidence'))
-                # print(f"        - '{word_text}' ({start_time:.3f}s - {end_time:.3f}s)") # Debug - 주석 처리
-                if word_text and start_time is not None and end_time is not None:
-                    word_timestamps.append({
-                        "word": word_text,
-                        "start": round(start_time, 3),
-                        "end": round(end_time, 3),
-                        "duration": round(end_time - start_time, 3),
-                        "confidence": round(confidence, 3) if confidence is not None else 0.0
-                    })
+        word_timestamps = whisper_backend.transcribe_words(whisper_model, audio if audio is not None else audio_path, language)
         print(f"  Whisper extracted {len(word_timestamps)} words total.")
-        del result
         if torch.cuda.is_available():
              torch.cuda.empty_cache()
         gc.collect()
@@ -335,89 +395,111 @@ def extract_whisper_timestamps(
         return []
 
 
-# 순차 단어-청크 매칭 함수
-def align_words_to_chunks_sequential(
-    word_timestamps: List[Dict[str, Any]],
-    matched_chunks_info: List[Dict[str, Any]],
-    config: Dict[str, Any]
+def extract_whisper_timestamps_episode(
+    audio_paths: List[str],
+    whisper_model: Any, # Type hint for Whisper model
+    language: str,
+    gap_seconds: float = 0.5,
+    audio_arrays: Optional[List[Optional[Any]]] = None # 문장별 메모리 16kHz 배열 (None 항목은 파일에서 로드)
     ) -> List[List[Dict[str, Any]]]:
     """
-    Assigns Whisper word timestamps to chunks using sequential fuzzy matching.
+    Runs Whisper once over all sentence audio and splits the words back per sentence.
+    문장 WAV를 gap_seconds 무음을 사이에 두고 하나의 16kHz 버퍼로 이어 붙여 한 번만 전사하고,
+    단어 중심 시각이 속한 문장의 시작 오프셋을 빼서 문장 내 상대 시간으로 되돌립니다.
     """
-    if not word_timestamps or not matched_chunks_info:
-        return [[] for _ in matched_chunks_info]
-    sequential_match_threshold = config.get('sequential_match_threshold', 90)
-    slip_lookahead = config.get('slip_lookahead', 2)
-    print(f"  Assigning {len(word_timestamps)} words to {len(matched_chunks_info)} matched chunks (Sequential Alignment)...")
-    word_assignments = [[] for _ in matched_chunks_info]
-    word_ptr = 0
-    chunk_ptr = 0
-    token_ptr = 0
-    # print("    --- Word Assignment Log ---") # 로그가 너무 길어질 수 있어 주석 처리
-    while word_ptr < len(word_timestamps) and chunk_ptr < len(matched_chunks_info):
-        word_info = word_timestamps[word_ptr]
-        whisper_word = word_info["word"].lower().strip()
-        if not whisper_word:
-            word_ptr += 1
-            continue
-        current_chunk_tokens = matched_chunks_info[chunk_ptr]["tokens"]
-        if token_ptr >= len(current_chunk_tokens):
-            # print(f"    Chunk {chunk_ptr} ended. Moving to next chunk.")
-            chunk_ptr += 1
-            token_ptr = 0
-            continue
-        chunk_token = current_chunk_tokens[token_ptr].lower().strip()
-        if not chunk_token:
-            token_ptr += 1
-            continue
-        similarity = fuzz.ratio(whisper_word, chunk_token)
-        if similarity >= sequential_match_threshold:
-            # print(f"    [Direct Match] Whisper:'{word_info['word']}' ({word_ptr}) -> Chunk {chunk_ptr}, Token:'{current_chunk_tokens[token_ptr]}' ({token_ptr}), Score:{similarity:.1f}")
-            word_assignments[chunk_ptr].append(word_info)
-            word_ptr += 1
-            token_ptr += 1
-            continue
-        found_slip_match = False
-        for lookahead in range(1, slip_lookahead + 1):
-            lookahead_token_idx = token_ptr + lookahead
-            if lookahead_token_idx < len(current_chunk_tokens):
-                lookahead_chunk_token = current_chunk_tokens[lookahead_token_idx].lower().strip()
-                if not lookahead_chunk_token: continue
-                similarity = fuzz.ratio(whisper_word, lookahead_chunk_token)
-                if similarity >= sequential_match_threshold:
-                    # print(f"    [Slip Match] Whisper:'{word_info['word']}' ({word_ptr}) -> Chunk {chunk_ptr}, Token:'{current_chunk_tokens[lookahead_token_idx]}' ({lookahead_token_idx}). Skipped {lookahead} chunk token(s). Score:{similarity:.1f}")
-                    word_assignments[chunk_ptr].append(word_info)
-                    word_ptr += 1
-                    token_ptr = lookahead_token_idx + 1
-                    found_slip_match = True
-                    break
-        if found_slip_match: continue
-        next_chunk_ptr = chunk_ptr + 1
-        if next_chunk_ptr < len(matched_chunks_info):
-            next_chunk_tokens = matched_chunks_info[next_chunk_ptr]["tokens"]
-            if next_chunk_tokens:
-                next_chunk_first_token = next_chunk_tokens[0].lower().strip()
-                if next_chunk_first_token:
-                    similarity = fuzz.ratio(whisper_word, next_chunk_first_token)
-                    if similarity >= sequential_match_threshold:
-                        # print(f"    [Next Chunk Match] Whisper:'{word_info['word']}' ({word_ptr}) matches start of Chunk {next_chunk_ptr} ('{next_chunk_tokens[0]}'). Score:{similarity:.1f}. Moving to next chunk.")
-                        chunk_ptr = next_chunk_ptr
-                        token_ptr = 0
-                        continue
-        # print(f"    [Fallback] Whisper:'{word_info['word']}' ({word_ptr}) failed to match Chunk {chunk_ptr}, Token:'{chunk_token}' ({token_ptr}) or lookahead/next chunk. Assigning to current chunk {chunk_ptr} and advancing Whisper word.")
-        word_assignments[chunk_ptr].append(word_info)
-        word_ptr += 1
-    if word_ptr < len(word_timestamps):
-        last_assigned_chunk_idx = min(chunk_ptr, len(matched_chunks_info) - 1)
-        if last_assigned_chunk_idx < 0: last_assigned_chunk_idx = 0
-        # print(f"    Assigning remaining {len(word_timestamps) - word_ptr} Whisper words to the last processed chunk index {last_assigned_chunk_idx}.")
-        for i in range(word_ptr, len(word_timestamps)):
-             if last_assigned_chunk_idx < len(word_assignments):
-                 word_assignments[last_assigned_chunk_idx].append(word_timestamps[i])
-             else:
-                 print(f"      Error: Cannot assign remaining words, invalid chunk index {last_assigned_chunk_idx}", file=sys.stderr)
-    # print("    --- Word Assignment Log End ---")
-    return word_assignments
+    if not _libraries_available: return [[] for _ in audio_paths]
+    buffers, offsets, durations = [], [], []
+    gap = np.zeros(int(gap_seconds * WHISPER_SAMPLE_RATE), dtype=np.float32)
+    cursor = 0
+    for i, audio_path in enumerate(audio_paths):
+        in_memory = audio_arrays[i] if audio_arrays is not None else None
+        try: audio = in_memory if in_memory is not None else whisper.load_audio(audio_path)
+        except Exception as e:
+            print(f"  Whisper Error: Failed to load {audio_path}: {e}", file=sys.stderr); audio = np.zeros(0, dtype=np.float32)
+        offsets.append(cursor / WHISPER_SAMPLE_RATE); durations.append(len(audio) / WHISPER_SAMPLE_RATE)
+        buffers.extend([audio, gap]); cursor += len(audio) + len(gap)
+    print(f"\n[Whisper] Transcribing {len(audio_paths)} sentence(s) as one episode buffer ({cursor / WHISPER_SAMPLE_RATE:.1f}s)...")
+    try:
+        words = whisper_backend.transcribe_words(whisper_model, np.concatenate(buffers), language)
+    except Exception as e:
+        print(f"  Whisper error on episode buffer: {e}. Falling back to per-sentence transcription.", file=sys.stderr)
+        traceback.print_exc()
+        return [extract_whisper_timestamps(audio_path, whisper_model, language, audio=audio_arrays[i] if audio_arrays is not None else None)
+                for i, audio_path in enumerate(audio_paths)]
+
+    per_sentence: List[List[Dict[str, Any]]] = [[] for _ in audio_paths]
+    sentence_starts = np.asarray(offsets)
+    for word in words:
+        idx = max(0, int(np.searchsorted(sentence_starts, (word["start"] + word["end"]) / 2, side='right')) - 1)
+        offset, duration = offsets[idx], durations[idx]
+        start = min(max(word["start"] - offset, 0.0), duration); end = min(max(word["end"] - offset, start), duration)
+        per_sentence[idx].append({**word, "start": round(start, 3), "end": round(end, 3), "duration": round(end - start, 3)})
+    print(f"  Whisper extracted {len(words)} words total ({', '.join(str(len(w)) for w in per_sentence)} per sentence).")
+    if torch.cuda.is_available(): torch.cuda.empty_cache()
+    gc.collect()
+    return per_sentence
+
+
+# 문장 최종 오디오 (캐시 복사 또는 속도 조절 + 길이 측정) - 파이프라인 워커 스레드에서 실행
+def finalize_sentence_audio(job: Dict[str, Any], speed_factor: float, backend: str = "librosa", defer_stretch: bool = False) -> None:
+    """
+    job에 final_audio_path / final_duration / ok를 기록합니다.
+    defer_stretch: time_stretch_scope='episode'. 원래 속도 배열을 job["unstretched"]에 남기고 기록하지 않습니다
+    (속도 조절은 파이프라인 후 stretch_episode_audio에서 한 번, 타임스탬프는 원래 속도 기준으로 구한 뒤 환산).
+    """
+    raw_audio_path = job["raw_audio_path"]; job["ok"] = False
+    label = f"[Sentence {job['number']} ({job['sentence_id']})]"
+    cached = job["cached"]
+    if cached: # 캐시 적중: TTS/속도 조절/타임스탬프 생략
+        final_audio_path = job["fast_audio_path"] if abs(speed_factor - 1.0) > 1e-6 else raw_audio_path
+        try: shutil.copy2(cached["wav_path"], final_audio_path)
+        except OSError as e: print(f"  {label} Error copying cached audio: {e}", file=sys.stderr); return
+        final_duration = cached["duration"]; job["words"] = cached["words"]
+        print(f"  {label} Sentence cache hit: {os.path.basename(final_audio_path)} ({final_duration:.3f}s, {len(cached['words'])} words)")
+    elif job.get("audio") is not None: # 메모리 경로: 속도 조절 -> 최종 WAV 1회 기록, 길이는 샘플 수로 계산
+        y = job.pop("audio"); sr = job["sample_rate"]
+        final_audio_path = raw_audio_path
+        if defer_stretch and abs(speed_factor - 1.0) > 1e-6:
+            job["unstretched"] = y; final_audio_path = job["fast_audio_path"] # 파일은 stretch_episode_audio가 기록
+        else:
+            if abs(speed_factor - 1.0) > 1e-6:
+                try: y = time_stretch_array(y, speed_factor, sr, backend); final_audio_path = job["fast_audio_path"]
+                except Exception as e: print(f"  {label} Warning: Failed to speed up audio, using original: {e}", file=sys.stderr)
+            try: sf.write(final_audio_path, y, sr)
+            except Exception as e: print(f"  {label} Error writing final audio: {e}", file=sys.stderr); return
+        final_duration = len(y) / sr
+        job["audio_16k"] = y if sr == WHISPER_SAMPLE_RATE else librosa.resample(y, orig_sr=sr, target_sr=WHISPER_SAMPLE_RATE) # ASR 입력
+        print(f"  {label} {'Unstretched' if 'unstretched' in job else 'Final'} audio: {os.path.basename(final_audio_path)} ({final_duration:.3f}s)")
+    else:
+        if not job["tts_success"]: print(f"  {label} TTS failed, skipping sentence.", file=sys.stderr); return
+        final_audio_path = raw_audio_path
+        if abs(speed_factor - 1.0) > 1e-6 and os.path.exists(raw_audio_path): # 속도 변경 필요시
+            if speed_up_audio(raw_audio_path, job["fast_audio_path"], speed_factor, backend): final_audio_path = job["fast_audio_path"]
+            else: print(f"  {label} Warning: Failed to speed up audio, using original.", file=sys.stderr)
+        final_duration = get_audio_duration(final_audio_path)
+        if final_duration <= 0: print(f"  {label} Warning: Final audio has zero duration: {os.path.basename(final_audio_path)}", file=sys.stderr)
+        print(f"  {label} Final audio: {os.path.basename(final_audio_path)} ({final_duration:.3f}s)")
+    job["final_audio_path"] = final_audio_path; job["final_duration"] = final_duration; job["ok"] = True
+
+
+# 에피소드 단위 속도 조절 (time_stretch_scope='episode') - 파이프라인 종료 후 메인 스레드에서 실행
+def stretch_episode_audio(jobs: List[Dict[str, Any]], speed_factor: float, backend: str) -> None:
+    """
+    원래 속도 문장 배열들을 이어 붙여 한 번만 속도 조절한 뒤 문장별 최종 WAV로 나눠 기록합니다.
+    job["time_scale"]에 단어 타임스탬프 환산 비율을 남깁니다. 실패 시 원래 속도 WAV를 사용합니다 (캐시 제외).
+    """
+    sr = jobs[0]["sample_rate"]; arrays = [job.pop("unstretched") for job in jobs]
+    print(f"  Time-stretching {len(jobs)} sentence(s) once ({backend}, {speed_factor}x, {sum(len(y) for y in arrays) / sr:.1f}s)...")
+    try: stretched, scale = time_stretch.stretch_concatenated(arrays, speed_factor, sr, backend)
+    except Exception as e:
+        print(f"  Warning: Episode time-stretch failed, using original speed: {e}", file=sys.stderr); traceback.print_exc()
+        stretched, scale = arrays, 1.0
+    for job, y in zip(jobs, stretched):
+        final_audio_path = job["fast_audio_path"] if scale != 1.0 else job["raw_audio_path"]
+        try: sf.write(final_audio_path, y, sr)
+        except Exception as e: print(f"  Error writing final audio ({job['sentence_id']}): {e}", file=sys.stderr); job["ok"] = False; continue
+        job["final_audio_path"] = final_audio_path; job["final_duration"] = len(y) / sr; job["time_scale"] = scale
+
 
 # --- 메인 처리 함수 ---
 def generate_audio_and_timestamps(
@@ -434,35 +516,52 @@ def generate_audio_and_timestamps(
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Using device: {device}")
 
-    # --- 모델 로드 (캐시된 함수 사용) ---
+    # --- 모델 로드 (모델 레지스트리: 첫 사용 시 로드, 메모리 예산 초과 시 오래 안 쓴 모델부터 해제) ---
     zonos_model_name = tts_config.get("zonos_model_name", "Zyphra/Zonos-v0.1-transformer")
-    whisper_model_size = tts_config.get("whisper_model_size", "large")
+    whisper_runtime = tts_config.get("whisper_runtime", "openai") # 'openai' 또는 'faster' (CTranslate2, CPU int8)
+    if whisper_runtime == 'faster' and whisper_backend.faster_whisper is None:
+        print("Warning: whisper_runtime 'faster' requires faster-whisper. Using openai-whisper.", file=sys.stderr); whisper_runtime = 'openai'
+    whisper_model_size = whisper_backend.resolve_model_size(tts_config.get("whisper_model_size", "large"), channel_dir, whisper_runtime)
+    whisper_compute_type = tts_config.get("whisper_compute_type")
+    tts_config = {**tts_config, "whisper_model_size": whisper_model_size, "whisper_runtime": whisper_runtime} # 캐시 키에는 실제 사용 모델 기록
+    zonos_precision = tts_config.get("zonos_precision", "fp32"); whisper_precision = tts_config.get("whisper_precision", "fp32")
+    if "model_memory_budget_gb" in tts_config: model_registry.registry.set_budget(tts_config["model_memory_budget_gb"])
     zonos_model, whisper_model, speaker_embedding = None, None, None
     try:
         # 캐시된 함수를 통해 모델 로드
-        zonos_model = cached_load_zonos_model(zonos_model_name, device)
-        whisper_model = cached_load_whisper_model(whisper_model_size, device)
-
-        # --- 스피커 임베딩 (캐시 대상 아님) ---
+        zonos_model = cached_load_zonos_model(zonos_model_name, device, zonos_precision)
+        timestamp_backend = tts_config.get("timestamp_backend", "whisper") # 'whisper' (ASR 전사) 또는 'forced' (알려진 텍스트 강제 정렬)
+        if timestamp_backend == 'forced' and forced_alignment is None:
+            print("Warning: Forced alignment backend unavailable (torchaudio MMS_FA). Using Whisper.", file=sys.stderr); timestamp_backend = 'whisper'
+        alignment_model = cached_load_alignment_model(device) if timestamp_backend == 'forced' else None
+        whisper_model = cached_load_whisper_model(whisper_model_size, device, whisper_precision, whisper_runtime, whisper_compute_type) if timestamp_backend == 'whisper' else None # forced는 실패 시에만 로드
+
+        # --- 스피커 임베딩 (채널 tts_cache/speaker에 참조 WAV 해시 + 모델 + 장치 키로 캐시) ---
         zonos_ref_wav_filename = tts_config.get("zonos_ref_wav_path", "reference.wav")
         # zonos_ref_wav_path는 tts_config.json에 절대 경로로 제공되므로 channel_dir과 결합하지 않음
         zonos_ref_wav_full_path = zonos_ref_wav_filename
-        print(f"Loading reference audio for speaker embedding: {zonos_ref_wav_full_path}")
         if not os.path.exists(zonos_ref_wav_full_path):
             raise FileNotFoundError(f"Reference audio not found: {zonos_ref_wav_full_path}")
-        ref_wav, ref_sr = torchaudio.load(zonos_ref_wav_full_path)
-        ref_wav = ref_wav.to(device) # GPU로 이동
-        print("Generating speaker embedding...")
-        # 스피커 임베딩 생성 시 Zonos 모델 사용
-        speaker_embedding = zonos_model.make_speaker_embedding(ref_wav, ref_sr)
-        print("Speaker embedding generated.")
-        del ref_wav # 메모리 해제
-        if device.type == 'cuda': torch.cuda.empty_cache()
-        gc.collect()
+
+        def compute_speaker_embedding():
+            print(f"Loading reference audio for speaker embedding: {zonos_ref_wav_full_path}")
+            ref_wav, ref_sr = torchaudio.load(zonos_ref_wav_full_path)
+            ref_wav = ref_wav.to(device) # GPU로 이동
+            print("Generating speaker embedding...")
+            # 스피커 임베딩 생성 시 Zonos 모델 사용
+            embedding = zonos_model.make_speaker_embedding(ref_wav, ref_sr)
+            print("Speaker embedding generated.")
+            del ref_wav # 메모리 해제
+            if device.type == 'cuda': torch.cuda.empty_cache()
+            gc.collect()
+            return embedding
+
+        speaker_embedding = tts_cache.get_speaker_embedding(zonos_ref_wav_full_path, zonos_model_name, device, channel_dir, compute_speaker_embedding)
+        speaker_key = tts_cache.speaker_embedding_key(zonos_ref_wav_full_path, zonos_model_name, device)
 
     except Exception as e:
         print(f"Error during model/embedding loading: {e}", file=sys.stderr); traceback.print_exc()
-        # 캐시된 모델은 del 할 필요 없음 (Streamlit이 관리)
+        # 모델은 레지스트리가 소유 (명시적 해제: model_registry.registry.unload_all())
         return False
 
     # --- 디렉토리 및 데이터 로딩 ---
@@ -484,79 +583,177 @@ def generate_audio_and_timestamps(
     chunk_idx_in_visual_plan = 0
     processing_successful = True
     speed_factor = float(tts_config.get("audio_speed_factor", 1.0))
-    print(f"Audio speed factor set to: {speed_factor}")
+    stretch_backend = tts_config.get("time_stretch_backend", "librosa") # 'librosa' / 'wsola' / 'atempo'
+    stretch_per_episode = tts_config.get("time_stretch_scope", "sentence") == 'episode' and abs(speed_factor - 1.0) > 1e-6
+    tts_batch_size = max(1, int(tts_config.get("tts_batch_size", 4)))
+    whisper_mode = tts_config.get("whisper_mode", "episode") # 'episode' (에피소드 전체 1회 전사) 또는 'sentence' (문장별 전사)
+    sentence_cache_dir = channel_dir if tts_config.get("sentence_cache", True) else None # 문장 TTS 결과 캐시
+    cache_stats = {"hits": 0, "misses": 0}
+    print(f"Audio speed factor set to: {speed_factor} (time_stretch_backend={stretch_backend}, scope={'episode' if stretch_per_episode else 'sentence'})")
     print("\n--- Processing Start ---")
     sentence_global_index = 0
 
+    # 1단계: 문장 전처리 (TTS 입력 목록)
+    sentence_jobs = []
+    for segment_idx, segment in enumerate(script_data.get('segments', [])):
+        segment_type = segment.get('type', f'Unknown_{segment_idx}')
+        for sentence_idx, sentence_original in enumerate(segment.get('sentences', [])):
+            if not sentence_original or not isinstance(sentence_original, str): continue
+            sentence_global_index += 1
+            cleaned_sentence_original = sentence_original.strip()
+            if cleaned_sentence_original.startswith('/'): cleaned_sentence_original = cleaned_sentence_original[1:].strip()
+            processed_sentence = preprocess_text_simple(cleaned_sentence_original)
+            if not processed_sentence: print(f"  Skipping empty sentence ({segment_type}_S{sentence_idx})."); continue
+            sentence_jobs.append({
+                "sentence_id": f"{segment_type}_S{sentence_idx}", "number": sentence_global_index,
+                "cleaned": cleaned_sentence_original, "processed": processed_sentence,
+                "raw_audio_path": os.path.join(episode_audio_output_dir, f"sentence_{segment_idx}_{sentence_idx}_raw.wav"),
+                "fast_audio_path": os.path.join(episode_audio_output_dir, f"sentence_{segment_idx}_{sentence_idx}_fast.wav"),
+                "tts_success": False, "cache_key": None, "cached": None, "ok": False, "words": None,
+            })
+            job = sentence_jobs[-1]
+            if sentence_cache_dir:
+                job["cache_key"] = tts_cache.sentence_cache_key(processed_sentence, speaker_key, tts_config)
+                job["cached"] = tts_cache.load_sentence(sentence_cache_dir, job["cache_key"])
+            cache_stats["hits" if job["cached"] else "misses"] += 1
+    if sentence_cache_dir: print(f"Sentence cache: {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es)")
+
+    # 2~4단계 파이프라인: TTS 배치(메인 스레드) -> 속도 조절/길이 측정(워커 스레드 풀) -> 문장 단위 타임스탬프(ASR 스레드)
+    #   TTS가 다음 배치를 생성하는 동안 앞 문장들의 후처리/정렬이 진행됩니다. 큐 크기로 대기 중인 문장 수를 제한합니다.
+    #   에피소드 단위 Whisper는 전체 오디오가 필요하므로 파이프라인 종료 후 한 번 실행합니다.
+    #   문장 오디오는 단계 사이에 float32 배열로 전달되고 최종 WAV만 한 번 기록됩니다 (ASR은 16kHz 배열을 직접 입력).
+    whisper_language = tts_config.get("whisper_language", "ko")
+    asr_in_pipeline = timestamp_backend == 'forced' or whisper_mode != 'episode'
+    queue_size = max(1, int(tts_config.get("pipeline_queue_size", 8)))
+    audio_workers = max(1, int(tts_config.get("audio_workers", min(4, os.cpu_count() or 1))))
+    post_queue: "queue.Queue" = queue.Queue(maxsize=queue_size); asr_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+
+    def sentence_timestamps(job):
+        if timestamp_backend == 'forced':
+            try: words = forced_alignment.align_transcript(job["final_audio_path"], job["processed"], alignment_model, device, audio=job.get("audio_16k"))
+            except Exception as e: print(f"  Forced alignment error ({os.path.basename(job['final_audio_path'])}): {e}", file=sys.stderr); words = []
+            job["words"] = words if (words or job["final_duration"] <= 0.1) else None # None: 파이프라인 후 Whisper로 재시도
+        else:
+            job["words"] = extract_whisper_timestamps(job["final_audio_path"], whisper_model, whisper_language, audio=job.get("audio_16k"))
+        if job["words"] is not None: job.pop("audio_16k", None) # 더 필요 없는 오디오는 바로 해제
+
+    def post_worker():
+        while True:
+            job = post_queue.get()
+            if job is None: break
+            try: finalize_sentence_audio(job, speed_factor, stretch_backend, defer_stretch=stretch_per_episode)
+            except Exception as e: print(f"  Error finalizing {job['sentence_id']}: {e}", file=sys.stderr); traceback.print_exc(); job["ok"] = False
+            if job["ok"] and asr_in_pipeline: asr_queue.put(job)
+
+    def asr_worker():
+        with torch.inference_mode(): # 그래디언트 비활성화는 스레드 단위
+            while True:
+                job = asr_queue.get()
+                if job is None: break
+                try: sentence_timestamps(job)
+                except Exception as e: print(f"  Timestamp error ({job['sentence_id']}): {e}", file=sys.stderr); traceback.print_exc(); job["words"] = None
+
+    for job in sentence_jobs: # 캐시 적중 문장은 파일 복사만
+        if job["cached"]: finalize_sentence_audio(job, speed_factor, stretch_backend)
+    post_threads = [threading.Thread(target=post_worker, name=f"audio-post-{i}", daemon=True) for i in range(audio_workers)]
+    asr_thread = threading.Thread(target=asr_worker, name="audio-asr", daemon=True)
+    for t in post_threads: t.start()
+    asr_thread.start()
+
     with torch.no_grad(): # 추론 모드이므로 그래디언트 계산 비활성화
-        for segment_idx, segment in enumerate(script_data.get('segments', [])):
-            segment_type = segment.get('type', f'Unknown_{segment_idx}')
-            for sentence_idx, sentence_original in enumerate(segment.get('sentences', [])):
-                if not sentence_original or not isinstance(sentence_original, str): continue
-                sentence_id = f"{segment_type}_S{sentence_idx}"
-                print(f"\n[Sentence {sentence_global_index + 1} ({sentence_id})] Processing: '{sentence_original[:60]}...'")
-                cleaned_sentence_original = sentence_original.strip()
-                if cleaned_sentence_original.startswith('/'): cleaned_sentence_original = cleaned_sentence_original[1:].strip()
-                processed_sentence = preprocess_text_simple(cleaned_sentence_original)
-                if not processed_sentence: print(f"  Skipping empty sentence."); sentence_global_index += 1; continue
-                print(f"  Preprocessed: '{processed_sentence[:60]}...'")
-                raw_audio_filename = f"sentence_{segment_idx}_{sentence_idx}_raw.wav"
-                raw_audio_path = os.path.join(episode_audio_output_dir, raw_audio_filename)
-                tts_success, _, _ = generate_zonos_audio(processed_sentence, raw_audio_path, zonos_model, speaker_embedding, tts_config)
-                if not tts_success: print(f"  TTS failed, skipping sentence.", file=sys.stderr); processing_successful = False; sentence_global_index += 1; continue
-                final_audio_path = raw_audio_path
-                if abs(speed_factor - 1.0) > 1e-6 and os.path.exists(raw_audio_path): # 속도 변경 필요시
-                    sped_up_audio_filename = f"sentence_{segment_idx}_{sentence_idx}_fast.wav"
-                    sped_up_audio_path = os.path.join(episode_audio_output_dir, sped_up_audio_filename)
-                    speed_up_success = speed_up_audio(raw_audio_path, sped_up_audio_path, speed_factor)
-                    if speed_up_success: final_audio_path = sped_up_audio_path
-                    else: print(f"  Warning: Failed to speed up audio, using original.", file=sys.stderr)
-                elif abs(speed_factor - 1.0) <= 1e-6 : print("  Skipping audio speed up (factor is ~1.0).")
-
-                final_duration = get_audio_duration(final_audio_path)
-                if final_duration <= 0: print(f"  Warning: Final audio has zero duration: {os.path.basename(final_audio_path)}", file=sys.stderr)
-                total_final_audio_duration += final_duration
-                print(f"  Final audio: {os.path.basename(final_audio_path)} ({final_duration:.3f}s)")
-                word_timestamps = extract_whisper_timestamps(final_audio_path, whisper_model, tts_config.get("whisper_language", "ko"))
-                if not word_timestamps and final_duration > 0.1: print(f"  Warning: Whisper failed for {os.path.basename(final_audio_path)}.")
-                sentence_output = {"sentence": cleaned_sentence_original, "processed_sentence": processed_sentence, "audio_path": final_audio_path, "sentence_duration": round(final_duration, 3), "chunks": []}
-                matched_chunks_info = []
-                current_reconstruction_norm = ""
-                processed_sentence_norm = re.sub(r'\s+', '', processed_sentence)
-                temp_chunk_idx = chunk_idx_in_visual_plan
-                while temp_chunk_idx < len(visual_plan_data):
-                    chunk_info = visual_plan_data[temp_chunk_idx]; chunk_text = chunk_info.get("chunk_text", "")
-                    processed_chunk = preprocess_text_simple(chunk_text); processed_chunk_norm = re.sub(r'\s+', '', processed_chunk)
-                    if not processed_chunk_norm: temp_chunk_idx += 1; continue
-                    next_reconstruction_norm = current_reconstruction_norm + processed_chunk_norm
-                    if processed_sentence_norm.startswith(next_reconstruction_norm):
-                        matched_chunks_info.append({"info": chunk_info, "tokens": processed_chunk.split()})
-                        current_reconstruction_norm = next_reconstruction_norm; temp_chunk_idx += 1
-                        if current_reconstruction_norm == processed_sentence_norm: break
-                    else: break
-                chunk_idx_in_visual_plan = temp_chunk_idx
-                if not matched_chunks_info: print(f"  Warning: No visual plan chunks matched.")
-                elif not word_timestamps: print(f"  Warning: No Whisper timestamps to assign.")
-                else:
-                    word_assignments = align_words_to_chunks_sequential(word_timestamps, matched_chunks_info, tts_config)
-                    for chunk_idx, chunk_match_info in enumerate(matched_chunks_info):
-                        assigned_words = word_assignments[chunk_idx] if chunk_idx < len(word_assignments) else []
-                        chunk_start = assigned_words[0]['start'] if assigned_words else 0.0
-                        chunk_end = assigned_words[-1]['end'] if assigned_words else 0.0
-                        if chunk_end < chunk_start: chunk_end = chunk_start
-                        chunk_duration = chunk_end - chunk_start
-                        sentence_output["chunks"].append({"chunk_text": chunk_match_info["info"].get("chunk_text", ""), "visual_info": chunk_match_info["info"].get("visual"), "words": assigned_words, "chunk_start_in_sentence": round(chunk_start, 3), "chunk_end_in_sentence": round(chunk_end, 3), "chunk_duration": round(chunk_duration, 3)})
-                final_output_data.append(sentence_output)
-                sentence_global_index += 1
+        # 2단계: 배치 TTS (길이가 비슷한 문장끼리 묶어 패딩 낭비 최소화)
+        by_length = sorted((job for job in sentence_jobs if not job["cached"]), key=lambda job: len(job["processed"]))
+        batches = [by_length[i:i + tts_batch_size] for i in range(0, len(by_length), tts_batch_size)]
+        print(f"\n[TTS] {len(by_length)} sentence(s) in {len(batches)} batch(es) (tts_batch_size={tts_batch_size}, audio_workers={audio_workers})")
+        try:
+            for batch in batches:
+                arrays, output_sampling_rate = synthesize_zonos_batch([job["processed"] for job in batch], zonos_model, speaker_embedding, tts_config)
+                for job, wav in zip(batch, arrays):
+                    job["tts_success"] = wav is not None; job["audio"] = wav; job["sample_rate"] = output_sampling_rate
+                    post_queue.put(job) # 큐가 가득 차면 TTS가 대기 (메모리 상한)
+        finally:
+            for _ in post_threads: post_queue.put(None)
+            for t in post_threads: t.join()
+            asr_queue.put(None); asr_thread.join()
+        if device.type == 'cuda': torch.cuda.empty_cache()
+        gc.collect()
+
+        deferred_jobs = [job for job in sentence_jobs if job["ok"] and job.get("unstretched") is not None]
+        if deferred_jobs: stretch_episode_audio(deferred_jobs, speed_factor, stretch_backend)
+        if any(not job["ok"] for job in sentence_jobs): processing_successful = False
+        total_final_audio_duration = sum(job["final_duration"] for job in sentence_jobs if job["ok"])
+
+        # 4단계 (파이프라인 후): 에피소드 단위 Whisper, 또는 강제 정렬 실패 문장의 Whisper 재시도
+        whisper_pending = [job for job in sentence_jobs if job["ok"] and job["words"] is None]
+        if whisper_pending and timestamp_backend == 'forced':
+            print(f"  Falling back to Whisper for {len(whisper_pending)} sentence(s).")
+            try:
+                if whisper_model is None: whisper_model = cached_load_whisper_model(whisper_model_size, device, whisper_precision, whisper_runtime, whisper_compute_type)
+            except Exception as e: print(f"  Error loading Whisper model: {e}", file=sys.stderr); whisper_pending = []
+        if whisper_mode == 'episode' and len(whisper_pending) > 1:
+            per_sentence_words = extract_whisper_timestamps_episode([job["final_audio_path"] for job in whisper_pending], whisper_model, whisper_language,
+                                                                    gap_seconds=float(tts_config.get("whisper_episode_gap", 0.5)),
+                                                                    audio_arrays=[job.get("audio_16k") for job in whisper_pending])
+        else:
+            per_sentence_words = [extract_whisper_timestamps(job["final_audio_path"], whisper_model, whisper_language, audio=job.get("audio_16k")) for job in whisper_pending]
+        for job, word_timestamps in zip(whisper_pending, per_sentence_words): job["words"] = word_timestamps
+        for job in sentence_jobs:
+            job.pop("audio_16k", None)
+            if job["words"] and job.get("time_scale", 1.0) != 1.0: job["words"] = time_stretch.rescale_word_timestamps(job["words"], job["time_scale"]) # 원래 속도 기준 -> 최종 오디오 기준
+        for job in sentence_jobs:
+            if not job["ok"] or job["cached"]: continue
+            word_timestamps = job["words"] = job["words"] or []
+            final_audio_path = job["final_audio_path"]; final_duration = job["final_duration"]
+            if not word_timestamps and final_duration > 0.1: print(f"  Warning: No word timestamps for {os.path.basename(final_audio_path)}.")
+            elif job["cache_key"] and final_duration > 0 and (abs(speed_factor - 1.0) <= 1e-6 or final_audio_path != job["raw_audio_path"]): # 속도 조절 실패본은 캐시하지 않음
+                tts_cache.store_sentence(sentence_cache_dir, job["cache_key"], final_audio_path, word_timestamps, final_duration, job["processed"])
+
+        # 5단계: 청크 매칭 및 정렬 (원래 순서)
+        for job in sentence_jobs:
+            if not job["ok"]: continue
+            cleaned_sentence_original = job["cleaned"]; processed_sentence = job["processed"]; cached = job["cached"]
+            final_audio_path = job["final_audio_path"]; final_duration = job["final_duration"]; word_timestamps = job["words"]
+            sentence_output = {"sentence": cleaned_sentence_original, "processed_sentence": processed_sentence, "audio_path": final_audio_path, "sentence_duration": round(final_duration, 3), "tts_cache_hit": bool(cached), "chunks": []}
+            matched_chunks_info = []
+            current_reconstruction_norm = ""
+            processed_sentence_norm = re.sub(r'\s+', '', processed_sentence)
+            temp_chunk_idx = chunk_idx_in_visual_plan
+            while temp_chunk_idx < len(visual_plan_data):
+                chunk_info = visual_plan_data[temp_chunk_idx]; chunk_text = chunk_info.get("chunk_text", "")
+                processed_chunk = preprocess_text_simple(chunk_text); processed_chunk_norm = re.sub(r'\s+', '', processed_chunk)
+                if not processed_chunk_norm: temp_chunk_idx += 1; continue
+                next_reconstruction_norm = current_reconstruction_norm + processed_chunk_norm
+                if processed_sentence_norm.startswith(next_reconstruction_norm):
+                    matched_chunks_info.append({"info": chunk_info, "tokens": processed_chunk.split()})
+                    current_reconstruction_norm = next_reconstruction_norm; temp_chunk_idx += 1
+                    if current_reconstruction_norm == processed_sentence_norm: break
+                else: break
+            chunk_idx_in_visual_plan = temp_chunk_idx
+            if not matched_chunks_info: print(f"  Warning: No visual plan chunks matched.")
+            elif not word_timestamps: print(f"  Warning: No Whisper timestamps to assign.")
+            else:
+                # 청크 배정과 자막 세그먼트를 한 번의 정렬로 계산하여 저장 (6단계는 재정렬하지 않음)
+                chunk_texts = [m["info"].get("chunk_text", "") for m in matched_chunks_info]
+                word_assignments, subtitle_segments = text_alignment.align_sentence(word_timestamps, chunk_texts, cleaned_sentence_original, spoken_form=preprocess_text_simple)
+                sentence_output["subtitle_segments"] = subtitle_segments
+                sentence_output["alignment_version"] = text_alignment.ALIGNMENT_VERSION
+                for chunk_idx, chunk_match_info in enumerate(matched_chunks_info):
+                    assigned_words = word_assignments[chunk_idx] if chunk_idx < len(word_assignments) else []
+                    chunk_start = assigned_words[0]['start'] if assigned_words else 0.0
+                    chunk_end = assigned_words[-1]['end'] if assigned_words else 0.0
+                    if chunk_end < chunk_start: chunk_end = chunk_start
+                    chunk_duration = chunk_end - chunk_start
+                    sentence_output["chunks"].append({"chunk_text": chunk_match_info["info"].get("chunk_text", ""), "visual_info": chunk_match_info["info"].get("visual"), "words": assigned_words, "chunk_start_in_sentence": round(chunk_start, 3), "chunk_end_in_sentence": round(chunk_end, 3), "chunk_duration": round(chunk_duration, 3)})
+            final_output_data.append(sentence_output)
     print(f"\n--- Processing Finished ---")
     print(f"Saving final results to {final_output_json_path}...")
     try:
-        final_structure = {"total_final_audio_duration_seconds": round(total_final_audio_duration, 3), "sentences": final_output_data}
+        final_structure = {"total_final_audio_duration_seconds": round(total_final_audio_duration, 3), "tts_cache_stats": cache_stats, "sentences": final_output_data}
         with open(final_output_json_path, 'w', encoding='utf-8') as f: json.dump(final_structure, f, ensure_ascii=False, indent=2)
         print(f"Successfully saved results for {sentence_global_index} sentences.")
         print(f"Total final audio duration: {total_final_audio_duration:.2f} seconds")
     except Exception as e: print(f"Error saving final JSON output: {e}", file=sys.stderr); processing_successful = False
-    # --- 모델 및 리소스 정리 (캐시된 모델은 Streamlit이 관리하므로 del 호출 불필요) ---
+    # --- 모델 및 리소스 정리 (모델은 레지스트리가 관리하므로 del 호출 불필요) ---
     print("Cleaning up non-cached resources...")
     if speaker_embedding is not None: del speaker_embedding
     gc.collect()
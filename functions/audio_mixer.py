@@ -0,0 +1,117 @@
+# PaMin/functions/audio_mixer.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === NumPy 오디오 믹서 (나레이션 + BGM) ===
+# ==============================================================================
+# CompositeAudioClip(청크 단위 Python 콜백) 대신 모든 오디오를 고정 샘플레이트의 float32
+# 버퍼 하나에 디코딩/배치하고 벡터 연산으로 믹스하여 WAV 하나로 기록합니다.
+# 인코더(MoviePy write_videofile / ffmpeg 백엔드 / 증분 렌더)는 이 WAV를 그대로 mux합니다.
+#
+# BGM 처리:
+#   - 게인: config['bgm_volume_factor']
+#   - 더킹: 타임라인 speech 트랙(단어 타임스탬프) 구간에서 bgm_duck_gain 배로 감쇠 (attack/release 선형 램프)
+#   - 루프: 나레이션보다 짧으면 반복 (bgm_loop)
+#   - 페이드: 시작 bgm_fade_in초 / 끝 bgm_fade_out초
+import os
+import wave
+import subprocess
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from functions.ffmpeg_utils import get_ffmpeg_exe
+from functions.render_timeline import Timeline, TimelineEvent
+
+DEFAULT_SAMPLE_RATE = 44100
+CHANNELS = 2
+ENVELOPE_RATE = 100 # 더킹 엔벨로프 제어 해상도 (Hz)
+
+
+# --- Helper 1: 디코딩 ---
+def decode_audio(path: str, sample_rate: int = DEFAULT_SAMPLE_RATE) -> Optional[np.ndarray]:
+    """ffmpeg로 path를 (samples, 2) float32 배열로 디코딩합니다 (리샘플링/스테레오 변환 포함). 실패 시 None."""
+    cmd = [get_ffmpeg_exe(), '-hide_banner', '-loglevel', 'error', '-i', path,
+           '-f', 'f32le', '-acodec', 'pcm_f32le', '-ac', str(CHANNELS), '-ar', str(sample_rate), '-']
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        print(f"오류(오디오 믹서): ffmpeg 실행 파일을 찾을 수 없습니다 - {cmd[0]}"); return None
+    if result.returncode != 0:
+        print(f"오류(오디오 믹서): 디코딩 실패 ({os.path.basename(path)}): {result.stderr.decode('utf-8', errors='replace')[-500:]}")
+        return None
+    return np.frombuffer(result.stdout, dtype=np.float32).reshape(-1, CHANNELS)
+
+
+# --- Helper 2: WAV 기록 ---
+def write_wav(path: str, samples: np.ndarray, sample_rate: int) -> None:
+    """float32 (samples, channels) 배열을 16-bit PCM WAV로 기록합니다."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype('<i2')
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(samples.shape[1]); wf.setsampwidth(2); wf.setframerate(sample_rate)
+        wf.writeframes(pcm.tobytes())
+
+
+# --- Helper 3: 더킹 엔벨로프 ---
+def build_duck_envelope(speech_events: List[TimelineEvent], total_samples: int, sample_rate: int,
+                        duck_gain: float, attack: float, release: float, padding: float) -> np.ndarray:
+    """
+    발화 구간(padding만큼 확장)에서 duck_gain, 그 외 1.0인 게인 곡선을 ENVELOPE_RATE 해상도로 만들고
+    샘플 단위로 보간합니다. 감쇠량은 인과적 선형 램프로 따라갑니다: 발화가 시작되면 attack초에 걸쳐 duck_gain까지
+    내려가고, 발화가 끝나면 release초에 걸쳐 1.0으로 복귀합니다 (release는 복귀 속도이며 유지 시간이 아님).
+    """
+    control_len = int(np.ceil(total_samples / sample_rate * ENVELOPE_RATE)) + 1
+    speech = np.zeros(control_len, dtype=np.float32)
+    for event in speech_events:
+        i0 = max(0, int((event.start - padding) * ENVELOPE_RATE)); i1 = min(control_len, int(np.ceil((event.end + padding) * ENVELOPE_RATE)))
+        if i1 > i0: speech[i0:i1] = 1.0
+    attack_step = 1.0 / max(1.0, attack * ENVELOPE_RATE); release_step = 1.0 / max(1.0, release * ENVELOPE_RATE)
+    level = 0.0
+    for i in range(control_len): # 제어 신호는 100Hz라 Python 루프로 충분 (10분 = 6만 스텝)
+        target = speech[i]
+        level = min(target, level + attack_step) if target > level else max(target, level - release_step)
+        speech[i] = level
+    control = 1.0 - speech * (1.0 - duck_gain)
+    control_times = np.arange(control_len, dtype=np.float64) / ENVELOPE_RATE
+    return np.interp(np.arange(total_samples, dtype=np.float64) / sample_rate, control_times, control).astype(np.float32)
+
+
+# --- 메인: 최종 오디오 믹스 ---
+def mix_timeline_audio(timeline: Timeline, config: Dict[str, Any], bgm_path: Optional[str], output_wav_path: str) -> Optional[str]:
+    """
+    타임라인의 나레이션을 문장 시작 위치에 배치하고 BGM(게인/더킹/루프/페이드)을 더해 output_wav_path에 기록합니다.
+    나레이션이 하나도 디코딩되지 않으면 None.
+    """
+    sample_rate = int(config.get('audio_sample_rate', DEFAULT_SAMPLE_RATE))
+    total_samples = int(round(float(timeline.total_duration or 0) * sample_rate))
+    if total_samples <= 0: return None
+    mix = np.zeros((total_samples, CHANNELS), dtype=np.float32) # 전체 길이 버퍼 한 번 할당
+
+    placed = 0
+    for event in timeline.narration:
+        samples = decode_audio(event.source, sample_rate)
+        if samples is None or len(samples) == 0: continue
+        start = int(round(event.start * sample_rate)); end = min(total_samples, start + len(samples))
+        if end > start: mix[start:end] += samples[:end - start]; placed += 1
+    if placed == 0: print("오류(오디오 믹서): 나레이션 오디오 없음"); return None
+
+    if bgm_path and os.path.exists(bgm_path):
+        bgm = decode_audio(bgm_path, sample_rate)
+        if bgm is not None and len(bgm) > 0:
+            if len(bgm) < total_samples and config.get('bgm_loop', True): bgm = np.tile(bgm, (int(np.ceil(total_samples / len(bgm))), 1))
+            bgm = bgm[:total_samples]
+            gain = np.full(len(bgm), float(config.get('bgm_volume_factor', 0.20)), dtype=np.float32)
+            duck_gain = config.get('bgm_duck_gain', 0.5)
+            if duck_gain is not None and duck_gain < 1.0 and timeline.speech:
+                gain *= build_duck_envelope(timeline.speech, len(bgm), sample_rate, float(duck_gain),
+                                            config.get('bgm_duck_attack', 0.08), config.get('bgm_duck_release', 0.35),
+                                            config.get('bgm_duck_padding', 0.05))
+            fade_in = int(config.get('bgm_fade_in', 0.5) * sample_rate); fade_out = int(config.get('bgm_fade_out', 1.5) * sample_rate)
+            if fade_in > 0: gain[:fade_in] *= np.linspace(0.0, 1.0, min(fade_in, len(gain)), dtype=np.float32)
+            if fade_out > 0 and len(bgm) >= total_samples: gain[-fade_out:] *= np.linspace(1.0, 0.0, min(fade_out, len(gain)), dtype=np.float32)
+            mix[:len(bgm)] += bgm * gain[:, None]
+
+    peak = float(np.abs(mix).max())
+    if peak > 1.0: mix /= peak # 클리핑 방지
+    write_wav(output_wav_path, mix, sample_rate)
+    print(f"  - 오디오 믹스 완료: 나레이션 {placed}개, {total_samples / sample_rate:.2f}s @ {sample_rate}Hz")
+    return output_wav_path
@@ -0,0 +1,203 @@
+# PaMin/functions/batch_render.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === 헤드리스 배치 렌더러 ===
+# ==============================================================================
+# Streamlit 6단계 없이 여러 에피소드의 최종 영상을 프로세스 풀로 렌더링합니다.
+# 각 워커는 하나의 MoviePy/ffmpeg 파이프라인을 실행하며, 인코딩 스레드 수는
+# (CPU 코어 수 / 워커 수)로 제한되어 동시 렌더 시 과다 구독을 방지합니다.
+#
+# 사용 예:
+#   python -m functions.batch_render channels/쿰쿰파민/episodes/topic_a channels/쿰쿰파민/episodes/topic_b --workers 2
+#   python -m functions.batch_render --channel-dir channels/쿰쿰파민 --workers 3
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional
+
+PROCESSED_DATA_JSON_FILENAME = "audio_timestamps_output.json" # 5단계 결과
+CHANNEL_DEFINITION_FILENAME = "channel_definition.json"
+DEFAULT_TITLE = "영상 제목"
+
+
+# --- Helper 1: 워커별 스레드 수 계산 ---
+def compute_threads_per_worker(max_workers: int, total_threads: Optional[int] = None) -> int:
+    """전체 CPU 스레드를 워커 수로 나눈 값 (최소 1)을 반환합니다."""
+    total_threads = total_threads or os.cpu_count() or 1
+    return max(1, total_threads // max(1, max_workers))
+
+
+# --- Helper 2: 에피소드 렌더 입력 해석 ---
+def resolve_episode_render_job(episode_path: str, channel_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    에피소드 디렉토리에서 6단계와 동일한 규칙으로 렌더 입력(설정, JSON, 배경, BGM, 제목, 출력 경로)을 구성합니다.
+    channel_dir가 없으면 ./channels/[채널]/episodes/[에피소드 ID]/ 구조를 가정하여 추론합니다.
+    """
+    from functions import video_generation_basic
+
+    episode_path = os.path.abspath(episode_path)
+    episode_id = os.path.basename(os.path.normpath(episode_path))
+    if channel_dir is None:
+        channel_dir = os.path.dirname(os.path.dirname(episode_path))
+
+    json_data_path = os.path.join(episode_path, PROCESSED_DATA_JSON_FILENAME)
+    if not os.path.exists(json_data_path):
+        print(f"오류: 처리된 데이터 파일 없음 - {json_data_path}")
+        return None
+
+    channel_def = {}
+    channel_def_path = os.path.join(channel_dir, CHANNEL_DEFINITION_FILENAME)
+    if os.path.exists(channel_def_path):
+        try:
+            with open(channel_def_path, 'r', encoding='utf-8') as f: channel_def = json.load(f)
+        except Exception as e: print(f"경고: 채널 정의 파일 로드 실패({channel_def_path}): {e}")
+    else:
+        print(f"경고: 채널 정의 파일 없음 - {channel_def_path}. 기본 설정 사용.")
+    video_config = dict(channel_def.get('videoTemplateConfig') or video_generation_basic.template_config)
+    video_config['channel_dir'] = channel_dir # 채널 렌더 캐시 공유
+
+    base_video_path = os.path.join(channel_dir, "base_video.mp4")
+    if not os.path.exists(base_video_path):
+        print(f"오류: 배경 비디오 파일 없음 - {base_video_path}")
+        return None
+    bgm_path = os.path.join(channel_dir, "bgm.mp3")
+    if not os.path.exists(bgm_path):
+        print(f"경고: BGM 파일 없음 - {bgm_path}. BGM 없이 진행됩니다.")
+        bgm_path = None
+
+    # --- 제목 로드 (스크립트 2단계 결과 -> 채널명 -> 기본값) ---
+    title = channel_def.get('channelInfo', {}).get('channelName') or DEFAULT_TITLE
+    script_stage2_filepath = os.path.join(episode_path, f"script_stage2_{episode_id}.json")
+    if os.path.exists(script_stage2_filepath):
+        try:
+            with open(script_stage2_filepath, 'r', encoding='utf-8') as f: script_title = json.load(f).get('title')
+            if script_title and isinstance(script_title, str) and script_title.strip(): title = script_title
+        except Exception as e: print(f"경고: 스크립트 제목 로드 실패({script_stage2_filepath}): {e}")
+
+    return {
+        "episode_id": episode_id,
+        "episode_path": episode_path,
+        "channel_dir": channel_dir,
+        "config": video_config,
+        "json_data_path": json_data_path,
+        "base_video_path": base_video_path,
+        "bgm_path": bgm_path,
+        "output_path": os.path.join(episode_path, f"final_shorts_{episode_id}.mp4"),
+        "video_title_from_script": title,
+    }
+
+
+# --- Helper 3: 채널 내 렌더 가능한 에피소드 탐색 ---
+def find_renderable_episodes(channel_dir: str, skip_existing: bool = True) -> List[str]:
+    """채널의 episodes/ 하위에서 5단계 결과가 있는 에피소드 디렉토리 목록을 반환합니다."""
+    episodes_dir = os.path.join(channel_dir, "episodes")
+    if not os.path.isdir(episodes_dir): return []
+    episode_paths = []
+    for name in sorted(os.listdir(episodes_dir)):
+        episode_path = os.path.join(episodes_dir, name)
+        if not os.path.exists(os.path.join(episode_path, PROCESSED_DATA_JSON_FILENAME)): continue
+        if skip_existing and os.path.exists(os.path.join(episode_path, f"final_shorts_{name}.mp4")): continue
+        episode_paths.append(episode_path)
+    return episode_paths
+
+
+# --- Worker: 단일 에피소드 렌더 (프로세스 풀에서 실행) ---
+def _render_episode_worker(job: Dict[str, Any], render_threads: int, encoder_profile: Optional[str] = None) -> Dict[str, Any]:
+    from functions import video_generation_basic
+
+    started = time.time()
+    config = dict(job['config'])
+    config['render_threads'] = render_threads
+    if encoder_profile: config['encoder_profile'] = encoder_profile
+    try:
+        success = video_generation_basic.generate_complete_video_with_processed_subs(
+            config=config,
+            json_data_path=job['json_data_path'],
+            base_video_path=job['base_video_path'],
+            bgm_path=job['bgm_path'],
+            output_path=job['output_path'],
+            video_title_from_script=job['video_title_from_script']
+        )
+        error = None
+    except Exception as e:
+        traceback.print_exc(); success = False; error = str(e)
+    return {"episode_id": job['episode_id'], "output_path": job['output_path'], "success": bool(success),
+            "error": error, "elapsed_seconds": round(time.time() - started, 2)}
+
+
+# --- 메인 배치 렌더 함수 ---
+def render_episodes(
+    episode_paths: List[str],
+    max_workers: int = 2,
+    channel_dir: Optional[str] = None,
+    threads_per_worker: Optional[int] = None,
+    encoder_profile: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    여러 에피소드를 프로세스 풀에서 병렬 렌더링합니다.
+    각 워커의 인코딩 스레드는 threads_per_worker (기본값: CPU 코어 수 / 워커 수)로 제한됩니다.
+    encoder_profile을 주면 채널 설정의 인코더 프로파일 대신 사용합니다.
+    에피소드별 결과 dict 목록을 입력 순서대로 반환합니다.
+    """
+    jobs = []; results = []
+    for episode_path in episode_paths:
+        job = resolve_episode_render_job(episode_path, channel_dir)
+        if job: jobs.append(job)
+        else: results.append({"episode_id": os.path.basename(os.path.normpath(episode_path)), "output_path": None,
+                              "success": False, "error": "렌더 입력 해석 실패", "elapsed_seconds": 0.0})
+    if not jobs: return results
+
+    max_workers = max(1, min(max_workers, len(jobs)))
+    render_threads = threads_per_worker or compute_threads_per_worker(max_workers)
+    print(f"--- 배치 렌더 시작: 에피소드 {len(jobs)}개, 워커 {max_workers}개, 워커당 스레드 {render_threads}개 ---")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        future_to_job = {executor.submit(_render_episode_worker, job, render_threads, encoder_profile): job for job in jobs}
+        for future in as_completed(future_to_job):
+            job = future_to_job[future]
+            try: result = future.result()
+            except Exception as e: # 워커 프로세스 자체가 비정상 종료된 경우
+                result = {"episode_id": job['episode_id'], "output_path": job['output_path'], "success": False,
+                          "error": str(e), "elapsed_seconds": 0.0}
+            status = "성공" if result['success'] else "실패"
+            print(f"  [{status}] {result['episode_id']} ({result['elapsed_seconds']:.1f}s)")
+            results.append(result)
+
+    order = {os.path.basename(os.path.normpath(p)): i for i, p in enumerate(episode_paths)}
+    results.sort(key=lambda r: order.get(r['episode_id'], len(order)))
+    succeeded = sum(1 for r in results if r['success'])
+    print(f"--- 배치 렌더 완료: 성공 {succeeded}/{len(results)} ---")
+    return results
+
+
+# ==============================================================================
+# === 스크립트 실행 지점 ===
+# ==============================================================================
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="PaMin 헤드리스 배치 렌더러")
+    parser.add_argument("episodes", nargs="*", help="렌더링할 에피소드 디렉토리 목록")
+    parser.add_argument("--channel-dir", help="채널 디렉토리 (에피소드 미지정 시 episodes/ 하위 전체 렌더)")
+    parser.add_argument("--workers", type=int, default=2, help="동시 렌더 워커 수 (기본값: 2)")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="워커당 인코딩 스레드 수 (기본값: CPU 코어 수 / 워커 수)")
+    parser.add_argument("--rerender", action="store_true", help="최종 영상이 이미 있는 에피소드도 다시 렌더링")
+    parser.add_argument("--encoder-profile", default=None, help="인코더 프로파일 (draft / upload-quality / archive 등)")
+    args = parser.parse_args(argv)
+
+    episode_paths = list(args.episodes)
+    if not episode_paths and args.channel_dir:
+        episode_paths = find_renderable_episodes(args.channel_dir, skip_existing=not args.rerender)
+    if not episode_paths:
+        print("렌더링할 에피소드가 없습니다.")
+        return 1
+
+    results = render_episodes(episode_paths, max_workers=args.workers, channel_dir=args.channel_dir,
+                              threads_per_worker=args.threads_per_worker, encoder_profile=args.encoder_profile)
+    return 0 if all(r['success'] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
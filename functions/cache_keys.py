@@ -0,0 +1,24 @@
+# PaMin/functions/cache_keys.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === 캐시 키 / 파일 내용 해시 (공용) ===
+# ==============================================================================
+# render_cache, visual_assets, tts_cache가 같은 키 규칙을 쓰도록 한 곳에 둡니다.
+# 의존성이 표준 라이브러리뿐이라 오디오 단계(PIL/MoviePy 없음)에서도 가져올 수 있습니다.
+import json
+import hashlib
+from typing import Any
+
+
+def make_cache_key(*parts: Any) -> str:
+    """JSON 직렬화 가능한 값들로부터 안정적인 SHA1 키를 만듭니다."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def hash_file_content(path: str, chunk_size: int = 1 << 20) -> str:
+    """파일 내용의 SHA1 (경로/이름이 달라도 같은 파일이면 같은 키)."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''): h.update(chunk)
+    return h.hexdigest()
@@ -0,0 +1,180 @@
+# PaMin/functions/encoder_profiles.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === libx264 인코더 프로파일 ===
+# ==============================================================================
+# 이름 있는 인코더 프로파일(preset, CRF 또는 목표 비트레이트, GOP 길이, tune, 픽셀 포맷,
+# 2-pass ABR 여부)을 정의하고 MoviePy/ffmpeg 백엔드가 공통으로 쓰는 ffmpeg 인자로 변환합니다.
+#
+# 채널별 재정의/추가: channel_definition.json의 videoTemplateConfig에
+#   "encoder_profile": "upload-quality",
+#   "encoder_profiles": {"upload-quality": {"crf": 21}, "my-abr": {"preset": "slow", "bitrate": "6M", "two_pass": true}}
+# encoder_profile이 없으면 기존처럼 encoder_preset + 기본 CRF만 사용합니다.
+#
+# 벤치마크 (기준 에피소드의 최종 영상을 프로파일별로 재인코딩하여 속도/용량 비교):
+#   python -m functions.encoder_profiles channels/쿰쿰파민/episodes/topic_a --profiles draft upload-quality archive
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from functions.ffmpeg_utils import run_ffmpeg
+
+DEFAULT_ENCODER_PROFILES: Dict[str, Dict[str, Any]] = {
+    # 작업 중 확인용: 빠르지만 큼
+    "draft": {"preset": "ultrafast", "crf": 28, "gop_seconds": 2, "tune": None, "pix_fmt": "yuv420p", "two_pass": False},
+    # 업로드용: 업로드 후 플랫폼이 재인코딩하므로 여유 있는 화질 + VBV 상한
+    "upload-quality": {"preset": "medium", "crf": 20, "maxrate": "12M", "bufsize": "24M", "gop_seconds": 2,
+                       "tune": None, "pix_fmt": "yuv420p", "two_pass": False},
+    # 보관용: 느리지만 작고 고화질
+    "archive": {"preset": "slow", "crf": 16, "gop_seconds": 4, "tune": None, "pix_fmt": "yuv420p", "two_pass": False},
+}
+
+
+# --- Helper 1: 프로파일 해석 ---
+def resolve_encoder_profile(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    config['encoder_profile'] 이름의 프로파일(기본 프로파일 위에 config['encoder_profiles'] 재정의를 병합)을 반환합니다.
+    이름이 없으면 encoder_preset만 가진 기존 동작용 프로파일을 반환합니다.
+    """
+    name = config.get('encoder_profile')
+    if not name: return {"name": None, "preset": config.get('encoder_preset', 'medium')}
+    custom = config.get('encoder_profiles') or {}
+    if name not in DEFAULT_ENCODER_PROFILES and name not in custom:
+        print(f"  - 경고: 알 수 없는 encoder_profile '{name}'. encoder_preset({config.get('encoder_preset', 'medium')})을 사용합니다.")
+        return {"name": None, "preset": config.get('encoder_preset', 'medium')}
+    return {"name": name, **DEFAULT_ENCODER_PROFILES.get(name, {}), **custom.get(name, {})}
+
+
+# --- Helper 2: ffmpeg 출력 인자 ---
+def build_x264_params(profile: Dict[str, Any], fps: float, gop_frames: Optional[int] = None) -> List[str]:
+    """
+    preset을 제외한 libx264 출력 인자 목록 (MoviePy write_videofile의 ffmpeg_params로도 사용).
+    gop_frames를 주면 프로파일의 GOP 길이 대신 사용합니다 (세그먼트 렌더의 고정 GOP).
+    """
+    params: List[str] = []
+    if profile.get('bitrate'):
+        params += ['-b:v', str(profile['bitrate'])]
+        if profile.get('maxrate'): params += ['-maxrate', str(profile['maxrate'])]
+        if profile.get('bufsize'): params += ['-bufsize', str(profile['bufsize'])]
+    elif profile.get('crf') is not None:
+        params += ['-crf', str(profile['crf'])]
+        if profile.get('maxrate'): params += ['-maxrate', str(profile['maxrate']), '-bufsize', str(profile.get('bufsize') or profile['maxrate'])]
+    if gop_frames is None and profile.get('gop_seconds'): gop_frames = int(round(float(profile['gop_seconds']) * fps))
+    if gop_frames: params += ['-g', str(gop_frames), '-keyint_min', str(gop_frames)]
+    if profile.get('tune'): params += ['-tune', str(profile['tune'])]
+    params += ['-pix_fmt', str(profile.get('pix_fmt') or 'yuv420p')]
+    return params
+
+
+def is_two_pass(profile: Dict[str, Any]) -> bool:
+    """2-pass는 목표 비트레이트(ABR)가 있을 때만 의미가 있습니다."""
+    return bool(profile.get('two_pass') and profile.get('bitrate'))
+
+
+def two_pass_params(pass_number: int, passlog_prefix: str) -> List[str]:
+    return ['-pass', str(pass_number), '-passlogfile', passlog_prefix]
+
+
+def cleanup_passlog(passlog_prefix: str) -> None:
+    """x264 2-pass 통계 파일(<prefix>-0.log, .mbtree 등)을 삭제합니다."""
+    directory = os.path.dirname(passlog_prefix) or '.'; base = os.path.basename(passlog_prefix)
+    for name in os.listdir(directory):
+        if name.startswith(base):
+            try: os.remove(os.path.join(directory, name))
+            except OSError: pass
+
+
+def describe_profile(profile: Dict[str, Any]) -> str:
+    rate = f"{profile['bitrate']} ABR" if profile.get('bitrate') else f"CRF {profile.get('crf', 'default')}"
+    return f"{profile.get('name') or 'legacy'} (preset={profile.get('preset')}, {rate}{', 2-pass' if is_two_pass(profile) else ''})"
+
+
+# ==============================================================================
+# === 벤치마크 ===
+# ==============================================================================
+def _probe_frame_count(path: str, fps: float) -> Optional[int]:
+    try:
+        from moviepy import VideoFileClip
+        clip = VideoFileClip(path, audio=False)
+        try: return int(round(clip.duration * fps))
+        finally: clip.close()
+    except Exception: return None
+
+
+def benchmark_profiles(source_video_path: str, profile_names: List[str], config: Dict[str, Any],
+                       max_seconds: Optional[float] = None, threads: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    source_video_path(기준 에피소드의 최종 영상)를 각 프로파일로 재인코딩하여 인코딩 시간/FPS, 출력 크기/비트레이트를 측정합니다.
+    모든 프로파일이 같은 디코딩 비용을 가지므로 상대 비교용입니다.
+    """
+    fps = config.get('fps', 30); threads = threads or config.get('render_threads') or os.cpu_count()
+    frame_count = _probe_frame_count(source_video_path, fps)
+    if frame_count and max_seconds: frame_count = min(frame_count, int(round(max_seconds * fps)))
+    temp_dir = tempfile.mkdtemp(prefix="pamin_encbench_")
+    results = []
+    try:
+        for name in profile_names:
+            profile = resolve_encoder_profile({**config, 'encoder_profile': name})
+            out_path = os.path.join(temp_dir, f"{name}.mp4")
+            input_args = ['-i', source_video_path] + (['-t', f"{max_seconds:.3f}"] if max_seconds else [])
+            encode_args = ['-an', '-c:v', 'libx264', '-preset', profile['preset'], '-r', str(fps), '-threads', str(threads)] + build_x264_params(profile, fps)
+            started = time.perf_counter()
+            if is_two_pass(profile):
+                passlog = os.path.join(temp_dir, f"{name}_passlog")
+                ok = run_ffmpeg(input_args + encode_args + two_pass_params(1, passlog) + ['-f', 'mp4', os.devnull], f"벤치마크 {name} pass 1") \
+                     and run_ffmpeg(input_args + encode_args + two_pass_params(2, passlog) + [out_path], f"벤치마크 {name} pass 2")
+            else:
+                ok = run_ffmpeg(input_args + encode_args + [out_path], f"벤치마크 {name}")
+            elapsed = time.perf_counter() - started
+            size = os.path.getsize(out_path) if ok and os.path.exists(out_path) else None
+            duration = (frame_count / fps) if frame_count else None
+            results.append({
+                "profile": name, "description": describe_profile(profile), "success": bool(ok),
+                "encode_seconds": round(elapsed, 2),
+                "encode_fps": round(frame_count / elapsed, 2) if ok and frame_count and elapsed > 0 else None,
+                "size_mb": round(size / (1024 * 1024), 2) if size else None,
+                "bitrate_kbps": round(size * 8 / 1000 / duration, 1) if size and duration else None,
+            })
+            print(f"  [{name}] {results[-1]}")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="PaMin 인코더 프로파일 벤치마크")
+    parser.add_argument("episode", help="기준 에피소드 디렉토리 (final_shorts_<id>.mp4 사용) 또는 영상 파일")
+    parser.add_argument("--profiles", nargs="+", default=list(DEFAULT_ENCODER_PROFILES), help="비교할 프로파일 이름")
+    parser.add_argument("--channel-dir", help="채널 디렉토리 (채널 정의의 프로파일 재정의 사용)")
+    parser.add_argument("--seconds", type=float, default=None, help="앞부분 N초만 인코딩")
+    parser.add_argument("--threads", type=int, default=None, help="인코딩 스레드 수")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.episode):
+        episode_id = os.path.basename(os.path.normpath(args.episode))
+        source_path = os.path.join(args.episode, f"final_shorts_{episode_id}.mp4")
+        channel_dir = args.channel_dir or os.path.dirname(os.path.dirname(os.path.abspath(args.episode)))
+    else:
+        source_path = args.episode; channel_dir = args.channel_dir
+    if not os.path.exists(source_path): print(f"오류: 기준 영상 없음 - {source_path}"); return 1
+
+    config: Dict[str, Any] = {}
+    channel_def_path = os.path.join(channel_dir, "channel_definition.json") if channel_dir else None
+    if channel_def_path and os.path.exists(channel_def_path):
+        with open(channel_def_path, 'r', encoding='utf-8') as f: config = json.load(f).get('videoTemplateConfig') or {}
+
+    print(f"--- 인코더 벤치마크: {source_path} ---")
+    results = benchmark_profiles(source_path, args.profiles, config, max_seconds=args.seconds, threads=args.threads)
+    print(f"{'profile':<16}{'encode s':>10}{'fps':>9}{'size MB':>10}{'kbps':>10}")
+    for r in results:
+        print(f"{r['profile']:<16}{r['encode_seconds']:>10}{str(r['encode_fps']):>9}{str(r['size_mb']):>10}{str(r['bitrate_kbps']):>10}")
+    return 0 if all(r['success'] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+# PaMin/functions/ffmpeg_render_backend.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === ffmpeg 단일 패스 filtergraph 렌더 백엔드 ===
+# ==============================================================================
+# MoviePy 백엔드(CompositeVideoClip)와 같은 타임라인(배경, 제목, 배치된 시각 자료,
+# 시간 지정 자막, 나레이션 + BGM 믹스)을 하나의 ffmpeg filter_complex 호출로 컴파일합니다.
+# 프레임이 Python/NumPy를 거치지 않으므로 1080x1920 출력에서 합성 비용이 크게 줄어듭니다.
+#
+# 선택: config['render_backend'] = 'ffmpeg' (기본값 'moviepy')
+import os
+import shutil
+import tempfile
+import traceback
+from typing import Any, Dict, List, Optional
+
+from functions import encoder_profiles
+from functions import render_cache
+from functions.ffmpeg_utils import run_ffmpeg
+from functions.render_timeline import Timeline
+
+TEXT_WIDTH_RATIO = 0.9 # MoviePy 백엔드와 동일한 자막/제목 폭 비율
+
+
+# --- Helper 1: MoviePy 위치 값 -> overlay 좌표식 ---
+def _overlay_coord(value: Any, axis: str) -> str:
+    """('center', 285) 같은 MoviePy 위치 값을 overlay 필터의 x/y 식으로 변환합니다."""
+    main, over = ('main_w', 'overlay_w') if axis == 'x' else ('main_h', 'overlay_h')
+    if value == 'center': return f"({main}-{over})/2"
+    if value in ('left', 'top'): return "0"
+    if value in ('right', 'bottom'): return f"{main}-{over}"
+    return str(float(value))
+
+
+# --- Helper 2: 오버레이 입력 추가 ---
+class _FilterGraphBuilder:
+    """입력 목록과 filter_complex 체인을 함께 쌓는 작은 빌더."""
+
+    def __init__(self, fps: float):
+        self.fps = fps
+        self.input_args: List[str] = []
+        self.filters: List[str] = []
+        self.input_count = 0
+        self.label_count = 0
+
+    def add_input(self, path: str, pre_args: Optional[List[str]] = None) -> int:
+        self.input_args += (pre_args or []) + ['-i', path]
+        self.input_count += 1
+        return self.input_count - 1
+
+    def new_label(self, prefix: str) -> str:
+        self.label_count += 1
+        return f"{prefix}{self.label_count}"
+
+    def add_timed_overlay(self, base_label: str, path: str, start: float, duration: float,
+                          x_expr: str, y_expr: str, is_video: bool, scale_filter: Optional[str] = None) -> str:
+        """path를 [start, start+duration] 동안 base_label 위에 overlay하고 새 라벨을 반환합니다."""
+        if is_video: pre_args = ['-stream_loop', '-1', '-t', f"{duration:.3f}"]
+        else: pre_args = ['-loop', '1', '-framerate', str(self.fps), '-t', f"{duration:.3f}"]
+        idx = self.add_input(path, pre_args)
+        src_label = self.new_label('ov')
+        chain = [f"fps={self.fps}"]
+        if scale_filter: chain.append(scale_filter)
+        chain += ["format=rgba", f"setpts=PTS-STARTPTS+{start:.3f}/TB"]
+        self.filters.append(f"[{idx}:v]{','.join(chain)}[{src_label}]")
+        out_label = self.new_label('v')
+        end = start + duration
+        self.filters.append(
+            f"[{base_label}][{src_label}]overlay=x={x_expr}:y={y_expr}:eof_action=pass:"
+            f"enable='between(t,{start:.3f},{end:.3f})'[{out_label}]"
+        )
+        return out_label
+
+
+# --- 메인: filtergraph 렌더 ---
+def render_video_with_ffmpeg(
+    timeline: Timeline,
+    config: Dict[str, Any],
+    base_video_path: str,
+    bgm_path: Optional[str],
+    output_path: str,
+    video_title_from_script: str,
+    normalized_visuals: Optional[Dict[str, str]] = None,
+    mixed_audio_path: Optional[str] = None
+) -> bool:
+    """
+    타임라인을 하나의 ffmpeg filter_complex 호출로 렌더링합니다.
+    제목/자막은 채널 텍스트 래스터 캐시의 RGBA PNG를 overlay 입력으로 사용합니다.
+    normalized_visuals({원본 경로: 프레임 박스 크기 에셋})에 있는 시각 자료는 scale 없이 overlay합니다.
+    mixed_audio_path(NumPy 믹서 결과 WAV)가 있으면 나레이션 adelay 배치/BGM amix 대신 그대로 mux합니다.
+    """
+    from functions import video_generation_basic as vgb
+
+    total_duration = float(timeline.total_duration or 0)
+    if total_duration <= 0: print("오류(ffmpeg 백엔드): 유효한 total_duration 없음"); return False
+    width, height = int(config['resolution'][0]), int(config['resolution'][1])
+    fps = config.get('fps', 30)
+    text_width = int(width * TEXT_WIDTH_RATIO)
+
+    text_cache_dir = render_cache.get_render_cache_dir(config, 'text')
+    temp_dir = tempfile.mkdtemp(prefix="pamin_ffmpeg_")
+    if not text_cache_dir: text_cache_dir = temp_dir # 채널 캐시가 없으면 이번 렌더 동안만 사용
+
+    try:
+        graph = _FilterGraphBuilder(fps)
+
+        # --- 1. 배경 (루프, 목표 해상도로 스케일 - 채널 캐시가 있으면 이미 스케일된 에셋을 그대로 사용) ---
+        cached_bg_path = render_cache.get_background_asset_path(base_video_path, config)
+        bg_idx = graph.add_input(cached_bg_path or base_video_path, ['-stream_loop', '-1', '-t', f"{total_duration:.3f}"])
+        bg_scale = "" if cached_bg_path else f"fps={fps},scale={width}:{height},setsar=1,"
+        graph.filters.append(f"[{bg_idx}:v]{bg_scale}setpts=PTS-STARTPTS[bg]")
+        current = 'bg'
+
+        # --- 2. 제목 ---
+        title_png = render_cache.get_text_raster_path(
+            video_title_from_script, config['title_font_path'], config['title_font_size'],
+            config['title_font_color'], text_width, text_cache_dir
+        )
+        if title_png:
+            title_pos = config['title_position']
+            current = graph.add_timed_overlay(current, title_png, 0.0, total_duration,
+                                              _overlay_coord(title_pos[0], 'x'), _overlay_coord(title_pos[1], 'y'), is_video=False)
+        else: print("  - 경고(ffmpeg 백엔드): 제목 래스터 생성 실패, 제목 없이 진행")
+
+        # --- 3. 시각 자료 (프레임 박스 안에 맞춰 중앙 배치) ---
+        frame_box = vgb.compute_image_frame_box(config)
+        box_w = int(frame_box['target_width']); box_h = int(frame_box['target_height'])
+        scale_fit = f"scale={box_w}:{box_h}:force_original_aspect_ratio=decrease"
+        normalized_visuals = normalized_visuals or {}
+        visual_count = 0
+        for event in timeline.visuals:
+            source_path = normalized_visuals.get(event.source, event.source)
+            ext = os.path.splitext(source_path)[1].lower()
+            if ext == '.gif' or ext in vgb.VIDEO_EXTENSIONS: is_video = True
+            elif ext in vgb.IMAGE_EXTENSIONS: is_video = False
+            else: continue
+            current = graph.add_timed_overlay(
+                current, source_path, event.start, event.duration,
+                f"{frame_box['center_x']:.1f}-overlay_w/2", f"{frame_box['center_y']:.1f}-overlay_h/2",
+                is_video=is_video, scale_filter=None if event.source in normalized_visuals else scale_fit
+            )
+            visual_count += 1
+
+        # --- 4. 자막 ---
+        text_pos = config.get('text_position', ('center', 0.8))
+        subtitle_count = 0
+        for event in timeline.subtitles:
+            png_path = render_cache.get_text_raster_path(
+                event.text, config.get('font_path', 'Arial'), config.get('font_size', 60),
+                config.get('font_color', 'black'), text_width, text_cache_dir, bg_color=config.get('text_highlight_color')
+            )
+            if not png_path: continue
+            current = graph.add_timed_overlay(current, png_path, event.start, event.duration,
+                                              _overlay_coord(text_pos[0], 'x'), _overlay_coord(text_pos[1], 'y'), is_video=False)
+            subtitle_count += 1
+        graph.filters.append(f"[{current}]format=yuv420p[vout]")
+
+        # --- 5. 오디오 (믹스된 WAV, 없으면 나레이션을 각 시작 위치에 배치 + BGM 믹스) ---
+        audio_map = None
+        if mixed_audio_path:
+            audio_map = f"{graph.add_input(mixed_audio_path)}:a"
+        elif timeline.narration:
+            narr_labels = []
+            for event in timeline.narration: # 누락된 문장이 있어도 뒤 문장이 당겨지지 않도록 start에 배치
+                narr_idx = graph.add_input(event.source); delay_ms = int(round(event.start * 1000)); label = graph.new_label('narr')
+                graph.filters.append(f"[{narr_idx}:a]adelay={delay_ms}|{delay_ms},apad,atrim=duration={total_duration:.3f}[{label}]")
+                narr_labels.append(f"[{label}]")
+            # 모든 입력을 total_duration까지 채웠으므로 amix의 입력 수 나눗셈은 일정 -> volume=N으로 보정
+            graph.filters.append("".join(narr_labels) + f"amix=inputs={len(narr_labels)}:duration=first:dropout_transition=0,volume={len(narr_labels)}[narr]")
+            audio_map = '[narr]'
+            if bgm_path and os.path.exists(bgm_path):
+                bgm_idx = graph.add_input(bgm_path)
+                graph.filters.append(f"[{bgm_idx}:a]volume={config.get('bgm_volume_factor', 0.20)},atrim=duration={total_duration:.3f}[bgm]")
+                # amix는 입력 수로 나누므로 volume=2로 보정 (ffmpeg 4.4 미만에는 normalize 옵션 없음)
+                graph.filters.append("[narr][bgm]amix=inputs=2:duration=first:dropout_transition=0,volume=2[aout]")
+                audio_map = '[aout]'
+
+        print(f"  - ffmpeg filtergraph: 입력 {graph.input_count}개 (시각 자료 {visual_count}, 자막 {subtitle_count})")
+        script_path = os.path.join(temp_dir, "filter_complex.txt") # Windows 명령줄 길이 제한 회피
+        with open(script_path, 'w', encoding='utf-8') as f: f.write(";\n".join(graph.filters))
+
+        render_threads = config.get('render_threads') or os.cpu_count()
+        profile = encoder_profiles.resolve_encoder_profile(config)
+        print(f"  - 인코더: {encoder_profiles.describe_profile(profile)}")
+        video_args = ['-c:v', 'libx264', '-preset', profile['preset']] + encoder_profiles.build_x264_params(profile, fps) + \
+                     ['-r', str(fps), '-threads', str(render_threads), '-t', f"{total_duration:.3f}"]
+        base_args = graph.input_args + ['-filter_complex_script', script_path, '-map', '[vout]']
+        audio_args = ['-map', audio_map, '-c:a', 'aac'] if audio_map else []
+        if encoder_profiles.is_two_pass(profile):
+            passlog_prefix = os.path.join(temp_dir, "x264pass")
+            if not run_ffmpeg(base_args + ['-an'] + video_args + encoder_profiles.two_pass_params(1, passlog_prefix) + ['-f', 'mp4', os.devnull],
+                              "ffmpeg 백엔드 렌더 (2-pass 1차)"): return False
+            video_args += encoder_profiles.two_pass_params(2, passlog_prefix)
+        return run_ffmpeg(base_args + audio_args + video_args + ['-movflags', '+faststart', output_path], "ffmpeg 백엔드 렌더")
+    except Exception as e:
+        print(f"오류(ffmpeg 백엔드): {e}"); traceback.print_exc(); return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
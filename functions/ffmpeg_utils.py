@@ -0,0 +1,45 @@
+# PaMin/functions/ffmpeg_utils.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === ffmpeg 실행 헬퍼 ===
+# ==============================================================================
+# 렌더 백엔드/에셋 캐시가 공통으로 사용하는 ffmpeg 바이너리 탐색 및 실행 함수입니다.
+# MoviePy와 동일하게 imageio-ffmpeg가 제공하는 바이너리를 우선 사용합니다.
+import os
+import shutil
+import subprocess
+from typing import List, Optional
+
+_ffmpeg_exe_cache: Optional[str] = None
+
+
+def get_ffmpeg_exe() -> str:
+    """사용할 ffmpeg 실행 파일 경로를 반환합니다 (환경변수 FFMPEG_BINARY > imageio-ffmpeg > PATH)."""
+    global _ffmpeg_exe_cache
+    if _ffmpeg_exe_cache: return _ffmpeg_exe_cache
+    exe = os.environ.get('FFMPEG_BINARY')
+    if not exe or exe == 'ffmpeg-imageio':
+        try:
+            import imageio_ffmpeg
+            exe = imageio_ffmpeg.get_ffmpeg_exe()
+        except Exception:
+            exe = shutil.which('ffmpeg') or 'ffmpeg'
+    _ffmpeg_exe_cache = exe
+    return exe
+
+
+def run_ffmpeg(args: List[str], description: str = "ffmpeg") -> bool:
+    """
+    ffmpeg를 `-y -hide_banner -loglevel error` 옵션과 함께 실행합니다.
+    실패 시 stderr 마지막 부분을 출력하고 False를 반환합니다.
+    """
+    cmd = [get_ffmpeg_exe(), '-y', '-hide_banner', '-loglevel', 'error'] + [str(a) for a in args]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        print(f"오류({description}): ffmpeg 실행 파일을 찾을 수 없습니다 - {cmd[0]}"); return False
+    if result.returncode != 0:
+        stderr_tail = result.stderr.decode('utf-8', errors='replace')[-2000:]
+        print(f"오류({description}): ffmpeg 종료 코드 {result.returncode}\n{stderr_tail}")
+        return False
+    return True
@@ -0,0 +1,109 @@
+# PaMin/functions/forced_alignment.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === 강제 정렬 타임스탬프 백엔드 (torchaudio MMS_FA) ===
+# ==============================================================================
+# 문장 텍스트(processed_sentence)를 이미 알고 있으므로 ASR 디코딩 없이 CTC 강제 정렬로 단어 시간을 구합니다.
+# 음향 모델을 한 번 통과시킨 뒤 알려진 토큰 열에 대한 Viterbi 정렬만 수행하므로 Whisper 전사보다 빠르고,
+# 결과 단어가 원문 그대로라 자막 정렬에서 불일치 구간(Context Gap)이 생기지 않습니다.
+#
+# MMS_FA의 사전은 로마자 소문자이므로 단어를 로마자로 변환합니다.
+#   - uroman 패키지가 있으면 사용 (모든 문자 체계)
+#   - 없으면 내장 한글 로마자 변환 (초성/중성/종성 분해, 음운 변화 미적용) + 라틴 문자
+# 로마자로 바꿀 수 없는 단어(기호 등)는 직전 단어 끝에 길이 0으로 배치합니다.
+#
+# 사용: tts_config.json의 "timestamp_backend": "forced" (기본값 "whisper")
+import re
+import sys
+from typing import Any, Dict, List, Optional
+
+import torch
+import torchaudio
+
+try:
+    import uroman as _uroman # 선택: 범용 로마자 변환
+    _uroman_instance = _uroman.Uroman()
+except Exception:
+    _uroman_instance = None
+
+_BUNDLE = torchaudio.pipelines.MMS_FA # sample_rate 16000
+_HANGUL_BASE, _HANGUL_END = 0xAC00, 0xD7A3
+_INITIALS = ['g', 'kk', 'n', 'd', 'tt', 'r', 'm', 'b', 'pp', 's', 'ss', '', 'j', 'jj', 'ch', 'k', 't', 'p', 'h']
+_MEDIALS = ['a', 'ae', 'ya', 'yae', 'eo', 'e', 'yeo', 'ye', 'o', 'wa', 'wae', 'oe', 'yo', 'u', 'wo', 'we', 'wi', 'yu', 'eu', 'ui', 'i']
+_FINALS = ['', 'k', 'k', 'k', 'n', 'n', 'n', 't', 'l', 'k', 'm', 'l', 'l', 'l', 'p', 'l', 'm', 'p', 'p', 't', 't', 'ng', 't', 't', 'k', 't', 'p', 't']
+_NON_DICT_RE = re.compile(r"[^a-z']")
+
+
+# --- Helper 1: 로마자 변환 ---
+def romanize_hangul(text: str) -> str:
+    """한글 음절을 초성/중성/종성 로마자로 바꿉니다 (그 외 문자는 그대로)."""
+    out = []
+    for ch in text:
+        code = ord(ch)
+        if _HANGUL_BASE <= code <= _HANGUL_END:
+            idx = code - _HANGUL_BASE
+            out.append(_INITIALS[idx // 588] + _MEDIALS[(idx % 588) // 28] + _FINALS[idx % 28])
+        else: out.append(ch)
+    return "".join(out)
+
+
+def romanize_word(word: str) -> str:
+    """MMS_FA 사전 문자(a-z, ')만 남긴 로마자 단어. 변환할 수 없으면 빈 문자열."""
+    romanized = _uroman_instance.romanize_string(word) if _uroman_instance is not None else romanize_hangul(word)
+    return _NON_DICT_RE.sub("", romanized.lower())
+
+
+# --- Helper 2: 모델 ---
+def load_alignment_model(device: Any) -> Any:
+    """MMS_FA 음향 모델 (가중치는 torchaudio가 최초 1회 다운로드)."""
+    print(f"Loading forced alignment model (torchaudio MMS_FA) to {device}...")
+    model = _BUNDLE.get_model().to(device)
+    model.eval()
+    return model
+
+
+# --- 메인: 문장 강제 정렬 ---
+def align_transcript(audio_path: str, transcript: str, model: Any, device: Any, audio: Optional[Any] = None) -> List[Dict[str, Any]]:
+    """
+    audio_path에 transcript(공백 단위 단어)를 강제 정렬하여 extract_whisper_timestamps와 같은 단어 dict 목록
+    {word, start, end, duration, confidence}를 반환합니다. confidence는 단어 토큰 프레임의 평균 확률입니다.
+    audio: 메모리의 16kHz 모노 float32 배열 (있으면 파일을 읽지 않음).
+    """
+    words = transcript.split()
+    if not words: return []
+    if audio is not None:
+        waveform = torch.as_tensor(audio, dtype=torch.float32).unsqueeze(0)
+    else:
+        waveform, sample_rate = torchaudio.load(audio_path)
+        if waveform.size(0) > 1: waveform = waveform.mean(dim=0, keepdim=True)
+        if sample_rate != _BUNDLE.sample_rate: waveform = torchaudio.functional.resample(waveform, sample_rate, _BUNDLE.sample_rate)
+    duration = waveform.size(1) / _BUNDLE.sample_rate
+
+    romanized = [romanize_word(w) for w in words]
+    kept = [i for i, r in enumerate(romanized) if r]
+    if not kept: print(f"  Forced alignment: no alignable characters in '{transcript[:40]}'", file=sys.stderr); return []
+    with torch.inference_mode():
+        emission, _ = model(waveform.to(device))
+        token_spans = _BUNDLE.get_aligner()(emission[0], _BUNDLE.get_tokenizer()([romanized[i] for i in kept]))
+    seconds_per_frame = duration / emission.size(1)
+
+    spans_by_word: Dict[int, Any] = dict(zip(kept, token_spans))
+    word_timestamps: List[Dict[str, Any]] = []
+    last_end = 0.0
+    for i, word in enumerate(words):
+        spans = spans_by_word.get(i)
+        if spans:
+            start = spans[0].start * seconds_per_frame; end = max(start, spans[-1].end * seconds_per_frame)
+            frames = sum(len(s) for s in spans)
+            confidence = sum(s.score * len(s) for s in spans) / frames if frames else 0.0
+        else: # 로마자로 바꿀 수 없는 단어
+            start = end = last_end; confidence = 0.0
+        last_end = end
+        word_timestamps.append({
+            "word": word,
+            "start": round(start, 3),
+            "end": round(end, 3),
+            "duration": round(end - start, 3),
+            "confidence": round(min(1.0, max(0.0, float(confidence))), 3)
+        })
+    return word_timestamps
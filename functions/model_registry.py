@@ -0,0 +1,139 @@
+# PaMin/functions/model_registry.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === 모델 레지스트리 (지연 로드 + LRU 메모리 예산) ===
+# ==============================================================================
+# Zonos / Whisper / 강제 정렬 모델을 프로세스 단위로 보관합니다. Streamlit 서버와 헤드리스 실행 모두에서 동작합니다
+# (st.cache_resource와 달리 명시적으로 해제할 수 있고, 메모리 예산을 넘으면 가장 오래 안 쓴 모델부터 내립니다).
+#
+#   model = registry.get(("whisper", "large", "cpu", "fp32"), lambda: whisper.load_model("large"))  # 첫 사용 시 로드
+#   registry.unload(("whisper", "large", "cpu", "fp32")); registry.unload_all()
+#
+# 예산: tts_config.json의 "model_memory_budget_gb" 또는 환경 변수 PAMIN_MODEL_MEMORY_BUDGET_GB (없으면 무제한).
+# 모델 크기는 파라미터 + 버퍼 바이트로 측정하며, 한 번 로드한 키는 크기를 기억해 다음 로드 전에 미리 공간을 비웁니다.
+# 레지스트리에서 내린 모델도 호출자가 참조를 들고 있으면 그 참조가 사라질 때 해제됩니다.
+#
+# 정밀도 (quantize_model): "fp32" (기본) | "fp16" (CUDA, model.half()) | "int8" (CPU, nn.Linear 동적 양자화)
+import gc
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+MODEL_PRECISIONS = ("fp32", "fp16", "int8")
+BUDGET_ENV_VAR = "PAMIN_MODEL_MEMORY_BUDGET_GB"
+
+
+# --- Helper 1: 모델 크기 / 메모리 반환 ---
+def estimate_model_bytes(model: Any) -> int:
+    """torch 모듈이면 파라미터 + 버퍼 바이트, 아니면 0 (예산 계산에서 제외)."""
+    if torch is None or not isinstance(model, torch.nn.Module): return 0
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def _release_memory() -> None:
+    gc.collect()
+    if torch is not None and torch.cuda.is_available(): torch.cuda.empty_cache()
+
+
+def _budget_bytes(budget_gb: Optional[float]) -> Optional[int]:
+    return int(float(budget_gb) * (1 << 30)) if budget_gb not in (None, "", 0) else None
+
+
+# --- Helper 2: 정밀도 변환 ---
+def quantize_model(model: Any, precision: Optional[str], device: Any) -> Any:
+    """
+    precision에 맞게 모델을 변환합니다. 장치와 맞지 않는 조합(CPU fp16, GPU int8)은 경고 후 fp32로 둡니다.
+    int8은 정확히 torch.nn.Linear인 층만 동적 양자화하므로 자체 Linear 서브클래스를 쓰는 모델은 효과가 없을 수 있습니다.
+    """
+    precision = (precision or "fp32").lower()
+    if precision == "fp32" or torch is None: return model
+    device_type = getattr(device, "type", str(device))
+    if precision == "fp16":
+        if device_type != "cuda": print("Warning: fp16 requires CUDA; keeping fp32.", file=sys.stderr); return model
+        return model.half()
+    if precision == "int8":
+        if device_type != "cpu": print("Warning: int8 dynamic quantization is CPU-only; keeping fp32.", file=sys.stderr); return model
+        linear_count = sum(1 for m in model.modules() if type(m) is torch.nn.Linear)
+        if not linear_count: print("Warning: No torch.nn.Linear layers to quantize; keeping fp32.", file=sys.stderr); return model
+        print(f"Quantizing {linear_count} Linear layer(s) to int8...")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    print(f"Warning: Unknown model precision '{precision}'; keeping fp32.", file=sys.stderr)
+    return model
+
+
+# --- 레지스트리 ---
+class ModelRegistry:
+    """키별 모델을 지연 로드하고 LRU 순서로 보관합니다. 모든 메서드는 스레드 안전합니다."""
+
+    def __init__(self, budget_gb: Optional[float] = None):
+        self._models: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict() # 앞쪽이 가장 오래 안 쓴 모델
+        self._known_bytes: Dict[Hashable, int] = {}
+        self._budget = _budget_bytes(budget_gb)
+        self._lock = threading.RLock()
+
+    def set_budget(self, budget_gb: Optional[float]) -> None:
+        """메모리 예산(GB)을 바꾸고 즉시 초과분을 내립니다. None/0은 무제한."""
+        with self._lock:
+            self._budget = _budget_bytes(budget_gb)
+            self._evict_for(0)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock: return sum(entry["bytes"] for entry in self._models.values())
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """key의 모델을 반환합니다. 없으면 (알려진 크기만큼 공간을 비운 뒤) loader()로 로드합니다."""
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                return entry["model"]
+            self._evict_for(self._known_bytes.get(key, 0), keep=key)
+            print(f"Model registry: loading {key}...")
+            model = loader()
+            size = estimate_model_bytes(model)
+            self._models[key] = {"model": model, "bytes": size}; self._known_bytes[key] = size
+            print(f"Model registry: loaded {key} ({size / (1 << 20):.0f} MB, total {self.total_bytes / (1 << 20):.0f} MB)")
+            self._evict_for(0, keep=key)
+            return model
+
+    def unload(self, key: Hashable) -> bool:
+        """key의 모델을 레지스트리에서 내립니다. 로드되어 있지 않았으면 False."""
+        with self._lock:
+            entry = self._models.pop(key, None)
+            if entry is None: return False
+            print(f"Model registry: unloaded {key} ({entry['bytes'] / (1 << 20):.0f} MB)")
+            del entry
+        _release_memory()
+        return True
+
+    def unload_all(self) -> int:
+        with self._lock: keys = list(self._models)
+        return sum(1 for key in keys if self.unload(key))
+
+    def loaded(self) -> List[Dict[str, Any]]:
+        """로드된 모델 목록 (오래 안 쓴 순서): [{"key", "bytes"}]."""
+        with self._lock: return [{"key": key, "bytes": entry["bytes"]} for key, entry in self._models.items()]
+
+    def _evict_for(self, incoming_bytes: int, keep: Optional[Hashable] = None) -> None:
+        """예산 안에 incoming_bytes가 들어가도록 LRU 순서로 내립니다 (keep은 제외)."""
+        if self._budget is None: return
+        for key in list(self._models):
+            if self.total_bytes + incoming_bytes <= self._budget: break
+            if key != keep: self.unload(key)
+
+
+def _budget_from_env() -> Optional[float]:
+    try: return float(os.environ[BUDGET_ENV_VAR])
+    except (KeyError, ValueError): return None
+
+
+registry = ModelRegistry(_budget_from_env()) # 프로세스 전역 (Streamlit 재실행/배치 실행 간 공유)
@@ -0,0 +1,107 @@
+# PaMin/functions/render_cache.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === 렌더 에셋 캐시 (채널 단위) ===
+# ==============================================================================
+# 채널 디렉토리 아래 render_cache/ 에 렌더 중간 산출물을 내용 기반 키로 저장합니다.
+# 같은 채널의 모든 에피소드, 재렌더, A/B 변형이 캐시를 공유합니다.
+#
+#   channels/[채널]/render_cache/text/<sha1>.png          # 자막/제목 텍스트 래스터 (RGBA)
+#   channels/[채널]/render_cache/background/<sha1>.mp4    # 출력 해상도/FPS로 미리 스케일한 배경 영상
+import os
+import traceback
+from typing import Any, Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+from functions.cache_keys import make_cache_key # 캐시 키 규칙은 cache_keys에서 공유 (render_cache.make_cache_key로도 사용)
+
+RENDER_CACHE_DIRNAME = "render_cache"
+TEXT_RASTER_CACHE_VERSION = 1 # 래스터화 방식이 바뀌면 올려서 기존 캐시 무효화
+BACKGROUND_CACHE_VERSION = 2 # 스케일 방식이 바뀌면 올려서 기존 캐시 무효화 (2: 크롭 없이 늘이기)
+
+
+# --- Helper 1: 캐시 디렉토리 ---
+def get_render_cache_dir(config: Dict[str, Any], kind: str) -> Optional[str]:
+    """config['channel_dir'] 기준 캐시 하위 디렉토리 경로를 반환합니다 (채널 정보가 없으면 None = 캐시 미사용)."""
+    channel_dir = config.get('channel_dir')
+    if not channel_dir: return None
+    cache_dir = os.path.join(channel_dir, RENDER_CACHE_DIRNAME, kind)
+    try: os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e: print(f"경고: 렌더 캐시 디렉토리 생성 실패({cache_dir}): {e}"); return None
+    return cache_dir
+
+
+# --- Helper 2: 원자적 이미지 저장 (여러 렌더 프로세스가 동시에 같은 키를 쓸 수 있음) ---
+def _save_image_atomic(image: Image.Image, path: str) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    image.save(tmp_path, format='PNG')
+    os.replace(tmp_path, path)
+
+
+# --- 텍스트 래스터 캐시 ---
+def _rasterize_text(text: str, style: Dict[str, Any]) -> Image.Image:
+    """MoviePy TextClip으로 한 번 래스터화하여 RGBA 이미지로 변환합니다."""
+    from moviepy import TextClip
+    clip = TextClip(
+        text=text, font_size=style['font_size'], color=style['color'], font=style['font_path'],
+        size=(style['width'], None), method='caption', text_align='center', bg_color=style.get('bg_color')
+    )
+    try:
+        rgb = clip.get_frame(0).astype(np.uint8)
+        if clip.mask is not None: alpha = (clip.mask.get_frame(0) * 255).round().clip(0, 255).astype(np.uint8)
+        else: alpha = np.full(rgb.shape[:2], 255, dtype=np.uint8)
+        return Image.fromarray(np.dstack([rgb, alpha]), mode='RGBA')
+    finally:
+        clip.close()
+
+
+def get_text_raster_path(
+    text: str, font_path: str, font_size: int, color: Any, width: int, cache_dir: str, bg_color: Any = None
+) -> Optional[str]:
+    """
+    (text, font_path, font_size, color, width, bg_color) 키의 RGBA PNG 경로를 반환합니다.
+    캐시에 없으면 한 번 래스터화하여 저장합니다. 실패 시 None.
+    """
+    style = {"font_path": font_path, "font_size": font_size, "color": color, "width": int(width), "bg_color": bg_color}
+    key = make_cache_key("text", TEXT_RASTER_CACHE_VERSION, text, style)
+    png_path = os.path.join(cache_dir, f"{key}.png")
+    if os.path.exists(png_path): return png_path
+    try:
+        _save_image_atomic(_rasterize_text(text, style), png_path)
+        return png_path
+    except Exception as e:
+        print(f"경고: 텍스트 래스터 캐시 생성 실패('{text[:20]}...'): {e}"); traceback.print_exc()
+        return None
+
+
+# --- 배경 영상 캐시 ---
+def get_background_asset_path(base_video_path: str, config: Dict[str, Any]) -> Optional[str]:
+    """
+    채널 base_video를 출력 해상도/FPS에 맞게 한 번만 스케일하여 캐시하고 경로를 반환합니다.
+    캐시가 없을 때의 경로(MoviePy resized(width, height), ffmpeg scale=W:H)와 같은 프레임이 되도록 비율을 유지하지 않고 늘입니다.
+    원본 경로/mtime/크기가 키에 포함되므로 원본이 바뀌면 자동으로 다시 생성됩니다.
+    채널 캐시를 사용할 수 없거나 변환에 실패하면 None (호출 측에서 원본을 프레임 단위로 리사이즈).
+    """
+    cache_dir = get_render_cache_dir(config, 'background')
+    if not cache_dir or not base_video_path or not os.path.exists(base_video_path): return None
+    width, height = int(config['resolution'][0]), int(config['resolution'][1])
+    fps = config.get('fps', 30)
+    st = os.stat(base_video_path)
+    key = make_cache_key("background", BACKGROUND_CACHE_VERSION, os.path.abspath(base_video_path),
+                         st.st_mtime_ns, st.st_size, width, height, fps)
+    asset_path = os.path.join(cache_dir, f"{key}.mp4")
+    if os.path.exists(asset_path): return asset_path
+
+    from functions.ffmpeg_utils import run_ffmpeg
+    print(f"  - 배경 영상 캐시 생성: {os.path.basename(base_video_path)} -> {width}x{height}@{fps}")
+    tmp_path = f"{asset_path}.{os.getpid()}.tmp.mp4"
+    vf = f"scale={width}:{height},setsar=1,fps={fps}"
+    ok = run_ffmpeg(['-i', base_video_path, '-vf', vf, '-an', '-c:v', 'libx264', '-preset', 'veryfast',
+                     '-crf', '16', '-pix_fmt', 'yuv420p', '-g', str(int(fps)), tmp_path], "배경 영상 캐시")
+    if not ok:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, asset_path)
+    return asset_path
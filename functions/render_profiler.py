@@ -0,0 +1,192 @@
+# PaMin/functions/render_profiler.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === 렌더 단계별 프로파일링 ===
+# ==============================================================================
+# generate_complete_video_with_processed_subs의 각 단계(JSON 로드, 자막 처리, 오디오, 배경,
+# 시각 자료, 자막, 합성/인코딩)에 대해 벽시계 시간, 최대 RSS(렌더 프로세스 + ffmpeg 자식 프로세스),
+# 인코딩 FPS, 에셋 개수를 기록합니다.
+#
+#   episodes/[에피소드]/render_profile.json          # 마지막 렌더의 단계별 기록 (미리보기는 render_profile_preview.json)
+#   channels/[채널]/render_profiles.jsonl            # 채널 단위 누적 기록 (렌더 1회당 1줄)
+#
+# 채널 요약: python -m functions.render_profiler channels/쿰쿰파민
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    import psutil # 선택: 단계 중 최대 RSS 샘플링 (없으면 프로세스 생애 최대 RSS만 기록)
+except ImportError:
+    psutil = None
+try:
+    import resource # Unix 전용
+except ImportError:
+    resource = None
+
+PROFILE_FILENAME = "render_profile.json"
+PREVIEW_PROFILE_FILENAME = "render_profile_preview.json"
+CHANNEL_PROFILES_FILENAME = "render_profiles.jsonl"
+RSS_SAMPLE_INTERVAL = 0.2 # 초
+
+
+# --- Helper 1: 메모리 측정 ---
+def _current_rss_mb() -> Optional[float]:
+    """현재 프로세스 + 자식 프로세스(ffmpeg 리더/라이터)의 RSS 합계 (MB)."""
+    if psutil is None: return None
+    try:
+        proc = psutil.Process()
+        rss = proc.memory_info().rss
+        for child in proc.children(recursive=True):
+            try: rss += child.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied): pass
+        return rss / (1024 * 1024)
+    except Exception: return None
+
+
+def _lifetime_peak_rss_mb() -> Optional[float]:
+    """psutil이 없을 때: 프로세스 생애 최대 RSS (Linux는 KB, macOS는 byte 단위)."""
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class _RssSampler(threading.Thread):
+    """단계 진행 중 RSS를 주기적으로 샘플링하여 최대값을 기록하는 데몬 스레드."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak_mb: Optional[float] = None
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            rss = _current_rss_mb()
+            if rss is not None and (self.peak_mb is None or rss > self.peak_mb): self.peak_mb = rss
+            self._stop_event.wait(RSS_SAMPLE_INTERVAL)
+
+    def reset(self) -> Optional[float]:
+        """지금까지의 최대값을 반환하고 다음 단계를 위해 초기화합니다."""
+        peak = self.peak_mb; self.peak_mb = _current_rss_mb(); return peak
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+# --- 프로파일러 ---
+class RenderProfiler:
+    """
+    단계 시작 시 begin(name)을 호출하면 이전 단계가 자동으로 종료됩니다.
+    finish(success)에서 에피소드 render_profile.json 저장 및 채널 누적 기록을 수행합니다.
+    """
+
+    def __init__(self, output_path: str, config: Dict[str, Any], preview: bool = False):
+        self.output_path = output_path
+        self.channel_dir = config.get('channel_dir')
+        self.preview = preview
+        self.info: Dict[str, Any] = {
+            "episode_id": os.path.basename(os.path.dirname(os.path.abspath(output_path))),
+            "output_file": os.path.basename(output_path),
+            "backend": config.get('render_backend', 'moviepy'),
+            "incremental_render": bool(config.get('incremental_render')),
+            "preview": preview,
+            "resolution": list(config.get('resolution') or []),
+            "fps": config.get('fps', 30),
+            "encoder_preset": config.get('encoder_preset', 'medium'),
+            "encoder_profile": config.get('encoder_profile'),
+            "render_threads": config.get('render_threads') or os.cpu_count(),
+            "started_at": datetime.now().isoformat(timespec='seconds'),
+        }
+        self.stages: List[Dict[str, Any]] = []
+        self.counts: Dict[str, Any] = {}
+        self._current: Optional[Dict[str, Any]] = None
+        self._started = time.perf_counter()
+        self._sampler = _RssSampler() if psutil is not None else None
+        if self._sampler: self._sampler.start()
+
+    def begin(self, name: str) -> None:
+        self.end()
+        if self._sampler: self._sampler.reset()
+        self._current = {"stage": name, "_t0": time.perf_counter()}
+
+    def end(self, **counts: Any) -> None:
+        """현재 단계를 종료합니다. counts는 해당 단계의 에셋 개수 등 (예: visuals=12)."""
+        stage = self._current
+        if stage is None: return
+        stage["wall_seconds"] = round(time.perf_counter() - stage.pop("_t0"), 3)
+        peak = self._sampler.reset() if self._sampler else _lifetime_peak_rss_mb()
+        stage["peak_rss_mb"] = round(peak, 1) if peak is not None else None
+        stage.update(counts); self.counts.update(counts)
+        self.stages.append(stage); self._current = None
+
+    def add_counts(self, **counts: Any) -> None:
+        """현재 단계에 에셋 개수 등을 추가합니다."""
+        if self._current is not None: self._current.update(counts)
+        self.counts.update(counts)
+
+    def record_encode(self, frame_count: int) -> None:
+        """인코딩 단계 종료 직전에 호출: 출력 프레임 수와 초당 인코딩 프레임 수를 기록합니다."""
+        if self._current is None: return
+        elapsed = time.perf_counter() - self._current["_t0"]
+        self._current["frames"] = int(frame_count)
+        self._current["encode_fps"] = round(frame_count / elapsed, 2) if elapsed > 0 else None
+
+    def to_dict(self, success: bool) -> Dict[str, Any]:
+        total = time.perf_counter() - self._started
+        peaks = [s["peak_rss_mb"] for s in self.stages if s.get("peak_rss_mb") is not None]
+        rss_now = _current_rss_mb() # 클립 해제 후 값 - 장기 실행 워커에서 렌더마다 증가하면 누수
+        return {**self.info, "success": bool(success), "total_wall_seconds": round(total, 3),
+                "peak_rss_mb": max(peaks) if peaks else None, "rss_after_render_mb": round(rss_now, 1) if rss_now is not None else None,
+                "counts": self.counts, "stages": self.stages}
+
+    def finish(self, success: bool) -> Optional[Dict[str, Any]]:
+        """프로파일을 저장하고 단계별 요약을 출력합니다. 저장 실패는 렌더 결과에 영향을 주지 않습니다."""
+        self.end()
+        if self._sampler: self._sampler.stop()
+        profile = self.to_dict(success)
+        print("  - 렌더 프로파일: " + ", ".join(f"{s['stage']} {s['wall_seconds']:.1f}s" for s in self.stages)
+              + f" (총 {profile['total_wall_seconds']:.1f}s, 최대 RSS {profile['peak_rss_mb']} MB, 종료 후 RSS {profile['rss_after_render_mb']} MB)")
+        try:
+            filename = PREVIEW_PROFILE_FILENAME if self.preview else PROFILE_FILENAME
+            profile_path = os.path.join(os.path.dirname(os.path.abspath(self.output_path)), filename)
+            with open(profile_path, 'w', encoding='utf-8') as f: json.dump(profile, f, ensure_ascii=False, indent=2)
+            if self.channel_dir and not self.preview: # 한 줄 append라 배치 렌더 워커가 동시에 써도 안전
+                with open(os.path.join(self.channel_dir, CHANNEL_PROFILES_FILENAME), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(profile, ensure_ascii=False) + "\n")
+        except Exception as e: print(f"경고: 렌더 프로파일 저장 실패: {e}")
+        return profile
+
+
+# --- 채널 단위 집계 ---
+def summarize_channel_profiles(channel_dir: str) -> Dict[str, Any]:
+    """채널 누적 기록에서 성공한 렌더의 단계별 합계/평균 시간과 최대 RSS를 계산합니다."""
+    profiles_path = os.path.join(channel_dir, CHANNEL_PROFILES_FILENAME)
+    profiles: List[Dict[str, Any]] = []
+    if os.path.exists(profiles_path):
+        with open(profiles_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try: profiles.append(json.loads(line))
+                except json.JSONDecodeError: continue
+    succeeded = [p for p in profiles if p.get('success')]
+    stages: Dict[str, Dict[str, Any]] = {}
+    for profile in succeeded:
+        for stage in profile.get('stages', []):
+            agg = stages.setdefault(stage['stage'], {"renders": 0, "total_seconds": 0.0, "max_peak_rss_mb": None})
+            agg["renders"] += 1; agg["total_seconds"] += stage.get('wall_seconds', 0.0)
+            peak = stage.get('peak_rss_mb')
+            if peak is not None and (agg["max_peak_rss_mb"] is None or peak > agg["max_peak_rss_mb"]): agg["max_peak_rss_mb"] = peak
+    total_seconds = sum(p.get('total_wall_seconds', 0.0) for p in succeeded)
+    for agg in stages.values():
+        agg["mean_seconds"] = round(agg["total_seconds"] / agg["renders"], 3)
+        agg["share"] = round(agg["total_seconds"] / total_seconds, 3) if total_seconds > 0 else None
+        agg["total_seconds"] = round(agg["total_seconds"], 3)
+    return {"renders": len(profiles), "succeeded": len(succeeded), "total_wall_seconds": round(total_seconds, 3), "stages": stages}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2: print("사용법: python -m functions.render_profiler <채널 디렉토리>"); sys.exit(1)
+    print(json.dumps(summarize_channel_profiles(sys.argv[1]), ensure_ascii=False, indent=2))
@@ -0,0 +1,47 @@
+# PaMin/functions/render_session.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === 렌더 세션 (클립 리더 수명 관리) ===
+# ==============================================================================
+# 렌더 1회 동안 생성되는 모든 클립 리더(VideoFileClip/AudioFileClip의 ffmpeg 하위 프로세스,
+# ImageClip/TextClip의 디코딩된 프레임 버퍼)를 소유하고 렌더가 끝나면(성공/실패 무관) 역순으로 닫습니다.
+# 배치 렌더 워커처럼 한 프로세스에서 여러 에피소드를 렌더해도 메모리가 누적되지 않습니다.
+#
+#   with RenderSession() as session:
+#       clip = session.track(VideoFileClip(path))
+import gc
+from typing import Any, List, TypeVar
+
+ClipT = TypeVar('ClipT')
+
+
+class RenderSession:
+    """track()으로 등록된 클립을 close()에서 한 번에 해제합니다."""
+
+    def __init__(self):
+        self._clips: List[Any] = []
+
+    def track(self, clip: ClipT) -> ClipT:
+        """clip을 세션에 등록하고 그대로 반환합니다 (None은 무시)."""
+        if clip is not None: self._clips.append(clip)
+        return clip
+
+    @property
+    def open_clip_count(self) -> int:
+        return len(self._clips)
+
+    def close(self) -> int:
+        """등록된 클립을 생성 역순으로 닫고 해제한 개수를 반환합니다. 개별 close 실패는 무시합니다."""
+        released = 0
+        while self._clips:
+            clip = self._clips.pop()
+            try: clip.close(); released += 1
+            except Exception as e: print(f"  - 경고: 클립 해제 실패 ({type(clip).__name__}): {e}")
+        gc.collect() # 디코딩된 프레임 버퍼를 바로 반환
+        return released
+
+    def __enter__(self) -> 'RenderSession':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
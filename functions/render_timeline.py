@@ -0,0 +1,149 @@
+# PaMin/functions/render_timeline.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === 렌더 타임라인 중간 표현 (Timeline IR) ===
+# ==============================================================================
+# generate_audio_and_timestamps의 최종 JSON(문장 내 상대 시간)을 한 번만 순회하여
+# 절대 시작 시간/길이를 가진 이벤트 트랙으로 변환합니다.
+# MoviePy / ffmpeg / 미리보기 백엔드는 모두 이 타임라인만 소비합니다.
+#
+#   Timeline
+#     ├── visuals    : 시각 자료 이벤트 (Gapless - 다음 시각 자료 시작까지 이어짐)
+#     ├── subtitles  : 자막 이벤트 (사전 처리된 subtitle_chunks)
+#     ├── narration  : 문장별 나레이션 오디오 이벤트
+#     └── speech     : 단어 단위 발화 구간 (Whisper 단어 타임스탬프, BGM 더킹용)
+#
+# 이벤트는 __slots__ 객체라 긴 영상에서도 생성/비교(diff) 비용이 작습니다.
+import os
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+TRACK_NAMES = ('visuals', 'subtitles', 'narration', 'speech')
+
+
+class TimelineEvent:
+    """트랙 위의 단일 이벤트. source는 시각 자료/오디오 경로, text는 자막 텍스트."""
+    __slots__ = ('start', 'duration', 'sentence_index', 'source', 'text')
+
+    def __init__(self, start: float, duration: float, sentence_index: int,
+                 source: Optional[str] = None, text: Optional[str] = None):
+        self.start = start
+        self.duration = duration
+        self.sentence_index = sentence_index
+        self.source = source
+        self.text = text
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+    def key(self) -> Tuple[float, float, int, Optional[str], Optional[str]]:
+        """비교/해시용 키 (시간은 ms 단위로 반올림)."""
+        return (round(self.start, 3), round(self.duration, 3), self.sentence_index, self.source, self.text)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, TimelineEvent) and self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash(self.key())
+
+    def __repr__(self) -> str:
+        label = self.text if self.text is not None else (os.path.basename(self.source) if self.source else '')
+        return f"TimelineEvent({self.start:.3f}+{self.duration:.3f}s, S{self.sentence_index}, {label!r})"
+
+
+class Timeline:
+    """문장 경계 정보와 이벤트 트랙 묶음."""
+    __slots__ = ('total_duration', 'sentence_starts', 'sentence_durations') + TRACK_NAMES
+
+    def __init__(self, total_duration: float):
+        self.total_duration = total_duration
+        self.sentence_starts: List[float] = []
+        self.sentence_durations: List[float] = []
+        self.visuals: List[TimelineEvent] = []
+        self.subtitles: List[TimelineEvent] = []
+        self.narration: List[TimelineEvent] = []
+        self.speech: List[TimelineEvent] = []
+
+    def tracks(self) -> Iterator[Tuple[str, List[TimelineEvent]]]:
+        for name in TRACK_NAMES: yield name, getattr(self, name)
+
+    def events_in_range(self, track_name: str, start: float, end: float) -> List[TimelineEvent]:
+        """[start, end) 구간과 겹치는 이벤트 목록."""
+        return [ev for ev in getattr(self, track_name) if ev.start < end and ev.end > start]
+
+    def diff_sentences(self, other: 'Timeline') -> Set[int]:
+        """두 타임라인에서 이벤트 또는 문장 경계가 달라진 문장 인덱스 집합을 반환합니다."""
+        changed: Set[int] = set()
+        sentence_count = max(len(self.sentence_starts), len(other.sentence_starts))
+        for i in range(sentence_count):
+            a = (self.sentence_starts[i], self.sentence_durations[i]) if i < len(self.sentence_starts) else None
+            b = (other.sentence_starts[i], other.sentence_durations[i]) if i < len(other.sentence_starts) else None
+            if a is None or b is None or round(a[0], 3) != round(b[0], 3) or round(a[1], 3) != round(b[1], 3): changed.add(i)
+        for name, events in self.tracks():
+            ours = set(events); theirs = set(getattr(other, name))
+            changed.update(ev.sentence_index for ev in ours.symmetric_difference(theirs))
+        return changed
+
+    def summary(self) -> Dict[str, Any]:
+        return {"total_duration": self.total_duration, "sentences": len(self.sentence_starts),
+                **{name: len(events) for name, events in self.tracks()}}
+
+
+# --- 타임라인 생성 ---
+def build_timeline(video_data: Dict[str, Any]) -> Timeline:
+    """
+    자막 사전 처리가 끝난 video_data(문장 내 상대 시간)에서 절대 시간 타임라인을 만듭니다.
+    - 자막: subtitle_chunks의 start/end를 문장 시작 시간 기준 절대 시간으로 변환
+    - 시각 자료: 청크 시작 시간 순으로 정렬 후 다음 시각 자료 시작까지 이어지도록(Gapless) 길이 조정
+    - 나레이션: 문장 오디오를 문장 경계에 배치
+    - 발화: 청크별 단어 타임스탬프(문장 내 상대 시간)를 절대 시간으로 변환
+    """
+    sentences = (video_data or {}).get('sentences', [])
+    current_time = 0.0
+    sentence_starts: List[float] = []; sentence_durations: List[float] = []
+    raw_visuals: List[Tuple[float, float, int, str]] = []
+    subtitles: List[TimelineEvent] = []; narration: List[TimelineEvent] = []; speech: List[TimelineEvent] = []
+
+    for s_idx, sentence in enumerate(sentences):
+        sentence_start_time = current_time # 중요: 절대 시간 계산 기준
+        sentence_duration = float(sentence.get('sentence_duration', 0) or 0)
+        sentence_starts.append(sentence_start_time); sentence_durations.append(sentence_duration)
+
+        audio_path = sentence.get('audio_path')
+        if audio_path and os.path.exists(audio_path):
+            narration.append(TimelineEvent(sentence_start_time, sentence_duration, s_idx, source=audio_path))
+
+        for chunk in sentence.get('chunks', []) or []:
+            visual_info = chunk.get('visual_info')
+            if visual_info and 'selected_local_path' in visual_info:
+                visual_path = visual_info['selected_local_path']
+                if visual_path and os.path.exists(visual_path):
+                    start_offset = float(chunk.get('chunk_start_in_sentence', 0)); original_duration = float(chunk.get('chunk_duration', 0))
+                    if original_duration > 0: raw_visuals.append((sentence_start_time + start_offset, original_duration, s_idx, visual_path))
+            for word in chunk.get('words', []) or []:
+                try:
+                    word_start = float(word['start']); word_end = float(word['end'])
+                    if word_end > word_start: speech.append(TimelineEvent(sentence_start_time + word_start, word_end - word_start, s_idx, text=word.get('word')))
+                except (KeyError, TypeError, ValueError): continue
+
+        for chunk in sentence.get('subtitle_chunks', []) or []:
+            try:
+                abs_start = sentence_start_time + chunk['start']
+                duration = (sentence_start_time + chunk['end']) - abs_start
+                if duration <= 0: continue
+                subtitles.append(TimelineEvent(abs_start, duration, s_idx, text=chunk['text']))
+            except Exception as e: print(f"경고: 자막 타이밍 계산 오류: {e}")
+        current_time += sentence_duration # 다음 문장 시작 시간 업데이트
+
+    total_duration = (video_data or {}).get('total_final_audio_duration_seconds', current_time)
+    timeline = Timeline(float(total_duration or 0.0))
+    timeline.sentence_starts = sentence_starts; timeline.sentence_durations = sentence_durations
+    timeline.subtitles = subtitles; timeline.narration = narration
+    timeline.speech = sorted(speech, key=lambda ev: ev.start)
+
+    raw_visuals.sort(key=lambda x: x[0])
+    for i, (abs_start, original_duration, s_idx, visual_path) in enumerate(raw_visuals): # 길이 조정 (Gapless)
+        if i < len(raw_visuals) - 1: duration = max(0.01, raw_visuals[i+1][0] - abs_start)
+        else: duration = max(0.01, min(abs_start + original_duration, timeline.total_duration) - abs_start)
+        timeline.visuals.append(TimelineEvent(abs_start, duration, s_idx, source=visual_path))
+    return timeline
@@ -0,0 +1,161 @@
+# PaMin/functions/segment_render.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === 증분 재렌더 (문장 단위 세그먼트 캐시) ===
+# ==============================================================================
+# 타임라인을 문장 경계(프레임 단위로 정렬)에서 세그먼트로 나누고, 세그먼트별 입력
+# (시각 자료 경로 + mtime, 자막 텍스트/타이밍, 배경, 제목, 렌더 설정)을 해시합니다.
+# 세그먼트는 영상만 담고 오디오는 이어 붙인 뒤 한 번 mux하므로 나레이션 파일은 해시에 넣지 않습니다
+# (타이밍이 같으면 음성만 다시 생성해도 세그먼트 재인코딩 없음).
+# 해시가 같은 세그먼트는 이전에 인코딩한 파일을 재사용하고, 바뀐 세그먼트만 다시 인코딩한 뒤 ffmpeg concat(stream copy)으로 이어 붙이고 오디오를 한 번 mux합니다.
+#
+# 각 세그먼트는 독립적으로 인코딩되어 항상 키프레임(IDR)으로 시작하므로 (GOP 정렬)
+# 재인코딩 없이 이어 붙일 수 있습니다.
+#
+#   episodes/[에피소드]/render_segments/seg_<hash>.mp4
+#   episodes/[에피소드]/render_segments/manifest.json
+#
+# 선택: config['incremental_render'] = True (MoviePy 백엔드)
+import os
+import json
+import traceback
+from typing import Any, Dict, List, Optional
+
+from functions import encoder_profiles
+from functions import render_cache
+from functions.ffmpeg_utils import run_ffmpeg
+from functions.render_timeline import Timeline
+
+SEGMENT_DIRNAME = "render_segments"
+SEGMENT_CACHE_VERSION = 1
+# 세그먼트 픽셀에 영향을 주지 않는 실행 관련 설정 키 (해시에서 제외)
+_NON_VISUAL_CONFIG_KEYS = {'render_threads', 'channel_dir', 'incremental_render', 'render_backend', 'subtitle_debug',
+                           'bgm_volume_factor', 'audio_mixer', 'audio_sample_rate', 'bgm_loop', 'bgm_duck_gain',
+                           'bgm_duck_attack', 'bgm_duck_release', 'bgm_duck_padding', 'bgm_fade_in', 'bgm_fade_out'}
+
+
+# --- Helper 1: 파일 지문 (경로 + mtime + 크기) ---
+def _file_fingerprint(path: Optional[str]) -> Optional[List[Any]]:
+    if not path: return None
+    try:
+        st = os.stat(path)
+        return [os.path.abspath(path), int(st.st_mtime_ns), st.st_size]
+    except OSError:
+        return [path, None, None]
+
+
+# --- Helper 2: 세그먼트 계획 ---
+def plan_segments(timeline: Timeline, fps: float) -> List[Dict[str, Any]]:
+    """
+    문장 경계를 프레임 단위로 반올림하여 세그먼트 목록 [{start_frame, end_frame, sentences}]을 만듭니다.
+    프레임 길이가 0인 문장은 다음 세그먼트에 합쳐집니다.
+    """
+    total_frames = int(round(timeline.total_duration * fps))
+    boundaries = [int(round(start * fps)) for start in timeline.sentence_starts] + [total_frames]
+    segments: List[Dict[str, Any]] = []; pending_sentences: List[int] = []
+    for s_idx in range(len(timeline.sentence_starts)):
+        start_frame = boundaries[s_idx]; end_frame = min(boundaries[s_idx + 1], total_frames)
+        if s_idx == len(timeline.sentence_starts) - 1: end_frame = total_frames # 마지막 세그먼트는 영상 끝까지
+        pending_sentences.append(s_idx)
+        if end_frame <= start_frame: continue
+        seg_start = segments[-1]['end_frame'] if segments else 0
+        segments.append({"start_frame": seg_start, "end_frame": end_frame, "sentences": pending_sentences})
+        pending_sentences = []
+    if pending_sentences and segments: segments[-1]['sentences'].extend(pending_sentences)
+    if not segments and total_frames > 0:
+        segments.append({"start_frame": 0, "end_frame": total_frames, "sentences": list(range(len(timeline.sentence_starts)))})
+    return segments
+
+
+# --- Helper 3: 세그먼트 해시 ---
+def compute_segment_hash(segment: Dict[str, Any], timeline: Timeline, config: Dict[str, Any], fps: float,
+                         base_video_path: str, video_title: str) -> str:
+    """세그먼트 픽셀에 영향을 주는 모든 입력의 해시 (나레이션 타이밍은 자막/시각 자료 타이밍에 이미 반영됨)."""
+    t0 = segment['start_frame'] / fps; t1 = segment['end_frame'] / fps
+    visual_config = {k: v for k, v in config.items() if k not in _NON_VISUAL_CONFIG_KEYS}
+    visuals = [[round(ev.start, 3), round(ev.duration, 3), _file_fingerprint(ev.source)]
+               for ev in timeline.events_in_range('visuals', t0, t1)]
+    subtitles = [[round(ev.start, 3), round(ev.duration, 3), ev.text] for ev in timeline.events_in_range('subtitles', t0, t1)]
+    return render_cache.make_cache_key(
+        "segment", SEGMENT_CACHE_VERSION, segment['start_frame'], segment['end_frame'], fps,
+        visual_config, _file_fingerprint(base_video_path), video_title, visuals, subtitles
+    )
+
+
+# --- 메인: 증분 렌더 ---
+def write_video_incremental(
+    video_clip: Any,
+    audio_clip: Any,
+    timeline: Timeline,
+    config: Dict[str, Any],
+    base_video_path: str,
+    video_title: str,
+    output_path: str
+) -> bool:
+    """
+    합성된 (오디오 없는) video_clip을 세그먼트 단위로 인코딩/재사용하여 output_path에 저장합니다.
+    audio_clip이 오디오 파일 경로(믹스된 WAV)이면 그대로, 클립이면 한 번 WAV로 기록한 뒤 이어 붙인 영상에 mux합니다.
+    """
+    fps = config.get('fps', 30)
+    segments_dir = os.path.join(os.path.dirname(os.path.abspath(output_path)), SEGMENT_DIRNAME)
+    os.makedirs(segments_dir, exist_ok=True)
+    render_threads = config.get('render_threads') or os.cpu_count()
+    gop = int(config.get('segment_gop_frames') or fps * 2)
+    profile = encoder_profiles.resolve_encoder_profile(config) # GOP는 세그먼트 고정 GOP 사용, 2-pass는 미지원
+    x264_params = encoder_profiles.build_x264_params(profile, fps, gop_frames=gop)
+    if encoder_profiles.is_two_pass(profile): print("  - 경고: 증분 렌더는 2-pass를 지원하지 않아 1-pass ABR로 인코딩합니다.")
+
+    segments = plan_segments(timeline, fps)
+    if not segments: print("오류(증분 렌더): 세그먼트 없음"); return False
+
+    reused = 0; encoded = 0; manifest = []
+    for i, segment in enumerate(segments):
+        seg_hash = compute_segment_hash(segment, timeline, config, fps, base_video_path, video_title)
+        seg_path = os.path.join(segments_dir, f"seg_{seg_hash}.mp4")
+        manifest.append({"index": i, "hash": seg_hash, "file": os.path.basename(seg_path),
+                         "start_frame": segment['start_frame'], "end_frame": segment['end_frame'], "sentences": segment['sentences']})
+        if os.path.exists(seg_path): reused += 1; continue
+        t0 = segment['start_frame'] / fps; t1 = segment['end_frame'] / fps
+        print(f"  - 세그먼트 {i+1}/{len(segments)} 인코딩 ({t0:.2f}s ~ {t1:.2f}s)")
+        tmp_path = os.path.join(segments_dir, f"seg_{seg_hash}.tmp.mp4")
+        video_clip.subclipped(t0, t1).write_videofile(
+            tmp_path, fps=fps, codec='libx264', audio=False, threads=render_threads, preset=profile['preset'],
+            ffmpeg_params=x264_params, logger=None
+        )
+        os.replace(tmp_path, seg_path); encoded += 1
+    print(f"  - 세그먼트 재사용 {reused}개 / 새로 인코딩 {encoded}개")
+
+    with open(os.path.join(segments_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump({"fps": fps, "segments": manifest}, f, ensure_ascii=False, indent=2)
+    _prune_unused_segments(segments_dir, {m['file'] for m in manifest})
+
+    # --- 이어 붙이기 (stream copy) + 오디오 mux ---
+    concat_list_path = os.path.join(segments_dir, "concat_list.txt")
+    with open(concat_list_path, 'w', encoding='utf-8') as f:
+        for m in manifest: f.write(f"file '{m['file']}'\n")
+    audio_path = None
+    try:
+        args = ['-f', 'concat', '-safe', '0', '-i', concat_list_path]
+        if isinstance(audio_clip, str):
+            args += ['-i', audio_clip, '-map', '0:v', '-map', '1:a', '-c:a', 'aac']
+        elif audio_clip is not None:
+            audio_path = os.path.join(segments_dir, "mixed_audio.wav")
+            audio_clip.write_audiofile(audio_path, fps=44100, logger=None)
+            args += ['-i', audio_path, '-map', '0:v', '-map', '1:a', '-c:a', 'aac']
+        args += ['-c:v', 'copy', '-t', f"{timeline.total_duration:.3f}", '-movflags', '+faststart', output_path]
+        return run_ffmpeg(args, "세그먼트 concat")
+    except Exception as e:
+        print(f"오류(증분 렌더): {e}"); traceback.print_exc(); return False
+    finally:
+        if audio_path and os.path.exists(audio_path):
+            try: os.remove(audio_path)
+            except OSError: pass
+
+
+def _prune_unused_segments(segments_dir: str, keep_files: set) -> None:
+    """현재 타임라인에서 참조하지 않는 세그먼트 파일을 삭제합니다."""
+    for name in os.listdir(segments_dir):
+        if name.startswith("seg_") and name.endswith(".mp4") and name not in keep_files:
+            try: os.remove(os.path.join(segments_dir, name))
+            except OSError: pass
+
@@ -0,0 +1,265 @@
+# PaMin/functions/text_alignment.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === 자막 정렬 엔진 (전역 DP 정렬) ===
+# ==============================================================================
+# Whisper 단어 시퀀스와 문장 토큰(청크 텍스트의 공백 단위 토큰) 사이를 한 번의 전역 정렬로 맞춥니다.
+# 5단계(audio_generation)가 문장마다 align_sentence를 한 번 호출하여 청크별 단어 배정과 자막 세그먼트를
+# 함께 만들고 오디오 JSON에 저장하므로(subtitle_segments), 6단계는 다시 정렬하지 않습니다.
+#   1. rapidfuzz process.cdist로 단어 x 토큰 유사도 행렬을 한 번에 계산 (C 구현, 멀티스레드)
+#   2. 대각선 주변 밴드 안에서만 Needleman-Wunsch DP (행 단위 NumPy 누적 최대값으로 벡터화)
+#   3. 역추적 경로에서 고신뢰 1:1 매칭(Anchor)과 그 사이 구간(Context Gap)으로 세그먼트 생성
+# 결과는 기존 match_words_to_text_context와 같은 세그먼트 구조({text, start, end, match_type, score})이며,
+# 문장 매핑(map_segments_to_sentence)도 문자 단위 타임스탬프 목록 대신 세그먼트 경계 오프셋 검색으로 처리합니다.
+#
+# subtitle_segments가 없거나 alignment_version이 ALIGNMENT_VERSION과 다른 오디오 JSON: 6단계에서 config['subtitle_aligner'] = 'dp' (기본값) 또는 'legacy' (fuzzywuzzy 중첩 루프)로 정렬
+#
+# 벤치마크 (기존 매처와 속도/결과 비교):
+#   python -m functions.text_alignment channels/쿰쿰파민/episodes/topic_a/audio_timestamps_output.json --repeat 20
+import re
+import sys
+import time
+import json
+import argparse
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import Levenshtein
+
+HIGH_THRESHOLD = 90   # 이 점수 이상의 1:1 매칭은 Anchor (기존 매처의 high_threshold와 동일)
+MATCH_FLOOR = 50      # 유사도가 이보다 낮은 매칭은 DP에서 손해 (gap보다 불리)
+GAP_PENALTY = -0.3    # 단어/토큰 건너뛰기 비용
+BAND_WIDTH = 12       # 대각선 주변 탐색 폭 (토큰 수)
+ALIGNMENT_VERSION = 1 # 오디오 JSON에 저장되는 정렬 결과 버전 - 정렬 방식/형식이 바뀌면 올려서 6단계가 다시 정렬하게 함
+_PUNCT_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def _normalize(text: str) -> str:
+    """점수 계산용: 구두점/공백 제거 (원문 토큰은 그대로 출력)."""
+    return _PUNCT_RE.sub("", text or "")
+
+
+# --- Core 1: 전역 DP 정렬 ---
+def _align_path(scores: np.ndarray, band: int = BAND_WIDTH) -> List[Tuple[str, int, int]]:
+    """
+    (n 단어, m 토큰) 유사도 행렬로 밴드 DP를 수행하고 정렬 경로 [(op, word_idx, token_idx)]를 반환합니다.
+    op: 'M' (단어-토큰 매칭), 'W' (남는 단어), 'T' (남는 토큰). 없는 쪽 인덱스는 -1.
+    """
+    n, m = scores.shape
+    band = max(band, int(np.ceil(m / n)) + band) # 단어 하나에 토큰이 많아도 인접 행의 밴드가 겹치도록
+    gain = (scores.astype(np.float64) - MATCH_FLOOR) / 100.0
+    cols = np.arange(m + 1, dtype=np.float64)
+    H = np.full((n + 1, m + 1), -np.inf)
+    H[0, :] = cols * GAP_PENALTY
+    for i in range(1, n + 1):
+        center = i * m / n; lo = max(0, int(center) - band); hi = min(m, int(np.ceil(center)) + band)
+        A = np.full(m + 1, -np.inf)
+        A[lo:hi + 1] = H[i - 1, lo:hi + 1] + GAP_PENALTY                                   # 단어 건너뛰기
+        j0 = max(1, lo)
+        A[j0:hi + 1] = np.maximum(A[j0:hi + 1], H[i - 1, j0 - 1:hi] + gain[i - 1, j0 - 1:hi])  # 매칭
+        # 토큰 건너뛰기: H[i,j] = max(A[j], H[i,j-1] + gap) = j*gap + cummax(A[k] - k*gap)
+        H[i, :] = cols * GAP_PENALTY + np.maximum.accumulate(A - cols * GAP_PENALTY)
+        H[i, hi + 1:] = -np.inf # 밴드 밖
+
+    path: List[Tuple[str, int, int]] = []
+    i, j = n, m
+    if not np.isfinite(H[n, m]): # 밴드가 끝점에 닿지 않는 극단적 길이 차이: 남은 토큰은 건너뜀으로 처리
+        j = int(np.argmax(H[n])); path.extend(('T', -1, t) for t in range(m - 1, j - 1, -1))
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and np.isclose(H[i, j], H[i - 1, j - 1] + gain[i - 1, j - 1]):
+            path.append(('M', i - 1, j - 1)); i -= 1; j -= 1
+        elif i > 0 and np.isclose(H[i, j], H[i - 1, j] + GAP_PENALTY):
+            path.append(('W', i - 1, -1)); i -= 1
+        elif j > 0:
+            path.append(('T', -1, j - 1)); j -= 1
+        else:
+            path.append(('W', i - 1, -1)); i -= 1
+    path.reverse()
+    return path
+
+
+def _similarity_matrix(word_texts: List[str], tokens: List[str], spoken_tokens: Optional[List[str]] = None) -> np.ndarray:
+    """spoken_tokens(토큰별 TTS 발음 표기, 예: '3개' -> '삼개')가 있으면 원문/발음 중 높은 점수를 사용합니다."""
+    scores = process.cdist(word_texts, tokens, scorer=fuzz.ratio, processor=_normalize, dtype=np.float32, workers=-1)
+    if spoken_tokens is not None:
+        np.maximum(scores, process.cdist(word_texts, spoken_tokens, scorer=fuzz.ratio, processor=_normalize, dtype=np.float32, workers=-1), out=scores)
+    return scores
+
+
+# --- Core 2: 경로 -> 세그먼트 / 청크 배정 ---
+def _segments_from_path(stt_words: List[Dict[str, Any]], tokens: List[str], scores: np.ndarray,
+                        path: List[Tuple[str, int, int]], high_threshold: float = HIGH_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    정렬 경로를 match_words_to_text_context와 같은 구조의 세그먼트 목록으로 변환합니다.
+    Anchor 사이의 매칭되지 않은 구간은 토큰을 이어 붙이고 해당 단어들의 시간 범위를 사용합니다.
+    """
+    results: List[Dict[str, Any]] = []
+    gap_words: List[int] = []; gap_tokens: List[int] = []; gap_scores: List[float] = []
+    last_end = float(stt_words[0]['start'])
+
+    def flush_gap():
+        nonlocal last_end
+        if gap_tokens:
+            text = " ".join(tokens[t] for t in gap_tokens)
+            if gap_words:
+                start = float(stt_words[gap_words[0]]['start']); end = max(start, float(stt_words[gap_words[-1]]['end']))
+                if len(gap_words) == 1 and len(gap_tokens) == 1: match_type = "1:1 Fallback"; score = gap_scores[0] if gap_scores else None
+                else: match_type = f"Context Gap ({len(gap_words)}:{len(gap_tokens)})"; score = None
+            else: # 대응 단어 없는 토큰: 직전 세그먼트 끝에 0 길이로 배치
+                start = end = last_end; match_type = f"Context Gap (0:{len(gap_tokens)})"; score = None
+            results.append({"text": text, "start": start, "end": end, "match_type": match_type, "score": score})
+            last_end = end
+        elif gap_words:
+            last_end = max(last_end, float(stt_words[gap_words[-1]]['end']))
+        gap_words.clear(); gap_tokens.clear(); gap_scores.clear()
+
+    for op, w, t in path:
+        if op == 'M' and scores[w, t] >= high_threshold:
+            flush_gap()
+            start = float(stt_words[w]['start']); end = float(stt_words[w]['end'])
+            results.append({"text": tokens[t], "start": start, "end": end, "match_type": "1:1 Anchor", "score": float(scores[w, t])})
+            last_end = end
+        else:
+            if w >= 0: gap_words.append(w)
+            if t >= 0: gap_tokens.append(t)
+            if op == 'M': gap_scores.append(float(scores[w, t]))
+    flush_gap()
+    return results
+
+
+def _assign_words_to_chunks(path: List[Tuple[str, int, int]], stt_words: List[Dict[str, Any]],
+                            token_chunks: List[int], chunk_count: int) -> List[List[Dict[str, Any]]]:
+    """매칭된 단어는 토큰의 청크로, 남는 단어는 경로상 직전 토큰의 청크(없으면 첫 청크)로 배정합니다."""
+    assignments: List[List[Dict[str, Any]]] = [[] for _ in range(chunk_count)]
+    current_chunk = 0
+    for op, w, t in path:
+        if t >= 0: current_chunk = token_chunks[t]
+        if w >= 0: assignments[current_chunk].append(stt_words[w])
+    return assignments
+
+
+def align_words_to_tokens(stt_words: List[Dict[str, Any]], tokens: List[str],
+                          high_threshold: float = HIGH_THRESHOLD) -> List[Dict[str, Any]]:
+    """Whisper 단어 목록과 토큰 목록을 전역 정렬하여 세그먼트 목록을 반환합니다."""
+    if not stt_words or not tokens: return []
+    scores = _similarity_matrix([str(w.get('word', '')) for w in stt_words], tokens)
+    return _segments_from_path(stt_words, tokens, scores, _align_path(scores), high_threshold)
+
+
+def align_sentence_chunks(chunks_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """문장의 모든 청크 단어/텍스트를 이어 붙여 한 번에 정렬합니다 (청크 경계를 넘는 단어 배정 오차도 흡수)."""
+    stt_words: List[Dict[str, Any]] = []; tokens: List[str] = []
+    for chunk in chunks_data or []:
+        if not chunk.get('chunk_text') or not chunk.get('words'): continue
+        stt_words.extend(chunk['words']); tokens.extend(chunk['chunk_text'].split())
+    return align_words_to_tokens(stt_words, tokens)
+
+
+# --- Core 3: 세그먼트 -> 원문 문장 매핑 ---
+def map_segments_to_sentence(sentence: str, timed_segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    video_generation_basic.map_segments_to_sentence와 같은 결과 구조.
+    문자마다 타임스탬프를 복제하지 않고 세그먼트 시작 오프셋에서 searchsorted로 찾으며, 편집 연산은 rapidfuzz로 계산합니다.
+    """
+    if not timed_segments: return []
+    aligned_text = "".join(seg['text'] for seg in timed_segments)
+    if not aligned_text: return []
+    lengths = np.fromiter((len(seg['text']) for seg in timed_segments), dtype=np.int64, count=len(timed_segments))
+    seg_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    def seg_at(char_idx: int) -> Dict[str, Any]:
+        return timed_segments[int(np.searchsorted(seg_starts, char_idx, side='right')) - 1]
+
+    final_segments = []; last_end_time = timed_segments[0]['start']
+    for op in Levenshtein.opcodes(aligned_text, sentence):
+        tag, i1, i2, j1, j2 = op.tag, op.src_start, op.src_end, op.dest_start, op.dest_end
+        sentence_part = sentence[j1:j2]
+        if tag in ('equal', 'replace'):
+            start_time = seg_at(i1)['start']; end_time = max(start_time, seg_at(i2 - 1)['end']); last_end_time = end_time
+            final_segments.append({"text": sentence_part, "start": start_time, "end": end_time, "source_tag": tag})
+        elif tag == 'insert':
+            final_segments.append({"text": sentence_part, "start": last_end_time, "end": last_end_time, "source_tag": tag})
+    if not final_segments: return []
+    merged = [final_segments[0].copy()]
+    for segment in final_segments[1:]:
+        current = merged[-1]
+        if current['start'] == segment['start'] and current['end'] == segment['end']:
+            current['text'] += segment['text']; current['source_tag'] += "+" + segment['source_tag']
+        else: merged.append(segment.copy())
+    return merged
+
+
+# --- Core 4: 5단계용 단일 정렬 (청크 배정 + 자막 세그먼트) ---
+def align_sentence(word_timestamps: List[Dict[str, Any]], chunk_texts: List[str], sentence: str,
+                   spoken_form: Optional[Callable[[str], str]] = None) -> Tuple[List[List[Dict[str, Any]]], List[Dict[str, Any]]]:
+    """
+    문장 하나의 Whisper 단어 전체를 청크 텍스트 토큰 전체와 한 번 정렬하여
+    (청크별 배정 단어 목록, 원문 문장에 매핑된 자막 세그먼트)를 반환합니다.
+    spoken_form: 토큰 -> TTS 입력 표기 변환 함수 (예: preprocess_text_simple). 주면 원문/발음 중 높은 점수로 정렬합니다.
+    """
+    tokens: List[str] = []; token_chunks: List[int] = []
+    for chunk_idx, text in enumerate(chunk_texts):
+        chunk_tokens = (text or "").split(); tokens.extend(chunk_tokens); token_chunks.extend([chunk_idx] * len(chunk_tokens))
+    if not word_timestamps or not tokens: return [[] for _ in chunk_texts], []
+    spoken_tokens = [spoken_form(tok) for tok in tokens] if spoken_form else None
+    scores = _similarity_matrix([str(w.get('word', '')) for w in word_timestamps], tokens, spoken_tokens)
+    path = _align_path(scores)
+    assignments = _assign_words_to_chunks(path, word_timestamps, token_chunks, len(chunk_texts))
+    segments = map_segments_to_sentence(sentence, _segments_from_path(word_timestamps, tokens, scores, path))
+    return assignments, segments
+
+
+# ==============================================================================
+# === 벤치마크 ===
+# ==============================================================================
+def benchmark(json_path: str, repeat: int = 1) -> Dict[str, Any]:
+    """
+    5단계 결과 JSON의 문장들을 repeat번 이어 붙인 긴 스크립트로 기존 매처(fuzzywuzzy 중첩 루프 + difflib)와
+    DP 엔진의 정렬 시간 및 최종 자막 일치율을 비교합니다.
+    """
+    from functions import video_generation_basic as vgb
+
+    with open(json_path, 'r', encoding='utf-8') as f: data = json.load(f)
+    sentences = [s for s in data.get('sentences', []) if s.get('sentence') and s.get('chunks')] * max(1, repeat)
+    word_count = sum(len(c.get('words') or []) for s in sentences for c in s['chunks'])
+
+    def run(aligner: str) -> Tuple[float, List[List[Dict[str, Any]]]]:
+        started = time.perf_counter(); outputs = []
+        for s in sentences:
+            if aligner == 'legacy':
+                segments = []
+                for c in s['chunks']:
+                    if c.get('chunk_text') and c.get('words'): segments.extend(vgb.match_words_to_text_context(c['words'], c['chunk_text']))
+                mapped = vgb.map_segments_to_sentence(s['sentence'], segments)
+            else:
+                mapped = map_segments_to_sentence(s['sentence'], align_sentence_chunks(s['chunks']))
+            outputs.append(mapped)
+        return time.perf_counter() - started, outputs
+
+    results: Dict[str, Any] = {"sentences": len(sentences), "words": word_count}
+    if vgb.fuzz is not None:
+        legacy_seconds, legacy_out = run('legacy'); results["legacy_seconds"] = round(legacy_seconds, 4)
+    else:
+        legacy_out = None; results["legacy_seconds"] = None; print("  - fuzzywuzzy 없음: 기존 매처 측정 생략")
+    dp_seconds, dp_out = run('dp'); results["dp_seconds"] = round(dp_seconds, 4)
+    if legacy_out is not None:
+        results["speedup"] = round(results["legacy_seconds"] / dp_seconds, 2) if dp_seconds > 0 else None
+        agree = total = 0
+        for a, b in zip(legacy_out, dp_out): # 문자별 시작 시간이 50ms 이내로 같은 비율
+            ta = [seg['start'] for seg in a for _ in seg['text']]; tb = [seg['start'] for seg in b for _ in seg['text']]
+            total += max(len(ta), len(tb)); agree += sum(1 for x, y in zip(ta, tb) if abs(x - y) <= 0.05)
+        results["char_timing_agreement"] = round(agree / total, 4) if total else None
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="자막 정렬 엔진 벤치마크 (기존 매처 vs DP)")
+    parser.add_argument("json_path", help="5단계 결과 JSON (audio_timestamps_output.json)")
+    parser.add_argument("--repeat", type=int, default=1, help="문장을 N번 이어 붙여 긴 스크립트로 측정")
+    args = parser.parse_args(argv)
+    print(json.dumps(benchmark(args.json_path, args.repeat), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
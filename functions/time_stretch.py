@@ -0,0 +1,207 @@
+# PaMin/functions/time_stretch.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === 나레이션 속도 조절 (time-stretch) 백엔드 ===
+# ==============================================================================
+# audio_speed_factor != 1.0일 때 사용하는 피치 유지 속도 조절 엔진입니다. tts_config.json:
+#   "time_stretch_backend": "librosa" (기본값, STFT 위상 보코더) | "wsola" (NumPy WSOLA) | "atempo" (ffmpeg atempo 필터)
+#   "time_stretch_scope":   "sentence" (기본값, 문장별) | "episode" (에피소드 나레이션을 이어 붙여 한 번만 처리)
+# episode 범위에서는 문장 사이에 무음 간격을 두고 한 번에 늘인 뒤 비율로 다시 잘라내며,
+# 단어 타임스탬프는 원래 속도 오디오에서 구한 값을 같은 비율로 환산합니다.
+#
+# 벤치마크 (처리 시간 + librosa 결과 대비 멜 스펙트럼 차이):
+#   python -m functions.time_stretch channels/쿰쿰파민/episodes/topic_a --rate 1.2 --backends librosa wsola atempo
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from functions.ffmpeg_utils import get_ffmpeg_exe
+
+TIME_STRETCH_BACKENDS = ("librosa", "wsola", "atempo")
+EPISODE_STRETCH_GAP = 0.25 # episode 범위에서 문장 사이 무음 (초) - 경계 번짐을 흡수
+WSOLA_MAX_RATE = 2.0 # 이보다 빠르면 분석 hop이 프레임 길이에 가까워져 WSOLA 품질이 떨어짐 (경고, 탐색 범위 확대)
+
+
+# --- 백엔드 1: librosa 위상 보코더 (기존 방식) ---
+def _stretch_librosa(y: np.ndarray, rate: float, sr: int) -> np.ndarray:
+    import librosa
+    return librosa.effects.time_stretch(y, rate=rate)
+
+
+# --- 백엔드 2: WSOLA (파형 유사도 기반 중첩 가산) ---
+def _stretch_wsola(y: np.ndarray, rate: float, sr: int, frame_ms: float = 30.0, tolerance_ms: float = 10.0) -> np.ndarray:
+    """
+    출력 hop마다 입력의 명목 위치(k * hop * rate) 주변 ±tolerance에서 직전 프레임의 자연스러운 연속과
+    가장 닮은 구간을 상호상관으로 찾아 Hann 창으로 중첩 가산합니다. 상관 계산은 ~8kHz로 솎아서 수행합니다.
+    빠른 배율에서는 명목 위치 사이 간격(hop_a)이 커지므로 탐색 범위를 hop_a의 절반까지 넓힙니다.
+    """
+    n = max(64, int(sr * frame_ms / 1000) // 2 * 2); hop_s = n // 2; hop_a = hop_s * rate
+    tol = max(1, int(sr * tolerance_ms / 1000), int(hop_a / 2)); decim = max(1, sr // 8000)
+    out_len = int(np.ceil(len(y) / rate)); num_frames = int(np.ceil(out_len / hop_s)) + 1
+    y_p = np.concatenate([np.zeros(tol, dtype=np.float32), y.astype(np.float32),
+                          np.zeros(int(num_frames * hop_a) - len(y) + 2 * n + 2 * tol if num_frames * hop_a > len(y) else 2 * n + 2 * tol, dtype=np.float32)])
+    window = np.hanning(n).astype(np.float32)
+    out = np.zeros(num_frames * hop_s + n, dtype=np.float32); norm = np.zeros_like(out)
+    prev_pos = 0
+    for k in range(num_frames):
+        nominal = int(round(k * hop_a))
+        if k == 0: pos = 0
+        else:
+            target = y_p[prev_pos + hop_s + tol: prev_pos + hop_s + tol + n: decim]
+            region = y_p[nominal: nominal + n + 2 * tol: decim]
+            corr = np.correlate(region, target, mode='valid')
+            pos = nominal - tol + int(np.argmax(corr)) * decim if len(corr) else nominal
+        out[k * hop_s: k * hop_s + n] += y_p[pos + tol: pos + tol + n] * window
+        norm[k * hop_s: k * hop_s + n] += window
+        prev_pos = pos
+    out = np.where(norm > 1e-3, out / np.maximum(norm, 1e-3), out)
+    return out[:out_len]
+
+
+# --- 백엔드 3: ffmpeg atempo (파이프 입출력, 파일 없음) ---
+def _atempo_chain(rate: float) -> str:
+    """구버전 ffmpeg의 atempo 범위(0.5~2.0)에 맞게 필터를 연결합니다."""
+    factors = []
+    while rate > 2.0: factors.append(2.0); rate /= 2.0
+    while rate < 0.5: factors.append(0.5); rate /= 0.5
+    factors.append(rate)
+    return ",".join(f"atempo={f:.6f}" for f in factors)
+
+
+def _stretch_atempo(y: np.ndarray, rate: float, sr: int) -> np.ndarray:
+    cmd = [get_ffmpeg_exe(), '-hide_banner', '-loglevel', 'error', '-f', 'f32le', '-ar', str(sr), '-ac', '1', '-i', 'pipe:0',
+           '-filter:a', _atempo_chain(rate), '-f', 'f32le', '-ar', str(sr), '-ac', '1', 'pipe:1']
+    result = subprocess.run(cmd, input=y.astype('<f4').tobytes(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0: raise RuntimeError(f"ffmpeg atempo failed: {result.stderr.decode('utf-8', errors='replace')[-500:]}")
+    return np.frombuffer(result.stdout, dtype='<f4').astype(np.float32)
+
+
+_BACKENDS = {"librosa": _stretch_librosa, "wsola": _stretch_wsola, "atempo": _stretch_atempo}
+_warned_rates: set = set() # (backend, rate) 범위 경고는 프로세스당 한 번
+
+
+def recommended_rate_range(backend: str) -> Optional[Tuple[float, float]]:
+    """품질이 보장되는 배율 범위 (제한이 없으면 None). atempo는 범위 밖이면 필터를 연결하므로 제한 없음."""
+    return (1.0 / WSOLA_MAX_RATE, WSOLA_MAX_RATE) if backend == "wsola" else None
+
+
+# --- 공개 API ---
+def stretch(y: np.ndarray, rate: float, sr: int, backend: str = "librosa") -> np.ndarray:
+    """모노 float32 배열을 rate배 빠르게(피치 유지) 합니다. 알 수 없는 백엔드는 librosa."""
+    if abs(rate - 1.0) < 1e-6 or len(y) == 0: return y.astype(np.float32)
+    fn = _BACKENDS.get(backend)
+    rate_range = recommended_rate_range(backend)
+    if rate_range and not rate_range[0] <= rate <= rate_range[1] and (backend, rate) not in _warned_rates:
+        _warned_rates.add((backend, rate))
+        print(f"Warning: {backend} rate {rate} is outside the recommended range {rate_range[0]}~{rate_range[1]}; quality may degrade.", file=sys.stderr)
+    if fn is None: print(f"Warning: Unknown time_stretch_backend '{backend}', using librosa.", file=sys.stderr); fn = _stretch_librosa
+    return np.asarray(fn(y, rate, sr), dtype=np.float32)
+
+
+def stretch_concatenated(arrays: List[np.ndarray], rate: float, sr: int, backend: str = "librosa",
+                         gap_seconds: float = EPISODE_STRETCH_GAP) -> Tuple[List[np.ndarray], float]:
+    """
+    문장 배열들을 gap_seconds 무음을 사이에 두고 이어 붙여 한 번만 늘인 뒤 문장별로 다시 잘라냅니다.
+    반환: (문장별 결과 배열, 시간 환산 비율 = 결과 길이 / 원래 길이). 단어 타임스탬프에 같은 비율을 곱하면 됩니다.
+    """
+    gap = np.zeros(int(gap_seconds * sr), dtype=np.float32)
+    offsets, pieces, cursor = [], [], 0
+    for y in arrays:
+        offsets.append(cursor); pieces.extend([y.astype(np.float32), gap]); cursor += len(y) + len(gap)
+    stretched = stretch(np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32), rate, sr, backend)
+    scale = len(stretched) / cursor if cursor else 1.0 / rate
+    return [stretched[int(round(off * scale)): int(round((off + len(y)) * scale))] for off, y in zip(offsets, arrays)], scale
+
+
+def rescale_word_timestamps(words: List[Dict[str, Any]], scale: float) -> List[Dict[str, Any]]:
+    """원래 속도 오디오 기준 단어 시간을 늘인 오디오 기준으로 환산합니다."""
+    return [{**w, "start": round(w["start"] * scale, 3), "end": round(w["end"] * scale, 3),
+             "duration": round((w["end"] - w["start"]) * scale, 3)} for w in words]
+
+
+# ==============================================================================
+# === 벤치마크 ===
+# ==============================================================================
+def _mel_db(y: np.ndarray, sr: int) -> np.ndarray:
+    import librosa
+    return librosa.power_to_db(librosa.feature.melspectrogram(y=y, sr=sr, n_mels=64), ref=1.0)
+
+
+def benchmark(audio_paths: List[str], rate: float, backends: List[str]) -> List[Dict[str, Any]]:
+    """
+    문장 WAV들을 각 백엔드로 (1) 문장별, (2) 이어 붙여 한 번 처리하는 시간을 재고,
+    librosa 문장별 결과(현재 방식)를 기준으로 멜 스펙트럼 평균 절대 차이(dB)와 길이 오차를 비교합니다.
+    """
+    import librosa
+    clips = [librosa.load(p, sr=None, mono=True) for p in audio_paths]
+    sr = clips[0][1]; arrays = [librosa.resample(y, orig_sr=s, target_sr=sr) if s != sr else y for y, s in clips]
+    total_seconds = sum(len(y) for y in arrays) / sr
+    reference = [stretch(y, rate, sr, "librosa") for y in arrays]
+    results = []
+    for backend in backends:
+        started = time.perf_counter(); per_sentence = [stretch(y, rate, sr, backend) for y in arrays]
+        sentence_seconds = time.perf_counter() - started
+        started = time.perf_counter(); concatenated, scale = stretch_concatenated(arrays, rate, sr, backend)
+        episode_seconds = time.perf_counter() - started
+        mae = []
+        for ref, out in zip(reference, per_sentence):
+            a, b = _mel_db(ref, sr), _mel_db(out, sr); frames = min(a.shape[1], b.shape[1])
+            if frames: mae.append(float(np.abs(a[:, :frames] - b[:, :frames]).mean()))
+        expected = sum(len(y) for y in arrays) / rate
+        rate_range = recommended_rate_range(backend)
+        results.append({
+            "backend": backend, "sentences": len(arrays), "input_seconds": round(total_seconds, 2),
+            "per_sentence_seconds": round(sentence_seconds, 3), "episode_once_seconds": round(episode_seconds, 3),
+            "realtime_factor": round(total_seconds / sentence_seconds, 1) if sentence_seconds > 0 else None,
+            "length_error_pct": round((sum(len(y) for y in per_sentence) - expected) / expected * 100, 2) if expected else None,
+            "episode_time_scale": round(scale, 4),
+            "mel_db_mae_vs_librosa": round(float(np.mean(mae)), 2) if mae else None,
+            "recommended_rate_range": list(rate_range) if rate_range else None,
+            "rate_in_range": rate_range[0] <= rate <= rate_range[1] if rate_range else True,
+        })
+        print(f"  [{backend}] {results[-1]}")
+    return results
+
+
+def _find_episode_audio(path: str) -> List[str]:
+    """에피소드 디렉토리면 원래 속도 문장 WAV(_raw.wav), 없으면 결과 JSON의 audio_path를 사용합니다."""
+    if not os.path.isdir(path): return [path]
+    raw = sorted(glob.glob(os.path.join(path, "**", "sentence_*_raw.wav"), recursive=True))
+    if raw: return raw
+    json_path = os.path.join(path, "audio_timestamps_output.json")
+    if os.path.exists(json_path):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return [s["audio_path"] for s in json.load(f).get("sentences", []) if s.get("audio_path") and os.path.exists(s["audio_path"])]
+    return []
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="나레이션 time-stretch 백엔드 벤치마크")
+    parser.add_argument("inputs", nargs="+", help="에피소드 디렉토리 또는 WAV 파일")
+    parser.add_argument("--rate", type=float, default=1.2, help="속도 배율 (audio_speed_factor)")
+    parser.add_argument("--backends", nargs="+", default=list(TIME_STRETCH_BACKENDS), choices=TIME_STRETCH_BACKENDS)
+    args = parser.parse_args(argv)
+    audio_paths = [p for item in args.inputs for p in _find_episode_audio(item)]
+    if not audio_paths: print("오류: 벤치마크할 오디오 없음"); return 1
+    print(f"--- time-stretch 벤치마크: {len(audio_paths)}개 파일, rate={args.rate} ---")
+    results = benchmark(audio_paths, args.rate, args.backends)
+    print(f"{'backend':<10}{'sentence s':>12}{'episode s':>11}{'x realtime':>12}{'len err %':>11}{'mel dB MAE':>12}{'rate range':>14}")
+    for r in results:
+        rate_range = r['recommended_rate_range']
+        range_text = (f"{rate_range[0]:g}~{rate_range[1]:g}" if rate_range else "any") + ("" if r['rate_in_range'] else " (!)")
+        print(f"{r['backend']:<10}{r['per_sentence_seconds']:>12}{r['episode_once_seconds']:>11}{str(r['realtime_factor']):>12}"
+              f"{str(r['length_error_pct']):>11}{str(r['mel_db_mae_vs_librosa']):>12}{range_text:>14}")
+    for r in results:
+        if not r['rate_in_range']: print(f"경고: {r['backend']}는 rate={args.rate}에서 권장 범위 밖입니다 (품질 저하 가능).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# PaMin/functions/tts_cache.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === TTS 캐시 (채널 단위) ===
+# ==============================================================================
+# 오디오 단계(5단계)의 중간 산출물을 채널 디렉토리 아래 tts_cache/ 에 저장합니다.
+# 채널의 참조 음성은 고정이므로 같은 채널의 모든 에피소드/배치 실행이 캐시를 공유합니다.
+#
+#   channels/[채널]/tts_cache/speaker/<sha1>.pt          # Zonos 스피커 임베딩 (참조 WAV 내용 해시 + 모델 이름 + 장치)
+#   channels/[채널]/tts_cache/sentences/<sha1>.wav|json  # 문장 단위 최종 WAV + 단어 타임스탬프
+#     키: 전처리된 문장 텍스트, 스피커 임베딩 키, 감정/속도/피치, 모델/정밀도, 속도 배율/속도 조절 방식, Whisper 런타임/모델/언어/모드/에피소드 간격, 타임스탬프 백엔드
+#     -> 5단계 재실행 시 바뀌지 않은 문장은 TTS/Whisper 없이 재사용 (tts_config의 "sentence_cache": false로 비활성화)
+import os
+import json
+import shutil
+import traceback
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+
+from functions.cache_keys import make_cache_key, hash_file_content # render_cache/visual_assets와 같은 키 규칙
+
+TTS_CACHE_DIRNAME = "tts_cache"
+SPEAKER_EMBEDDING_CACHE_VERSION = 1 # 임베딩 계산 방식이 바뀌면 올려서 기존 캐시 무효화
+SENTENCE_CACHE_VERSION = 1
+
+_speaker_embedding_memo: Dict[str, Any] = {} # 프로세스 내 재사용 (Streamlit 재실행/배치 실행 시 디스크 로드도 생략)
+
+
+# --- Helper 1: 캐시 디렉토리 / 키 ---
+def get_tts_cache_dir(channel_dir: Optional[str], kind: str) -> Optional[str]:
+    """channel_dir 기준 캐시 하위 디렉토리 경로를 반환합니다 (채널 정보가 없으면 None = 캐시 미사용)."""
+    if not channel_dir: return None
+    cache_dir = os.path.join(channel_dir, TTS_CACHE_DIRNAME, kind)
+    try: os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e: print(f"Warning: Failed to create TTS cache directory ({cache_dir}): {e}"); return None
+    return cache_dir
+
+
+def _save_tensor_atomic(tensor: Any, path: str) -> None:
+    """여러 프로세스가 같은 키를 동시에 쓸 수 있으므로 임시 파일에 저장 후 교체합니다."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(tensor, tmp_path)
+    os.replace(tmp_path, path)
+
+
+# --- 스피커 임베딩 캐시 ---
+def speaker_embedding_key(ref_wav_path: str, model_name: str, device: Any) -> str:
+    return make_cache_key("speaker", SPEAKER_EMBEDDING_CACHE_VERSION, hash_file_content(ref_wav_path), model_name, str(device))
+
+
+def get_speaker_embedding(ref_wav_path: str, model_name: str, device: Any, channel_dir: Optional[str],
+                          compute_fn: Callable[[], Any]) -> Any:
+    """
+    참조 WAV 내용 해시 + 모델 이름 + 장치를 키로 스피커 임베딩을 반환합니다.
+    메모리 -> 채널 캐시(.pt) -> compute_fn() 순서로 찾고, 새로 계산한 임베딩은 채널 캐시에 저장합니다.
+    """
+    key = speaker_embedding_key(ref_wav_path, model_name, device)
+    if key in _speaker_embedding_memo:
+        print("Speaker embedding cache hit (memory).")
+        return _speaker_embedding_memo[key]
+
+    cache_dir = get_tts_cache_dir(channel_dir, "speaker")
+    cache_path = os.path.join(cache_dir, f"{key}.pt") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            embedding = torch.load(cache_path, map_location=device)
+            print(f"Speaker embedding cache hit: {os.path.basename(cache_path)}")
+            _speaker_embedding_memo[key] = embedding
+            return embedding
+        except Exception as e:
+            print(f"Warning: Failed to load cached speaker embedding ({cache_path}): {e}. Recomputing.")
+
+    embedding = compute_fn()
+    _speaker_embedding_memo[key] = embedding
+    if cache_path:
+        try: _save_tensor_atomic(embedding.detach().cpu(), cache_path); print(f"Speaker embedding cached: {os.path.basename(cache_path)}")
+        except Exception as e: print(f"Warning: Failed to save speaker embedding cache: {e}"); traceback.print_exc()
+    return embedding
+
+
+# --- 문장 TTS 결과 캐시 ---
+def sentence_cache_key(processed_text: str, speaker_key: str, tts_config: Dict[str, Any]) -> str:
+    """
+    문장 오디오/타임스탬프에 영향을 주는 값만 키에 포함합니다: generate_zonos_audio_batch가 읽는 TTS 설정,
+    속도 조절 설정, 타임스탬프 경로 설정 (런타임/모델/정밀도/언어/모드/에피소드 전사 간격/백엔드).
+    audio_generation에서 타임스탬프에 영향을 주는 설정을 새로 읽으면 여기에도 추가해야 합니다.
+    """
+    return make_cache_key(
+        "sentence", SENTENCE_CACHE_VERSION, processed_text, speaker_key,
+        tts_config.get("emotion"), tts_config.get("speaking_rate"), tts_config.get("pitch_std"), tts_config.get("language", "ko"),
+        tts_config.get("zonos_model_name", "Zyphra/Zonos-v0.1-transformer"), float(tts_config.get("audio_speed_factor", 1.0)),
+        tts_config.get("whisper_model_size", "large"), tts_config.get("whisper_language", "ko"), tts_config.get("whisper_mode", "episode"),
+        float(tts_config.get("whisper_episode_gap", 0.5)),
+        tts_config.get("timestamp_backend", "whisper"), tts_config.get("time_stretch_backend", "librosa"), tts_config.get("time_stretch_scope", "sentence"),
+        tts_config.get("zonos_precision", "fp32"), tts_config.get("whisper_precision", "fp32"),
+        tts_config.get("whisper_runtime", "openai"), tts_config.get("whisper_compute_type"),
+    )
+
+
+def load_sentence(channel_dir: Optional[str], key: str) -> Optional[Dict[str, Any]]:
+    """캐시 항목 {"wav_path", "words", "duration"} 또는 None (WAV/메타데이터 중 하나라도 없으면 미스)."""
+    cache_dir = get_tts_cache_dir(channel_dir, "sentences")
+    if not cache_dir: return None
+    wav_path = os.path.join(cache_dir, f"{key}.wav"); meta_path = os.path.join(cache_dir, f"{key}.json")
+    if not (os.path.exists(wav_path) and os.path.exists(meta_path)): return None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f: meta = json.load(f)
+        return {"wav_path": wav_path, "words": meta.get("words", []), "duration": float(meta.get("duration", 0.0))}
+    except Exception as e:
+        print(f"Warning: Broken sentence cache entry {key}: {e}"); return None
+
+
+def store_sentence(channel_dir: Optional[str], key: str, wav_path: str, words: List[Dict[str, Any]],
+                   duration: float, processed_text: str) -> None:
+    """최종 WAV와 Whisper 단어 타임스탬프를 저장합니다. 메타데이터를 마지막에 써서 WAV만 있는 항목은 미스로 처리됩니다."""
+    cache_dir = get_tts_cache_dir(channel_dir, "sentences")
+    if not cache_dir or not os.path.exists(wav_path): return
+    try:
+        tmp_wav = os.path.join(cache_dir, f"{key}.wav.{os.getpid()}.tmp")
+        shutil.copy2(wav_path, tmp_wav); os.replace(tmp_wav, os.path.join(cache_dir, f"{key}.wav"))
+        tmp_meta = os.path.join(cache_dir, f"{key}.json.{os.getpid()}.tmp")
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump({"text": processed_text, "duration": round(duration, 3), "words": words}, f, ensure_ascii=False)
+        os.replace(tmp_meta, os.path.join(cache_dir, f"{key}.json"))
+    except Exception as e: print(f"Warning: Failed to store sentence cache entry: {e}")
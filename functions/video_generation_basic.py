@@ -16,20 +16,27 @@ from typing import List, Dict, Any, Optional, Union
 import imageio.v3 as iio
 import traceback
 
-# --- Fuzzywuzzy Import ---
-# 이 모듈은 자막 처리 과정에서 사용됩니다.
+from functions import audio_mixer
+from functions import encoder_profiles
+from functions import render_cache
+from functions import render_profiler
+from functions.render_session import RenderSession
+from functions import render_timeline
+from functions import visual_assets
+
+# --- Fuzzywuzzy Import (선택) ---
+# 5단계가 정렬 결과(subtitle_segments)를 저장하지 않은 이전 오디오 JSON을 subtitle_aligner='legacy'로 처리할 때만 사용됩니다.
 try:
     from fuzzywuzzy import fuzz
-    print("라이브러리 로드 성공: fuzzywuzzy")
 except ImportError:
-    print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-    print("오류: 'fuzzywuzzy' 라이브러리를 찾을 수 없습니다.")
-    print("고급 자막 처리를 사용하려면 fuzzywuzzy 및 python-Levenshtein을 설치해야 합니다.")
-    print("  pip install fuzzywuzzy python-Levenshtein")
-    print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-    # fuzzywuzzy가 없으면 고급 자막 처리를 건너<0xEB><0x9C><0x91>도록 설정하거나, 오류를 발생시킬 수 있습니다.
-    # 여기서는 일단 진행하되, 자막 처리 부분에서 오류가 발생할 수 있습니다.
-    fuzz = None # fuzz 객체를 None으로 설정하여 이후 코드에서 확인 가능하게 함
+    fuzz = None # 기존 매처(match_words_to_text_context) 사용 불가
+
+# --- 자막 정렬 엔진 (rapidfuzz + NumPy 전역 DP) ---
+try:
+    from functions import text_alignment
+except ImportError as e:
+    print(f"경고: 자막 정렬 엔진(text_alignment) 로드 실패 ({e}). 기존 fuzzywuzzy 매처를 사용합니다.")
+    text_alignment = None
 
 # ==============================================================================
 # === 전역 설정 및 경로 ===
@@ -47,13 +54,29 @@ template_config = {
     'text_highlight_color': (0, 0, 0, 172),                          # 자막 배경색 (RGBA)
     'subtitle_target_chars': 35,       # 고급 자막 처리 시 목표 글자 수
     'subtitle_debug': False,           # 고급 자막 처리 디버그 출력 여부
+    'subtitle_aligner': 'dp',          # 'dp' (문장 단위 전역 DP 정렬, functions/text_alignment.py) 또는 'legacy' (fuzzywuzzy 중첩 루프)
     'title_text': "당근이 주황색이 된 이유",                              # 제목
     'title_font_path': 'C:/Users/gaterbelt/Downloads/fonts/NanumGothic.ttf', # 제목 폰트
     'title_font_size': 85, 'title_font_color': 'black',                 # 제목 스타일
     'title_position': ('center', 285),                                 # 제목 위치
-    'bgm_volume_factor': 0.20,                                         # BGM 볼륨 (오디오 생성 시 0.5 하드코딩됨)
+    'bgm_volume_factor': 0.20,                                         # BGM 볼륨
+    'audio_mixer': 'numpy',            # 'numpy' (단일 버퍼 믹스 -> WAV 하나를 인코더가 바로 mux) 또는 'moviepy' (CompositeAudioClip)
+    'bgm_duck_gain': 0.5,              # 나레이션 발화 구간 BGM 감쇠 배율 (1.0이면 더킹 없음)
+    'bgm_fade_in': 0.5, 'bgm_fade_out': 1.5, # BGM 페이드 인/아웃 (초)
+    'render_threads': None,            # 인코딩 스레드 수 (None이면 os.cpu_count(), 배치 렌더 시 워커별로 제한)
+    'channel_dir': None,               # 채널 디렉토리 (설정 시 channel_dir/render_cache/ 에 렌더 에셋 캐시 공유)
+    'render_backend': 'moviepy',       # 'moviepy' (프레임 단위 Python 합성) 또는 'ffmpeg' (단일 filter_complex 호출)
+    'incremental_render': False,       # True: 문장 단위 세그먼트 캐시로 바뀐 구간만 재인코딩 (MoviePy 백엔드)
+    'encoder_preset': 'medium',        # libx264 preset (encoder_profile 미지정 시)
+    'encoder_profile': None,           # 'draft' / 'upload-quality' / 'archive' 또는 encoder_profiles에 정의한 이름 (functions/encoder_profiles.py)
+    'preview_scale': 0.25,             # 미리보기 렌더 해상도 배율
+    'preview_fps': 10,                 # 미리보기 렌더 FPS
 }
 
+# --- 시각 자료 확장자 분류 ---
+VIDEO_EXTENSIONS = ['.mp4', '.mov', '.avi', '.webm']
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']
+
 # --- 파일 경로 ---
 JSON_PATH = 'processed_video_data.json'
 BASE_VIDEO_PATH = 'C:/Users/gaterbelt/Downloads/쿰쿰파민.mp4'
@@ -90,6 +113,51 @@ def convert_gif_to_mp4(gif_path: str) -> Optional[str]:
     return mp4_path
 
 
+# --- Helper 3: 미리보기 렌더 설정 ---
+def make_preview_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    해상도/폰트 크기/픽셀 좌표를 preview_scale 배로 줄이고, 낮은 FPS와 ultrafast preset을 쓰는 미리보기용 설정을 만듭니다.
+    레이아웃 비율은 그대로이므로 시각 자료/자막 타이밍 확인에 사용할 수 있습니다.
+    """
+    scale = float(config.get('preview_scale', 0.25))
+    def scale_px(value):
+        return value * scale if isinstance(value, (int, float)) else value
+    preview = dict(config)
+    width, height = config['resolution']
+    preview['resolution'] = (max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)) # yuv420p는 짝수 크기 필요
+    preview['fps'] = config.get('preview_fps', 10)
+    for key in ('font_size', 'title_font_size'):
+        if key in config: preview[key] = max(1, int(round(config[key] * scale)))
+    for key in ('text_position', 'title_position', 'image_frame_position'):
+        if key in config: preview[key] = tuple(scale_px(v) for v in config[key])
+    preview['encoder_preset'] = 'ultrafast'; preview['encoder_profile'] = 'draft'
+    preview['incremental_render'] = False # 최종 렌더 세그먼트 캐시를 건드리지 않음
+    return preview
+
+
+# --- Helper 4: 렌더 세션에 클립 등록 ---
+def _track(session: Optional[RenderSession], clip: Any) -> Any:
+    """session이 있으면 clip 리더를 등록하여 렌더 종료 시 닫히도록 합니다."""
+    return session.track(clip) if session is not None else clip
+
+
+# --- Helper 5: 텍스트 클립 생성 (채널 래스터 캐시 사용) ---
+def create_text_clip(text: str, config: Dict[str, Any], font_path: str, font_size: int, color: Any,
+                     width: int, bg_color: Any = None, session: Optional[RenderSession] = None) -> Union[ImageClip, TextClip]:
+    """
+    채널 텍스트 래스터 캐시가 있으면 캐시된 RGBA PNG로 ImageClip을 만들고,
+    없거나 실패하면 기존처럼 TextClip을 직접 래스터화합니다.
+    """
+    cache_dir = render_cache.get_render_cache_dir(config, 'text')
+    if cache_dir:
+        png_path = render_cache.get_text_raster_path(text, font_path, font_size, color, width, cache_dir, bg_color=bg_color)
+        if png_path: return _track(session, ImageClip(png_path, transparent=True))
+    return _track(session, TextClip(
+        text=text, font_size=font_size, color=color, font=font_path,
+        size=(int(width), None), method='caption', text_align='center', bg_color=bg_color
+    ))
+
+
 # --- Subtitle Processing Helper: finalize_chunk ---
 def finalize_chunk(segments):
     # (사용자 제공 스크립트의 함수)
@@ -212,20 +280,33 @@ def adjust_chunk_durations(subtitle_chunks, target_duration, debug=False):
         adjusted_chunks.append(new_chunk)
     return adjusted_chunks
 
+# --- Subtitle Processing Helper: 저장된 정렬 결과 사용 가능 여부 ---
+def has_current_alignment(sentence_info: Dict[str, Any]) -> bool:
+    """5단계가 저장한 subtitle_segments가 현재 text_alignment.ALIGNMENT_VERSION으로 만들어졌는지 확인합니다."""
+    return bool(sentence_info.get('subtitle_segments')) and text_alignment is not None \
+        and sentence_info.get('alignment_version') == text_alignment.ALIGNMENT_VERSION
+
 # --- Subtitle Processing Orchestrator ---
-def process_subtitle_data(input_data, target_char_count=30, debug=False):
-    """Processes loaded video data to refine subtitle chunks."""
-    if not fuzz: # Check if fuzzywuzzy was loaded
+def process_subtitle_data(input_data, target_char_count=30, debug=False, aligner='dp'):
+    """
+    Processes loaded video data to refine subtitle chunks.
+    5단계가 저장한 subtitle_segments가 현재 정렬 버전이면 그대로 사용하고 (재정렬 없음),
+    없거나 alignment_version이 다르면 (이전 JSON, 정렬 방식 변경) aligner로 다시 정렬합니다.
+    aligner: 'dp' (text_alignment) or 'legacy' (fuzzywuzzy).
+    """
+    if not isinstance(input_data, dict) or 'sentences' not in input_data:
+        print("오류: 입력 데이터 형식이 잘못되었습니다 (dict 및 'sentences' 키 필요).")
+        return None
+    needs_alignment = any(s.get('chunks') and not has_current_alignment(s) for s in input_data.get('sentences', []))
+    if aligner == 'dp' and text_alignment is None: aligner = 'legacy'
+    if needs_alignment and aligner != 'dp' and not fuzz: # Check if fuzzywuzzy was loaded
          print("오류: fuzzywuzzy 라이브러리 누락으로 자막 처리 불가.")
          # Return original structure or indicate failure
          return None # Indicate failure to process
 
     all_processed_sentences = []
-    if not isinstance(input_data, dict) or 'sentences' not in input_data:
-        print("오류: 입력 데이터 형식이 잘못되었습니다 (dict 및 'sentences' 키 필요).")
-        return None
-
-    print("고급 자막 처리 시작...")
+    persisted_count = 0
+    print(f"고급 자막 처리 시작... (정렬: {aligner if needs_alignment else '저장된 정렬 사용'})")
     for i, sentence_info in enumerate(input_data.get('sentences', [])):
         original_sentence = sentence_info.get('sentence')
         sentence_duration = sentence_info.get('sentence_duration')
@@ -241,12 +322,24 @@ def process_subtitle_data(input_data, target_char_count=30, debug=False):
              })
              continue
 
+        if has_current_alignment(sentence_info): # 5단계에서 현재 버전으로 정렬 완료
+            sentence_mapped_segments = sentence_info['subtitle_segments']; persisted_count += 1
+            subtitle_chunks = chunk_segments_by_char_count(sentence_mapped_segments, target_char_count, debug=debug)
+            all_processed_sentences.append({
+                "sentence_index": i, "original_sentence": original_sentence, "sentence_duration": sentence_duration,
+                "final_subtitle_chunks": adjust_chunk_durations(subtitle_chunks, sentence_duration, debug=debug) if subtitle_chunks else sentence_info.get('subtitle_chunks', [])
+            })
+            continue
+
         chunk_based_segments = []
-        for j, chunk_info in enumerate(chunks_data):
-            chunk_text = chunk_info.get('chunk_text'); words_list = chunk_info.get('words', [])
-            if chunk_text and words_list:
-                segments_for_chunk = match_words_to_text_context(words_list, chunk_text, debug=debug)
-                chunk_based_segments.extend(segments_for_chunk)
+        if aligner == 'dp': # 문장 전체 단어/토큰을 한 번에 정렬
+            chunk_based_segments = text_alignment.align_sentence_chunks(chunks_data)
+        else:
+            for j, chunk_info in enumerate(chunks_data):
+                chunk_text = chunk_info.get('chunk_text'); words_list = chunk_info.get('words', [])
+                if chunk_text and words_list:
+                    segments_for_chunk = match_words_to_text_context(words_list, chunk_text, debug=debug)
+                    chunk_based_segments.extend(segments_for_chunk)
 
         if not chunk_based_segments:
              if debug: print("  Warning: No segments after word-to-text alignment. Skipping sentence.")
@@ -256,7 +349,8 @@ def process_subtitle_data(input_data, target_char_count=30, debug=False):
              })
              continue
 
-        sentence_mapped_segments = map_segments_to_sentence(original_sentence, chunk_based_segments, debug=debug)
+        if aligner == 'dp': sentence_mapped_segments = text_alignment.map_segments_to_sentence(original_sentence, chunk_based_segments)
+        else: sentence_mapped_segments = map_segments_to_sentence(original_sentence, chunk_based_segments, debug=debug)
         if not sentence_mapped_segments:
              if debug: print("  Warning: No segments after mapping to sentence. Skipping sentence.")
              all_processed_sentences.append({
@@ -282,143 +376,137 @@ def process_subtitle_data(input_data, target_char_count=30, debug=False):
         })
         # if debug: print(f"--- Sentence {i+1} Processing Complete ---")
 
-    print(f"고급 자막 처리 완료. 총 {len(all_processed_sentences)}개 문장 처리됨.")
+    print(f"고급 자막 처리 완료. 총 {len(all_processed_sentences)}개 문장 처리됨 (저장된 정렬 사용 {persisted_count}개).")
     return all_processed_sentences
 
 
 # --- Module 1: 배경 + 제목 생성 ---
-def create_background_with_title(total_duration: float, config: dict, base_video_path: str,video_title_from_script: str) -> Optional[CompositeVideoClip]:
+def create_background_with_title(total_duration: float, config: dict, base_video_path: str,video_title_from_script: str,
+                                 session: Optional[RenderSession] = None) -> Optional[CompositeVideoClip]:
     # (이전 사용자 최종 버전 코드)
     target_resolution = config['resolution']
     try:
-        base_clip_raw = VideoFileClip(base_video_path)
-        resized_bg = base_clip_raw.resized(width=target_resolution[0], height=target_resolution[1])
+        cached_bg_path = render_cache.get_background_asset_path(base_video_path, config)
+        if cached_bg_path: # 출력 해상도/FPS로 미리 스케일된 채널 배경 (프레임 단위 리사이즈 없음)
+            resized_bg = _track(session, VideoFileClip(cached_bg_path))
+        else:
+            base_clip_raw = _track(session, VideoFileClip(base_video_path))
+            resized_bg = base_clip_raw.resized(width=target_resolution[0], height=target_resolution[1])
+        if resized_bg.duration < total_duration: # 나레이션보다 짧은 배경은 루프
+            resized_bg = resized_bg.with_effects([vfx.Loop(duration=total_duration)])
         bg_clip = resized_bg.with_duration(total_duration).with_start(0)
-        title_clip = TextClip(
-            text=video_title_from_script, font_size=config['title_font_size'], color=config['title_font_color'],
-            font=config['title_font_path'], size=(int(target_resolution[0] * 0.9), None),
-            method='caption', text_align='center'
+        title_clip = create_text_clip(
+            video_title_from_script, config, config['title_font_path'], config['title_font_size'],
+            config['title_font_color'], int(target_resolution[0] * 0.9), session=session
         )
         title_clip_positioned = title_clip.with_duration(total_duration).with_start(0).with_position(config['title_position'])
         return CompositeVideoClip([bg_clip, title_clip_positioned], size=target_resolution)
     except Exception as e: print(f"오류(BG+Title): {e}"); traceback.print_exc(); return None
 
+# --- Layout Helper: 시각 자료 프레임 박스 계산 ---
+def compute_image_frame_box(config: Dict[str, Any]) -> Dict[str, float]:
+    """시각 자료가 들어갈 프레임 박스의 중심 좌표와 목표 크기를 계산합니다."""
+    target_resolution = config['resolution']; frame_scale = config.get('image_frame_scale', (0.9, 0.65))
+    frame_pos_config = config.get('image_frame_position', ('center', 'center')); padding = config.get('image_padding_within_frame', 0.98)
+    frame_width = target_resolution[0] * frame_scale[0]; frame_height = target_resolution[1] * frame_scale[1]
+    frame_center_x = target_resolution[0] / 2 if frame_pos_config[0] == 'center' else float(frame_pos_config[0])
+    if frame_pos_config[1] == 'center': frame_center_y = target_resolution[1] / 2
+    elif isinstance(frame_pos_config[1], (int, float)): frame_center_y = float(frame_pos_config[1])
+    else: frame_center_y = target_resolution[1] / 2
+    return {"center_x": frame_center_x, "center_y": frame_center_y,
+            "target_width": frame_width * padding, "target_height": frame_height * padding}
+
 # --- Module 2: 자막 클립 생성 ---
-def create_subtitle_clips(video_data: Dict[str, Any], config: Dict[str, Any]) -> List[TextClip]:
-    # (이전 사용자 최종 버전 코드 - 입력 subtitle_chunks는 사전 처리된 것 사용)
+def create_subtitle_clips(timeline: render_timeline.Timeline, config: Dict[str, Any], session: Optional[RenderSession] = None) -> List[Union[ImageClip, TextClip]]:
+    # (이전 사용자 최종 버전 코드 - 타임라인의 자막 트랙은 사전 처리된 subtitle_chunks에서 생성됨)
     subtitle_clips = []
-    if not video_data or 'sentences' not in video_data: return subtitle_clips
-    current_time = 0.0; target_resolution = config['resolution']
+    target_resolution = config['resolution']
     font_path = config.get('font_path', 'Arial'); font_size = config.get('font_size', 60)
     font_color = config.get('font_color', 'black'); text_position = config.get('text_position', ('center', 0.8))
     width_ratio = 0.9; highlight_color = config.get('text_highlight_color')
-    for sentence in video_data['sentences']:
-        sentence_start_time = current_time # 중요: 절대 시간 계산 기준
-        # 'subtitle_chunks'는 사전 처리된 데이터를 사용
-        for chunk in sentence.get('subtitle_chunks', []):
-            try:
-                abs_start = chunk['start'] # 사전 처리된 데이터는 이미 절대 시간일 수 있음 -> 확인 필요! -> 아니었음, 상대시간임. 절대시간계산필요
-                abs_end = chunk['end']     # 사전 처리된 데이터는 이미 절대 시간일 수 있음 -> 확인 필요! -> 아니었음, 상대시간임. 절대시간계산필요
-                # === 수정: 사전 처리된 청크의 시간은 문장 내 상대 시간이므로 절대 시간으로 변환 ===
-                abs_start = sentence_start_time + chunk['start']
-                abs_end = sentence_start_time + chunk['end']
-                duration = abs_end - abs_start
-                # ========================================================================
-                if duration <= 0: continue
-                text_clip = TextClip(
-                    text=chunk['text'], font_size=font_size, color=font_color, font=font_path,
-                    size=(int(target_resolution[0] * width_ratio), None),
-                    method='caption', text_align='center', bg_color=highlight_color
-                )
-                subtitle_clips.append(text_clip.with_start(abs_start).with_duration(duration).with_position(text_position))
-            except Exception as e: print(f"경고: 자막 클립 생성 오류: {e}")
-        current_time += float(sentence.get('sentence_duration', 0)) # 다음 문장 시작 시간 업데이트
+    for event in timeline.subtitles:
+        try:
+            text_clip = create_text_clip(
+                event.text, config, font_path, font_size, font_color,
+                int(target_resolution[0] * width_ratio), bg_color=highlight_color, session=session
+            )
+            subtitle_clips.append(text_clip.with_start(event.start).with_duration(event.duration).with_position(text_position))
+        except Exception as e: print(f"경고: 자막 클립 생성 오류: {e}")
     return subtitle_clips
 
 # --- Module 3: 시각 자료 클립 생성 ---
-def create_visual_clips(video_data: Dict[str, Any], config: Dict[str, Any]) -> List[Union[ImageClip, VideoFileClip]]:
+def create_visual_clips(
+    timeline: render_timeline.Timeline, config: Dict[str, Any], normalized_visuals: Optional[Dict[str, str]] = None,
+    session: Optional[RenderSession] = None
+) -> List[Union[ImageClip, VideoFileClip]]:
     # (이전 최종 버전 코드 - Gapless)
+    # normalized_visuals: {원본 경로: 프레임 박스 크기 에셋} - 해당 시각 자료는 리사이즈 없이 배치만 함
     visual_clips = []
-    if not video_data or 'sentences' not in video_data: return visual_clips
-    target_resolution = config['resolution']; frame_scale = config.get('image_frame_scale', (0.9, 0.65))
-    frame_pos_config = config.get('image_frame_position', ('center', 'center')); padding = config.get('image_padding_within_frame', 0.98)
-    frame_width = target_resolution[0] * frame_scale[0]; frame_height = target_resolution[1] * frame_scale[1]
-    image_target_width = frame_width * padding; image_target_height = frame_height * padding
-    frame_center_x = target_resolution[0] / 2 if frame_pos_config[0] == 'center' else float(frame_pos_config[0])
-    if frame_pos_config[1] == 'center': frame_center_y = target_resolution[1] / 2
-    elif isinstance(frame_pos_config[1], (int, float)): frame_center_y = float(frame_pos_config[1])
-    else: frame_center_y = target_resolution[1] / 2
-
-    chunk_info_list = []; current_time = 0.0; last_sentence_end_time = 0.0
-    for sentence in video_data['sentences']: # 정보 수집
-        sentence_start_time = current_time; sentence_duration = float(sentence.get('sentence_duration', 0))
-        last_sentence_end_time = sentence_start_time + sentence_duration
-        if 'chunks' in sentence:
-            for chunk in sentence['chunks']:
-                visual_info = chunk.get('visual_info')
-                if visual_info and 'selected_local_path' in visual_info:
-                    visual_path = visual_info['selected_local_path']
-                    if os.path.exists(visual_path):
-                        start_offset = float(chunk.get('chunk_start_in_sentence', 0)); original_duration = float(chunk.get('chunk_duration', 0))
-                        abs_start = sentence_start_time + start_offset
-                        if original_duration > 0: chunk_info_list.append({"abs_start": abs_start, "original_duration": original_duration, "visual_path": visual_path})
-        current_time += sentence_duration
-    if not chunk_info_list: return []
-    chunk_info_list.sort(key=lambda x: x['abs_start'])
-    adjusted_chunk_info = []; total_duration_from_json = video_data.get('total_final_audio_duration_seconds', last_sentence_end_time)
-    for i, chunk in enumerate(chunk_info_list): # 길이 조정
-        abs_start = chunk['abs_start']; adjusted_duration = chunk['original_duration']
-        if i < len(chunk_info_list) - 1: adjusted_duration = max(0.01, chunk_info_list[i+1]['abs_start'] - abs_start)
-        else: adjusted_duration = max(0.01, min(abs_start + chunk['original_duration'], total_duration_from_json) - abs_start)
-        adjusted_chunk_info.append({"abs_start": abs_start, "duration": adjusted_duration, "visual_path": chunk['visual_path']})
-
-    for k, chunk_data in enumerate(adjusted_chunk_info): # 클립 생성
-        abs_start = chunk_data['abs_start']; duration = chunk_data['duration']; visual_path = chunk_data['visual_path']
+    frame_box = compute_image_frame_box(config)
+    frame_center_x = frame_box['center_x']; frame_center_y = frame_box['center_y']
+    image_target_width = frame_box['target_width']; image_target_height = frame_box['target_height']
+    if not timeline.visuals: return []
+    normalized_visuals = normalized_visuals or {}
+
+    for k, event in enumerate(timeline.visuals): # 클립 생성
+        abs_start = event.start; duration = event.duration; visual_path = event.source
         clip_after_length_adjust = None; final_clip = None; initial_clip = None
         try:
+            if visual_path in normalized_visuals:
+                final_clip = _create_normalized_visual_clip(normalized_visuals[visual_path], duration, frame_box, session)
+                visual_clips.append(final_clip.with_start(abs_start).with_duration(duration)); continue
             file_ext = os.path.splitext(visual_path)[1].lower(); clip_source_path = visual_path; is_video = False
             if file_ext == '.gif':
                 mp4_path = convert_gif_to_mp4(visual_path);
                 if mp4_path: clip_source_path = mp4_path; is_video = True
                 else: continue
-            elif file_ext in ['.mp4', '.mov', '.avi', '.webm']: is_video = True
-            elif file_ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']: is_video = False
+            elif file_ext in VIDEO_EXTENSIONS: is_video = True
+            elif file_ext in IMAGE_EXTENSIONS: is_video = False
             else: continue
             if is_video:
-                initial_clip = VideoFileClip(clip_source_path, target_resolution=(None, image_target_height))
+                initial_clip = _track(session, VideoFileClip(clip_source_path, target_resolution=(None, image_target_height)))
                 if initial_clip.duration < duration: clip_after_length_adjust = initial_clip.with_effects_on_subclip([vfx.Loop(duration=duration)])
                 elif initial_clip.duration > duration: clip_after_length_adjust = initial_clip.subclipped(0, duration)
                 else: clip_after_length_adjust = initial_clip
             else:
-                initial_clip = ImageClip(clip_source_path); clip_after_length_adjust = initial_clip.with_duration(duration)
+                initial_clip = _track(session, ImageClip(clip_source_path)); clip_after_length_adjust = initial_clip.with_duration(duration)
             final_resized_clip = clip_after_length_adjust.resized(height=image_target_height)
             if final_resized_clip.w > image_target_width: final_resized_clip = clip_after_length_adjust.resized(width=image_target_width)
             pos_x = frame_center_x - final_resized_clip.w / 2; pos_y = frame_center_y - final_resized_clip.h / 2
             final_clip = final_resized_clip.with_position((pos_x, pos_y)).with_start(abs_start).with_duration(duration)
             visual_clips.append(final_clip)
         except Exception as e: print(f"오류: 시각자료 처리 예외 (Idx {k}): {e}"); traceback.print_exc(); continue
-        # finally: close() 없음
+        # 리더 해제는 렌더 세션이 담당
     return visual_clips
 
+def _create_normalized_visual_clip(asset_path: str, duration: float, frame_box: Dict[str, float],
+                                   session: Optional[RenderSession] = None) -> Union[ImageClip, VideoFileClip]:
+    """정규화된 (이미 프레임 박스 크기인) 에셋을 길이만 맞추고 프레임 박스 중앙에 배치합니다."""
+    if os.path.splitext(asset_path)[1].lower() in VIDEO_EXTENSIONS:
+        clip = _track(session, VideoFileClip(asset_path))
+        if clip.duration < duration: clip = clip.with_effects_on_subclip([vfx.Loop(duration=duration)])
+        elif clip.duration > duration: clip = clip.subclipped(0, duration)
+    else:
+        clip = _track(session, ImageClip(asset_path, transparent=True)).with_duration(duration)
+    return clip.with_position((frame_box['center_x'] - clip.w / 2, frame_box['center_y'] - clip.h / 2))
+
 # --- Module 4: 최종 오디오 생성 ---
-def create_final_audio(video_data: Dict[str, Any], config: Dict[str, Any], bgm_path: Optional[str]) -> Optional[CompositeAudioClip]:
+def create_final_audio(timeline: render_timeline.Timeline, config: Dict[str, Any], bgm_path: Optional[str],
+                       session: Optional[RenderSession] = None) -> Optional[CompositeAudioClip]:
     # (이전 사용자 최종 버전 코드)
     narration_track = None; final_bgm = None; adjusted_bgm = None
     try:
-        if not video_data or 'sentences' not in video_data: return None
-        total_duration = video_data.get('total_final_audio_duration_seconds')
+        total_duration = timeline.total_duration
         if total_duration is None or total_duration <= 0: return None
         narration_clips = []
-        for sentence in video_data['sentences']:
-            audio_path = sentence.get('audio_path')
-            if audio_path and os.path.exists(audio_path):
-                try: narration_clips.append(AudioFileClip(audio_path))
-                except Exception as e: print(f"경고: 나레이션 로드 실패({audio_path}): {e}")
+        for event in timeline.narration:
+            try: narration_clips.append(_track(session, AudioFileClip(event.source)))
+            except Exception as e: print(f"경고: 나레이션 로드 실패({event.source}): {e}")
         if not narration_clips: return None
         narration_track = concatenate_audioclips(narration_clips)
         if bgm_path and os.path.exists(bgm_path):
-            bgm_clip_loaded = AudioFileClip(bgm_path)
-            adjusted_bgm = bgm_clip_loaded.with_effects([afx.MultiplyVolume(0.5)]) # 0.5 고정
+            bgm_clip_loaded = _track(session, AudioFileClip(bgm_path))
+            adjusted_bgm = bgm_clip_loaded.with_effects([afx.MultiplyVolume(config.get('bgm_volume_factor', 0.20))])
             if adjusted_bgm.duration > total_duration: final_bgm = adjusted_bgm.subclipped(0, total_duration)
             else: final_bgm = adjusted_bgm # 루프 없음
         else: return narration_track.with_duration(total_duration) if narration_track else None
@@ -429,6 +517,18 @@ def create_final_audio(video_data: Dict[str, Any], config: Dict[str, Any], bgm_p
         else: return None
     except Exception as e: print(f"오류: 오디오 처리 예외: {e}"); traceback.print_exc(); return None
 
+# --- Module 4b: NumPy 믹서로 최종 오디오 트랙 생성 ---
+def create_mixed_audio_track(timeline: render_timeline.Timeline, config: Dict[str, Any], bgm_path: Optional[str],
+                             output_path: str) -> Optional[str]:
+    """
+    나레이션 + BGM(게인/더킹/루프/페이드)을 출력 파일 옆 WAV 하나로 믹스하여 경로를 반환합니다.
+    config['audio_mixer'] == 'moviepy'이거나 믹스에 실패하면 None (create_final_audio로 대체).
+    """
+    if config.get('audio_mixer', 'numpy') != 'numpy': return None
+    mixed_audio_path = os.path.splitext(output_path)[0] + "_mix.wav"
+    try: return audio_mixer.mix_timeline_audio(timeline, config, bgm_path, mixed_audio_path)
+    except Exception as e: print(f"경고: NumPy 오디오 믹스 실패, MoviePy 오디오로 대체: {e}"); traceback.print_exc(); return None
+
 # ==============================================================================
 # === 메인 비디오 생성 함수 (통합 버전) ===
 # ==============================================================================
@@ -438,31 +538,41 @@ def generate_complete_video_with_processed_subs(
     base_video_path: str,
     bgm_path: Optional[str],
     output_path: str,
-    video_title_from_script: str 
+    video_title_from_script: str,
+    preview: bool = False
 ) -> bool:
     """
     고급 자막 처리 후, 모든 구성 요소를 결합하여 최종 비디오를 생성/저장합니다.
+    preview=True이면 저해상도/저FPS/ultrafast preset, BGM 없이 빠른 미리보기를 렌더링합니다.
     """
+    if preview:
+        config = make_preview_config(config); bgm_path = None
+        print("--- 미리보기 렌더 모드 (저해상도, BGM 없음) ---")
     print("--- 최종 비디오 생성 프로세스 시작 (고급 자막 처리 포함) ---")
     print(f"Config: FPS={config.get('fps', 30)}, Resolution={config.get('resolution', 'N/A')}")
     print(f"Inputs: JSON={json_data_path}, BaseVid={base_video_path}, BGM={bgm_path}")
     print(f"Output: {output_path}")
 
-    final_video = None
+    final_video = None; success = False; mixed_audio_path = None
+    profiler = render_profiler.RenderProfiler(output_path, config, preview=preview) # 단계별 시간/메모리 기록
+    session = RenderSession() # 이번 렌더에서 연 모든 클립 리더를 소유, finally에서 해제
 
     try:
         # --- 1. 원본 JSON 데이터 로드 ---
         print("\n[단계 1/7] 원본 JSON 데이터 로드...")
+        profiler.begin("json_load")
         initial_video_data = load_json_data(json_data_path)
         if not initial_video_data: raise ValueError("원본 JSON 데이터 로드 실패")
 
         # --- 2. 자막 데이터 사전 처리 ---
         print("\n[단계 2/7] 자막 데이터 사전 처리...")
+        profiler.begin("subtitle_processing")
         # process_subtitle_data는 이제 input_data를 직접 받도록 수정 (파일 경로 대신)
         processed_sentences_list = process_subtitle_data(
             initial_video_data, # 로드된 데이터 직접 전달
             target_char_count=config.get('subtitle_target_chars', 15),
-            debug=config.get('subtitle_debug', False)
+            debug=config.get('subtitle_debug', False),
+            aligner=config.get('subtitle_aligner', 'dp')
         )
 
         if processed_sentences_list is None: # fuzzywuzzy 누락 등 처리 불가 상황
@@ -493,38 +603,71 @@ def generate_complete_video_with_processed_subs(
 
         # --- 3. 기본 정보 추출 (이제 video_data는 처리된 자막 포함) ---
         print("\n[단계 3/7] 기본 정보 추출...")
+        profiler.begin("timeline_and_assets")
         total_duration = video_data.get('total_final_audio_duration_seconds')
         if not total_duration or total_duration <= 0: raise ValueError("유효한 total_duration 없음")
         fps = config.get('fps', 30)
         print(f"  - 비디오 총 길이: {total_duration:.3f} 초, FPS: {fps}")
+        timeline = render_timeline.build_timeline(video_data) # 모든 백엔드가 공유하는 절대 시간 타임라인
+        print(f"  - 타임라인: {timeline.summary()}")
+        # 시각 자료를 프레임 박스 크기 에셋으로 사전 정규화 (병렬, 채널 캐시 + 시각 자료 계획 JSON에 기록)
+        visual_plan_path = os.path.join(os.path.dirname(os.path.abspath(json_data_path)), visual_assets.VISUAL_PLAN_FILENAME)
+        normalized_visuals = visual_assets.prepare_visual_assets(
+            [event.source for event in timeline.visuals], config, compute_image_frame_box(config), visual_plan_path
+        )
+        profiler.add_counts(sentences=len(timeline.sentence_starts), visuals=len(timeline.visuals), subtitles=len(timeline.subtitles),
+                            narration=len(timeline.narration), normalized_visuals=len(normalized_visuals))
+
+        # --- (선택) ffmpeg filtergraph 백엔드: 4~7단계를 단일 ffmpeg 호출로 처리 ---
+        render_backend = config.get('render_backend', 'moviepy')
+        if render_backend == 'ffmpeg':
+            print("\n[단계 4-7/7] ffmpeg filtergraph 백엔드로 합성 및 인코딩...")
+            from functions import ffmpeg_render_backend
+            profiler.begin("audio_mix")
+            mixed_audio_path = create_mixed_audio_track(timeline, config, bgm_path, output_path)
+            profiler.begin("ffmpeg_render")
+            if not ffmpeg_render_backend.render_video_with_ffmpeg(timeline, config, base_video_path, bgm_path, output_path, video_title_from_script,
+                                                                normalized_visuals=normalized_visuals, mixed_audio_path=mixed_audio_path):
+                raise ValueError("ffmpeg 백엔드 렌더 실패")
+            profiler.record_encode(round(total_duration * fps))
+            print(f"***** 최종 비디오 저장 성공: {output_path} *****")
+            success = True; return True
+        elif render_backend != 'moviepy':
+            print(f"  - 경고: 알 수 없는 render_backend '{render_backend}'. MoviePy 백엔드를 사용합니다.")
 
         # --- 4. 오디오 생성 ---
         print("\n[단계 4/7] 최종 오디오 생성...")
-        # video_data (처리된 자막 포함된)를 전달하지만, 오디오 경로는 원본과 동일
-        final_audio = create_final_audio(video_data, config, bgm_path)
-        if not final_audio: print("  - 경고: 최종 오디오 생성 실패 (오디오 없이 진행)")
+        profiler.begin("audio_mix")
+        mixed_audio_path = create_mixed_audio_track(timeline, config, bgm_path, output_path)
+        final_audio = None if mixed_audio_path else create_final_audio(timeline, config, bgm_path, session=session)
+        if mixed_audio_path: print(f"  - 최종 오디오 믹스 완료 ({os.path.basename(mixed_audio_path)}).")
+        elif not final_audio: print("  - 경고: 최종 오디오 생성 실패 (오디오 없이 진행)")
         else: print("  - 최종 오디오 생성 완료.")
 
         # --- 5. 비주얼 요소 생성 ---
         print("\n[단계 5/7] 비주얼 요소 생성...")
         print("  - 배경 + 제목 생성...")
-        base_clip = create_background_with_title(total_duration, config, base_video_path, video_title_from_script)
+        profiler.begin("background")
+        base_clip = create_background_with_title(total_duration, config, base_video_path, video_title_from_script, session=session)
         if not base_clip: raise ValueError("배경+제목 클립 생성 실패")
         print("  - 배경 + 제목 생성 완료.")
         print("  - 시각 자료 클립 생성...")
-        # video_data (처리된 자막 포함된) 전달 - 시각 자료 타이밍은 영향 없음
-        visual_clips = create_visual_clips(video_data, config)
+        profiler.begin("visuals")
+        visual_clips = create_visual_clips(timeline, config, normalized_visuals, session=session)
         print(f"  - 시각 자료 클립 생성 완료 ({len(visual_clips)} 개).")
+        profiler.add_counts(visual_clips=len(visual_clips))
         print("  - 자막 클립 생성...")
-        # video_data (처리된 자막 포함된) 전달 - create_subtitle_clips는 이 데이터를 사용함!
-        subtitle_clips = create_subtitle_clips(video_data, config)
+        profiler.begin("subtitles")
+        subtitle_clips = create_subtitle_clips(timeline, config, session=session)
         print(f"  - 자막 클립 생성 완료 ({len(subtitle_clips)} 개).")
+        profiler.add_counts(subtitle_clips=len(subtitle_clips))
 
         # --- 6. 비주얼 합성 & 오디오 결합 ---
         print("\n[단계 6/7] 최종 합성 및 오디오 결합...")
+        profiler.begin("compositing")
         final_visual_assembly = [base_clip] + visual_clips + subtitle_clips
         print(f"  - 총 {len(final_visual_assembly)}개 비주얼 레이어 합성 시도...")
-        final_video_no_audio = CompositeVideoClip(final_visual_assembly, size=config['resolution'])
+        final_video_no_audio = session.track(CompositeVideoClip(final_visual_assembly, size=config['resolution']))
         print("  - 비주얼 합성 완료.")
         if final_audio:
             final_video = final_video_no_audio.with_audio(final_audio) # .with_audio() 사용
@@ -536,18 +679,56 @@ def generate_complete_video_with_processed_subs(
 
         # --- 7. 파일 저장 ---
         print("\n[단계 7/7] 최종 비디오 파일 저장...")
+        profiler.begin("encode")
         print(f"  - 경로: {output_path}")
-        final_video.write_videofile(
-            output_path, fps=fps, codec='libx264', audio_codec='aac',
-            threads=os.cpu_count(), preset='medium' # logger='bar'
-        )
+        if config.get('incremental_render'):
+            print("  - 증분 렌더: 바뀐 세그먼트만 인코딩 후 stream copy로 결합")
+            from functions import segment_render
+            if not segment_render.write_video_incremental(final_video_no_audio.with_duration(total_duration), mixed_audio_path or final_audio, timeline,
+                                                          config, base_video_path, video_title_from_script, output_path):
+                raise ValueError("증분 렌더 실패")
+            profiler.record_encode(round(total_duration * fps))
+            print(f"***** 최종 비디오 저장 성공: {output_path} *****")
+            success = True; return True
+        render_threads = config.get('render_threads') or os.cpu_count() # 배치 렌더 시 워커별 스레드 수 제한
+        profile = encoder_profiles.resolve_encoder_profile(config)
+        print(f"  - 인코딩 스레드 수: {render_threads}, 인코더: {encoder_profiles.describe_profile(profile)}")
+        x264_params = encoder_profiles.build_x264_params(profile, fps)
+        if encoder_profiles.is_two_pass(profile): # 1-pass: 통계만 기록 (합성이 두 번 실행됨)
+            passlog_prefix = os.path.splitext(output_path)[0] + "_x264pass"
+            try:
+                print("  - 2-pass 인코딩: 1차 분석 패스...")
+                final_video.write_videofile(
+                    os.devnull, fps=fps, codec='libx264', audio=False, threads=render_threads, preset=profile['preset'],
+                    ffmpeg_params=x264_params + encoder_profiles.two_pass_params(1, passlog_prefix) + ['-f', 'mp4'], logger=None
+                )
+                final_video.write_videofile(
+                    output_path, fps=fps, codec='libx264', audio_codec='aac', audio=mixed_audio_path or True,
+                    threads=render_threads, preset=profile['preset'],
+                    ffmpeg_params=x264_params + encoder_profiles.two_pass_params(2, passlog_prefix)
+                )
+            finally:
+                encoder_profiles.cleanup_passlog(passlog_prefix)
+        else:
+            final_video.write_videofile(
+                output_path, fps=fps, codec='libx264', audio_codec='aac', audio=mixed_audio_path or True, # 믹스된 WAV는 그대로 mux
+                threads=render_threads, preset=profile['preset'], ffmpeg_params=x264_params # logger='bar'
+            )
+        profiler.record_encode(round(total_duration * fps))
         print(f"***** 최종 비디오 저장 성공: {output_path} *****")
-        return True
+        success = True; return True
 
     except Exception as e:
         print(f"\n!!!!! 오류 발생 !!!!!\n오류 메시지: {e}"); traceback.print_exc(); return False
     finally:
-        print("\n--- 비디오 생성 프로세스 완료 (Clean-up 생략됨) ---")
+        profiler.begin("cleanup")
+        released = session.close(); final_video = None
+        profiler.end(released_clips=released)
+        if mixed_audio_path and os.path.exists(mixed_audio_path):
+            try: os.remove(mixed_audio_path)
+            except OSError: pass
+        profiler.finish(success)
+        print(f"\n--- 비디오 생성 프로세스 완료 (클립 {released}개 해제) ---")
 
 
 # ==============================================================================
@@ -0,0 +1,222 @@
+# PaMin/functions/visual_assets.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === 시각 자료 정규화 (렌더 전 에셋 단계) ===
+# ==============================================================================
+# 렌더 전에 에피소드의 모든 selected_local_path를 이미지 프레임 박스 크기 에셋으로 변환하여
+# 합성 단계에서는 미리 크기가 맞춰진 픽셀만 배치(blit)하도록 합니다. 변환은 프로세스 풀에서 병렬로 실행됩니다.
+# - 정지 이미지 : 프레임 박스 크기의 RGBA PNG (비율 유지, 남는 영역은 투명 레터박스)
+# - GIF/영상    : 프레임 박스에 맞춘 크기 + 출력 FPS의 H.264 MP4 (ffmpeg 스트리밍 디코딩)
+# - 애니메이션 WebP : Pillow로 한 프레임씩 읽어 ffmpeg rawvideo 파이프로 전달
+# 결과는 원본 파일 내용 해시를 키로 채널 캐시에 저장되어, 여러 에피소드에서 같은 밈을 써도
+# 한 번만 변환됩니다. 변환 결과는 에피소드의 visual_plan_with_selection.json에도 기록됩니다.
+#
+#   channels/[채널]/render_cache/visuals/<sha1>.mp4|png
+import os
+import json
+import subprocess
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageSequence
+
+from functions import render_cache
+from functions.cache_keys import hash_file_content
+from functions.ffmpeg_utils import get_ffmpeg_exe, run_ffmpeg
+
+VISUAL_ASSET_CACHE_VERSION = 1
+MOTION_VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.webm') # video_generation_basic.VIDEO_EXTENSIONS와 동일
+STILL_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp') # video_generation_basic.IMAGE_EXTENSIONS와 동일
+VISUAL_PLAN_FILENAME = "visual_plan_with_selection.json" # 4단계 결과
+
+
+# --- Helper 1: 프레임 박스에 맞는 크기 (비율 유지, yuv420p용 짝수) ---
+def fit_size(src_w: int, src_h: int, box_w: int, box_h: int) -> Tuple[int, int]:
+    scale = min(box_w / src_w, box_h / src_h)
+    return max(2, int(src_w * scale) // 2 * 2), max(2, int(src_h * scale) // 2 * 2)
+
+
+# --- Helper 2: 움직이는 시각 자료 판별 ---
+def is_motion_visual(path: str) -> bool:
+    """GIF/영상은 항상, WebP는 여러 프레임일 때만 움직이는 시각 자료로 취급합니다."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.gif' or ext in MOTION_VIDEO_EXTENSIONS: return True
+    if ext == '.webp':
+        try:
+            with Image.open(path) as img: return bool(getattr(img, 'is_animated', False))
+        except Exception: return False
+    return False
+
+
+# --- 트랜스코딩 구현 ---
+def _transcode_with_ffmpeg(source_path: str, dest_path: str, box_w: int, box_h: int, fps: float) -> bool:
+    """ffmpeg로 디코딩 -> 프레임 박스 맞춤 스케일 -> 출력 FPS로 인코딩."""
+    scale_w = f"trunc(min({box_w}/iw\\,{box_h}/ih)*iw/2)*2"; scale_h = f"trunc(min({box_w}/iw\\,{box_h}/ih)*ih/2)*2"
+    vf = f"fps={fps},scale={scale_w}:{scale_h},setsar=1"
+    return run_ffmpeg(['-i', source_path, '-vf', vf, '-an', '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18',
+                       '-pix_fmt', 'yuv420p', '-threads', '1', '-movflags', '+faststart', '-f', 'mp4', dest_path],
+                      f"시각 자료 변환 {os.path.basename(source_path)}")
+
+
+def _transcode_with_pillow_pipe(source_path: str, dest_path: str, box_w: int, box_h: int, fps: float) -> bool:
+    """
+    애니메이션 WebP처럼 ffmpeg가 직접 디코딩하지 못하는 형식: Pillow로 한 프레임씩 읽어
+    프레임별 표시 시간에 맞게 출력 FPS로 반복/생략하면서 ffmpeg rawvideo 파이프에 씁니다.
+    """
+    with Image.open(source_path) as img:
+        out_w, out_h = fit_size(img.width, img.height, box_w, box_h)
+        cmd = [get_ffmpeg_exe(), '-y', '-hide_banner', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{out_w}x{out_h}", '-r', str(fps), '-i', '-',
+               '-an', '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', 'yuv420p',
+               '-threads', '1', '-movflags', '+faststart', '-f', 'mp4', dest_path]
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        written = 0; elapsed_ms = 0.0
+        try:
+            for frame in ImageSequence.Iterator(img):
+                elapsed_ms += frame.info.get('duration') or 100
+                target_count = int(round(elapsed_ms * fps / 1000.0)) # 이 프레임까지의 누적 출력 프레임 수
+                if target_count <= written: continue
+                rgba = frame.convert('RGBA').resize((out_w, out_h), Image.LANCZOS)
+                canvas = Image.new('RGB', (out_w, out_h), (0, 0, 0)); canvas.paste(rgba, mask=rgba.split()[3])
+                data = canvas.tobytes()
+                for _ in range(target_count - written): proc.stdin.write(data)
+                written = target_count
+            proc.stdin.close()
+        except (BrokenPipeError, OSError): pass
+        stderr = proc.stderr.read(); proc.wait()
+    if proc.returncode != 0 or written == 0:
+        print(f"오류(시각 자료 변환 {os.path.basename(source_path)}): {stderr.decode('utf-8', errors='replace')[-2000:]}")
+        return False
+    return True
+
+
+# --- 움직이는 시각 자료 변환 ---
+def transcode_motion_visual(source_path: str, cache_dir: str, box_w: int, box_h: int, fps: float) -> Optional[str]:
+    """
+    source_path를 프레임 박스 크기/출력 FPS의 MP4로 변환하여 캐시 경로를 반환합니다.
+    내용 해시 + 박스 크기 + FPS가 같은 결과가 이미 있으면 변환하지 않습니다. 실패 시 None.
+    """
+    try:
+        key = render_cache.make_cache_key("motion", VISUAL_ASSET_CACHE_VERSION, hash_file_content(source_path), box_w, box_h, fps)
+        asset_path = os.path.join(cache_dir, f"{key}.mp4")
+        if os.path.exists(asset_path): return asset_path
+        tmp_path = f"{asset_path}.{os.getpid()}.tmp"
+        if os.path.splitext(source_path)[1].lower() == '.webp': ok = _transcode_with_pillow_pipe(source_path, tmp_path, box_w, box_h, fps)
+        else: ok = _transcode_with_ffmpeg(source_path, tmp_path, box_w, box_h, fps)
+        if not ok:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, asset_path)
+        return asset_path
+    except Exception as e:
+        print(f"오류: 시각 자료 변환 예외 ({source_path}): {e}"); traceback.print_exc(); return None
+
+
+# --- 정지 이미지 정규화 ---
+def normalize_still_visual(source_path: str, cache_dir: str, box_w: int, box_h: int) -> Optional[str]:
+    """정지 이미지를 비율 유지로 축소/확대하여 프레임 박스 크기의 투명 캔버스 중앙에 배치한 PNG로 저장합니다."""
+    try:
+        key = render_cache.make_cache_key("still", VISUAL_ASSET_CACHE_VERSION, hash_file_content(source_path), box_w, box_h)
+        asset_path = os.path.join(cache_dir, f"{key}.png")
+        if os.path.exists(asset_path): return asset_path
+        with Image.open(source_path) as img:
+            rgba = img.convert('RGBA')
+        scale = min(box_w / rgba.width, box_h / rgba.height)
+        fit_w, fit_h = max(1, int(round(rgba.width * scale))), max(1, int(round(rgba.height * scale)))
+        canvas = Image.new('RGBA', (box_w, box_h), (0, 0, 0, 0))
+        canvas.paste(rgba.resize((fit_w, fit_h), Image.LANCZOS), ((box_w - fit_w) // 2, (box_h - fit_h) // 2))
+        tmp_path = f"{asset_path}.{os.getpid()}.tmp"
+        canvas.save(tmp_path, format='PNG'); os.replace(tmp_path, asset_path)
+        return asset_path
+    except Exception as e:
+        print(f"오류: 정지 이미지 정규화 예외 ({source_path}): {e}"); traceback.print_exc(); return None
+
+
+# --- Worker: 시각 자료 하나 정규화 (프로세스 풀에서 실행, 형식에 따라 분기) ---
+def normalize_visual(source_path: str, cache_dir: str, box_w: int, box_h: int, fps: float) -> Optional[str]:
+    if is_motion_visual(source_path): return transcode_motion_visual(source_path, cache_dir, box_w, box_h, fps)
+    if os.path.splitext(source_path)[1].lower() in STILL_IMAGE_EXTENSIONS:
+        return normalize_still_visual(source_path, cache_dir, box_w, box_h)
+    return None
+
+
+# --- 시각 자료 계획 JSON 기록 ---
+def asset_spec_key(box_w: int, box_h: int, fps: float) -> str:
+    """정규화 결과를 구분하는 키 (최종 렌더/미리보기처럼 박스 크기가 다르면 따로 기록)."""
+    return f"{box_w}x{box_h}@{fps}"
+
+
+def source_fingerprint(path: str) -> Optional[List[int]]:
+    """원본 파일의 [mtime_ns, 크기] (render_cache 배경 영상 키와 같은 기준). 파일이 없으면 None."""
+    try: st = os.stat(path)
+    except OSError: return None
+    return [int(st.st_mtime_ns), st.st_size]
+
+
+def load_recorded_assets(visual_plan_path: Optional[str], spec: str) -> Dict[str, str]:
+    """
+    visual_plan JSON에 기록된 {원본 경로: 정규화 에셋 경로} 중 에셋 파일이 존재하고
+    기록 당시 원본 지문(mtime/크기)이 현재 원본과 같은 항목만 반환합니다 (원본이 교체되면 다시 정규화).
+    """
+    if not visual_plan_path or not os.path.exists(visual_plan_path): return {}
+    try:
+        with open(visual_plan_path, 'r', encoding='utf-8') as f: plan = json.load(f)
+    except Exception as e: print(f"경고: 시각 자료 계획 로드 실패({visual_plan_path}): {e}"); return {}
+    recorded: Dict[str, str] = {}
+    for item in plan if isinstance(plan, list) else []:
+        visual = item.get('visual') or {}
+        source_path = visual.get('selected_local_path'); entry = (visual.get('normalized_assets') or {}).get(spec)
+        if not source_path or not isinstance(entry, dict): continue # 지문 없는 이전 형식(경로 문자열)은 재검증 불가
+        asset_path = entry.get('path')
+        if asset_path and os.path.exists(asset_path) and entry.get('source_fingerprint') == source_fingerprint(source_path):
+            recorded[source_path] = asset_path
+    return recorded
+
+
+def record_normalized_assets(visual_plan_path: Optional[str], spec: str, assets: Dict[str, str]) -> None:
+    """각 항목의 visual.normalized_assets[spec]에 {"path": 정규화 에셋 경로, "source_fingerprint": 원본 지문}을 기록합니다."""
+    if not visual_plan_path or not os.path.exists(visual_plan_path) or not assets: return
+    try:
+        with open(visual_plan_path, 'r', encoding='utf-8') as f: plan = json.load(f)
+        changed = False
+        for item in plan if isinstance(plan, list) else []:
+            visual = item.get('visual') or {}
+            source_path = visual.get('selected_local_path'); asset_path = assets.get(source_path)
+            if not asset_path: continue
+            entry = {"path": asset_path, "source_fingerprint": source_fingerprint(source_path)}
+            if (visual.get('normalized_assets') or {}).get(spec) != entry:
+                visual.setdefault('normalized_assets', {})[spec] = entry; changed = True
+        if changed:
+            with open(visual_plan_path, 'w', encoding='utf-8') as f: json.dump(plan, f, indent=2, ensure_ascii=False)
+    except Exception as e: print(f"경고: 시각 자료 계획에 정규화 결과 기록 실패({visual_plan_path}): {e}")
+
+
+# --- 메인: 에피소드 시각 자료 정규화 ---
+def prepare_visual_assets(source_paths: List[str], config: Dict[str, Any], frame_box: Dict[str, float],
+                          visual_plan_path: Optional[str] = None, max_workers: Optional[int] = None) -> Dict[str, str]:
+    """
+    source_paths를 프로세스 풀에서 병렬로 프레임 박스 크기 에셋으로 정규화하고 {원본 경로: 에셋 경로}를 반환합니다.
+    visual_plan_path에 이미 기록된 에셋은 재사용하고, 새 결과를 기록합니다.
+    채널 캐시(config['channel_dir'])가 없으면 빈 dict (호출 측에서 프레임 단위 리사이즈로 처리).
+    """
+    cache_dir = render_cache.get_render_cache_dir(config, 'visuals')
+    if not cache_dir: return {}
+    box_w = int(frame_box['target_width']); box_h = int(frame_box['target_height']); fps = config.get('fps', 30)
+    spec = asset_spec_key(box_w, box_h, fps)
+    unique_sources = [p for p in dict.fromkeys(source_paths) if p and os.path.exists(p)]
+    recorded = load_recorded_assets(visual_plan_path, spec)
+    assets: Dict[str, str] = {p: recorded[p] for p in unique_sources if p in recorded}
+    pending = [p for p in unique_sources if p not in assets]
+    if pending:
+        max_workers = max(1, min(len(pending), max_workers or config.get('render_threads') or os.cpu_count() or 1))
+        print(f"  - 시각 자료 {len(pending)}개 정규화 ({spec}, 워커 {max_workers}개, 기록 재사용 {len(assets)}개)")
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            future_to_path = {executor.submit(normalize_visual, p, cache_dir, box_w, box_h, fps): p for p in pending}
+            for future in as_completed(future_to_path):
+                source_path = future_to_path[future]
+                try: asset_path = future.result()
+                except Exception as e: print(f"경고: 시각 자료 정규화 워커 오류 ({source_path}): {e}"); asset_path = None
+                if asset_path: assets[source_path] = asset_path
+        record_normalized_assets(visual_plan_path, spec, assets)
+    return assets
@@ -0,0 +1,232 @@
+# PaMin/functions/whisper_backend.py
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# === Whisper 런타임 (openai-whisper / faster-whisper) 및 모델 크기 벤치마크 ===
+# ==============================================================================
+# extract_whisper_timestamps가 사용하는 단어 타임스탬프 전사를 런타임과 무관하게 제공합니다. tts_config.json:
+#   "whisper_runtime":      "openai" (기본값, PyTorch) | "faster" (faster-whisper, CTranslate2 - CPU int8 추론)
+#   "whisper_compute_type": faster 런타임의 CTranslate2 연산 타입 (기본값 CPU "int8", CUDA "float16")
+#   "whisper_model_size":   "tiny" ~ "large" 또는 "auto" (채널의 whisper_benchmark.json에서 기준을 통과한 가장 빠른 크기)
+#
+# 자막에 필요한 것은 이미 아는 문장의 단어 시간이므로, 큰 모델의 전사 품질보다 단어 경계 정확도가 중요합니다.
+# 벤치마크는 기존 5단계 결과(문장 WAV + 전처리 문장)로 후보 런타임/크기를 기준 모델(기본 openai large)과 비교합니다.
+# 두 결과를 같은 DP 정렬(text_alignment)로 문장 토큰에 맞춘 뒤 양쪽 모두 1:1 Anchor인 토큰의 시작/끝 차이(ms)와
+# Anchor 비율을 측정하고, 오차 임계값 이하인 후보 중 가장 빠른 것을 추천합니다.
+#
+#   python -m functions.whisper_backend channels/쿰쿰파민/episodes/topic_a --runtime faster --sizes tiny base small medium \
+#       --threshold-ms 80 --channel-dir channels/쿰쿰파민
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import whisper # openai-whisper
+except ImportError:
+    whisper = None
+
+try:
+    import faster_whisper # 선택: CTranslate2 기반 런타임
+except ImportError:
+    faster_whisper = None
+
+WHISPER_RUNTIMES = ("openai", "faster")
+WHISPER_SIZES = ("tiny", "base", "small", "medium", "large")
+DEFAULT_MODEL_SIZE = "large"
+BENCHMARK_FILENAME = "whisper_benchmark.json" # 채널 디렉토리에 저장 (whisper_model_size: "auto"가 읽음)
+
+
+# --- Helper 1: 모델 로드 ---
+def default_compute_type(device: Any) -> str:
+    return "float16" if getattr(device, "type", str(device)) == "cuda" else "int8"
+
+
+def load_model(model_size: str, device: Any, runtime: str = "openai", compute_type: Optional[str] = None) -> Any:
+    """runtime에 맞는 Whisper 모델을 로드합니다. faster 런타임이 설치되어 있지 않으면 ImportError."""
+    if runtime == "faster":
+        if faster_whisper is None: raise ImportError("faster-whisper is not installed (pip install faster-whisper)")
+        compute_type = compute_type or default_compute_type(device)
+        print(f"Loading faster-whisper model: {model_size} ({getattr(device, 'type', str(device))}, {compute_type})...")
+        return faster_whisper.WhisperModel(model_size, device=getattr(device, "type", str(device)), compute_type=compute_type,
+                                           cpu_threads=os.cpu_count() or 0)
+    if whisper is None: raise ImportError("openai-whisper is not installed")
+    print(f"Loading Whisper model: {model_size} to {device}...")
+    return whisper.load_model(model_size, device=device)
+
+
+def is_faster_model(model: Any) -> bool:
+    return faster_whisper is not None and isinstance(model, faster_whisper.WhisperModel)
+
+
+# --- Helper 2: 전사 -> 단어 타임스탬프 ---
+def _word_dict(text: str, start: Optional[float], end: Optional[float], confidence: Optional[float]) -> Optional[Dict[str, Any]]:
+    text = (text or "").strip()
+    if not text or start is None or end is None: return None
+    return {"word": text, "start": round(start, 3), "end": round(end, 3), "duration": round(end - start, 3),
+            "confidence": round(confidence, 3) if confidence is not None else 0.0}
+
+
+def result_words(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """openai-whisper transcribe(word_timestamps=True) 결과에서 단어 타임스탬프 목록을 만듭니다."""
+    words = (_word_dict(w.get('word', w.get('text', '')), w.get('start'), w.get('end'), w.get('probability', w.get('confidence')))
+             for seg in result.get('segments', []) for w in seg.get('words', []))
+    return [w for w in words if w]
+
+
+def transcribe_words(model: Any, audio: Any, language: str) -> List[Dict[str, Any]]:
+    """audio(파일 경로 또는 16kHz 모노 float32 배열)를 전사하여 {word, start, end, duration, confidence} 목록을 반환합니다."""
+    if is_faster_model(model):
+        segments, _ = model.transcribe(audio, language=language, word_timestamps=True)
+        words = (_word_dict(w.word, w.start, w.end, w.probability) for seg in segments for w in (seg.words or []))
+        return [w for w in words if w]
+    return result_words(model.transcribe(audio, language=language, word_timestamps=True))
+
+
+def _load_audio(path: str) -> Any:
+    return whisper.load_audio(path) if whisper is not None else faster_whisper.decode_audio(path)
+
+
+# --- Helper 3: "auto" 모델 크기 ---
+def resolve_model_size(model_size: str, channel_dir: Optional[str], runtime: str = "openai") -> str:
+    """
+    "auto"이면 채널의 whisper_benchmark.json에서 같은 런타임으로 기준을 통과한 가장 빠른 크기를 반환합니다.
+    벤치마크 결과가 없거나 통과한 후보가 없으면 large.
+    """
+    if model_size != "auto": return model_size
+    path = os.path.join(channel_dir, BENCHMARK_FILENAME) if channel_dir else None
+    try:
+        with open(path, 'r', encoding='utf-8') as f: results = json.load(f).get("results", [])
+    except (OSError, TypeError, ValueError):
+        print(f"Warning: whisper_model_size 'auto' but no {BENCHMARK_FILENAME} in channel; using {DEFAULT_MODEL_SIZE}.", file=sys.stderr)
+        return DEFAULT_MODEL_SIZE
+    passing = sorted((r for r in results if r.get("passes") and r.get("runtime") == runtime), key=lambda r: r["transcribe_seconds"])
+    if not passing:
+        print(f"Warning: No {runtime} Whisper size passed the benchmark threshold; using {DEFAULT_MODEL_SIZE}.", file=sys.stderr)
+        return DEFAULT_MODEL_SIZE
+    print(f"Whisper model size 'auto' -> {passing[0]['size']} ({runtime}, {passing[0]['boundary_error_ms']} ms boundary error)")
+    return passing[0]["size"]
+
+
+# ==============================================================================
+# === 벤치마크 ===
+# ==============================================================================
+def _anchored_token_times(words: List[Dict[str, Any]], processed_sentence: str) -> Tuple[Dict[int, Tuple[float, float]], int]:
+    """단어 목록을 문장 토큰에 DP 정렬하여 1:1 Anchor 토큰의 (start, end)를 토큰 인덱스로 반환합니다."""
+    from functions import text_alignment
+    tokens = processed_sentence.split(); anchored: Dict[int, Tuple[float, float]] = {}; index = 0
+    for seg in text_alignment.align_words_to_tokens(words, tokens):
+        if seg["match_type"] == "1:1 Anchor": anchored[index] = (seg["start"], seg["end"])
+        index += len(seg["text"].split())
+    return anchored, len(tokens)
+
+
+def _load_benchmark_sentences(inputs: List[str]) -> List[Tuple[str, str]]:
+    """에피소드 디렉토리(또는 결과 JSON)에서 (문장 WAV 경로, 전처리 문장) 목록을 읽습니다."""
+    sentences = []
+    for item in inputs:
+        json_path = os.path.join(item, "audio_timestamps_output.json") if os.path.isdir(item) else item
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f: data = json.load(f)
+        except (OSError, ValueError) as e: print(f"  - 건너뜀: {json_path} ({e})"); continue
+        sentences.extend((s["audio_path"], s.get("processed_sentence") or s["sentence"]) for s in data.get("sentences", [])
+                         if s.get("audio_path") and os.path.exists(s["audio_path"]) and (s.get("processed_sentence") or s.get("sentence")))
+    return sentences
+
+
+def _run_candidate(sentences: List[Tuple[str, str]], audios: List[Any], runtime: str, size: str, device: Any,
+                   language: str, compute_type: Optional[str]) -> Tuple[float, float, List[List[Dict[str, Any]]]]:
+    started = time.perf_counter(); model = load_model(size, device, runtime, compute_type); load_seconds = time.perf_counter() - started
+    started = time.perf_counter(); words = [transcribe_words(model, audio, language) for audio in audios]
+    transcribe_seconds = time.perf_counter() - started
+    del model
+    return load_seconds, transcribe_seconds, words
+
+
+def benchmark(inputs: List[str], runtime: str, sizes: List[str], reference: str = "openai:large", device: Any = "cpu",
+              language: str = "ko", compute_type: Optional[str] = None, threshold_ms: float = 80.0,
+              min_coverage: float = 0.9) -> Dict[str, Any]:
+    """
+    후보(runtime, size)마다 모델 로드/전사 시간과 기준 대비 단어 경계 오차, Anchor 비율을 측정합니다.
+    reference: "runtime:size" (기본 openai:large = 현재 설정) 또는 "forced" (MMS_FA 강제 정렬).
+    """
+    sentences = _load_benchmark_sentences(inputs)
+    if not sentences: raise ValueError("no sentence audio found in inputs")
+    audios = [_load_audio(path) for path, _ in sentences]
+    audio_seconds = sum(len(a) for a in audios) / 16000
+    print(f"--- Whisper 벤치마크: {len(sentences)}문장, {audio_seconds:.1f}s, 기준 {reference} ---")
+
+    if reference == "forced":
+        from functions import forced_alignment
+        model = forced_alignment.load_alignment_model(device)
+        reference_words = [forced_alignment.align_transcript(path, text, model, device, audio=audio) for (path, text), audio in zip(sentences, audios)]
+        del model
+    else:
+        ref_runtime, ref_size = reference.split(":", 1)
+        _, _, reference_words = _run_candidate(sentences, audios, ref_runtime, ref_size, device, language, None)
+    reference_times = [_anchored_token_times(words, text)[0] for words, (_, text) in zip(reference_words, sentences)]
+
+    results = []
+    for size in sizes:
+        try: load_seconds, transcribe_seconds, words = _run_candidate(sentences, audios, runtime, size, device, language, compute_type)
+        except Exception as e: print(f"  [{runtime}:{size}] 실패: {e}", file=sys.stderr); traceback.print_exc(); continue
+        errors, anchored_tokens, total_tokens = [], 0, 0
+        for sentence_words, (_, text), ref_times in zip(words, sentences, reference_times):
+            times, token_count = _anchored_token_times(sentence_words, text)
+            anchored_tokens += len(times); total_tokens += token_count
+            errors.extend((abs(s - ref_times[i][0]) + abs(e - ref_times[i][1])) / 2 for i, (s, e) in times.items() if i in ref_times)
+        error_ms = round(sum(errors) / len(errors) * 1000, 1) if errors else None
+        coverage = round(anchored_tokens / total_tokens, 4) if total_tokens else 0.0
+        results.append({
+            "runtime": runtime, "size": size, "compute_type": (compute_type or default_compute_type(device)) if runtime == "faster" else None,
+            "load_seconds": round(load_seconds, 2), "transcribe_seconds": round(transcribe_seconds, 2),
+            "realtime_factor": round(audio_seconds / transcribe_seconds, 1) if transcribe_seconds > 0 else None,
+            "boundary_error_ms": error_ms, "anchor_coverage": coverage,
+            "passes": error_ms is not None and error_ms <= threshold_ms and coverage >= min_coverage,
+        })
+        print(f"  [{runtime}:{size}] {results[-1]}")
+    passing = sorted((r for r in results if r["passes"]), key=lambda r: r["transcribe_seconds"])
+    return {"reference": reference, "device": str(device), "language": language, "sentences": len(sentences),
+            "audio_seconds": round(audio_seconds, 1), "threshold_ms": threshold_ms, "min_coverage": min_coverage,
+            "recommended": {"runtime": passing[0]["runtime"], "size": passing[0]["size"]} if passing else None, "results": results}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Whisper 런타임/모델 크기별 단어 경계 정확도 vs 속도 벤치마크")
+    parser.add_argument("inputs", nargs="+", help="5단계가 끝난 에피소드 디렉토리 또는 audio_timestamps_output.json")
+    parser.add_argument("--runtime", default="faster", choices=WHISPER_RUNTIMES)
+    parser.add_argument("--sizes", nargs="+", default=list(WHISPER_SIZES))
+    parser.add_argument("--reference", default="openai:large", help="기준: runtime:size 또는 forced")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--language", default="ko")
+    parser.add_argument("--compute-type", default=None, help="faster 런타임 연산 타입 (기본 CPU int8 / CUDA float16)")
+    parser.add_argument("--threshold-ms", type=float, default=80.0, help="허용 평균 단어 경계 오차 (ms)")
+    parser.add_argument("--min-coverage", type=float, default=0.9, help="최소 1:1 Anchor 토큰 비율")
+    parser.add_argument("--channel-dir", default=None, help=f"결과를 채널의 {BENCHMARK_FILENAME}에 저장 (whisper_model_size: auto)")
+    args = parser.parse_args(argv)
+
+    device = args.device
+    try:
+        import torch
+        device = torch.device(args.device)
+    except ImportError: pass
+    try:
+        report = benchmark(args.inputs, args.runtime, args.sizes, args.reference, device, args.language, args.compute_type,
+                           args.threshold_ms, args.min_coverage)
+    except (ValueError, ImportError) as e: print(f"오류: {e}"); return 1
+    print(f"{'candidate':<16}{'transcribe s':>14}{'x realtime':>12}{'error ms':>10}{'coverage':>10}{'pass':>6}")
+    for r in report["results"]:
+        print(f"{r['runtime'] + ':' + r['size']:<16}{r['transcribe_seconds']:>14}{str(r['realtime_factor']):>12}"
+              f"{str(r['boundary_error_ms']):>10}{r['anchor_coverage']:>10}{'O' if r['passes'] else 'X':>6}")
+    print(f"추천: {report['recommended']}")
+    if args.channel_dir:
+        out_path = os.path.join(args.channel_dir, BENCHMARK_FILENAME)
+        with open(out_path, 'w', encoding='utf-8') as f: json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"저장: {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
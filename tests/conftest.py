@@ -0,0 +1,6 @@
+# PaMin/tests/conftest.py
+# 저장소 루트를 import 경로에 추가 (`pytest`를 어느 디렉토리에서 실행해도 `functions` 패키지를 찾도록)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
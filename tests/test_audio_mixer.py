@@ -0,0 +1,56 @@
+# PaMin/tests/test_audio_mixer.py
+# BGM 더킹 엔벨로프 (functions/audio_mixer.build_duck_envelope)
+import numpy as np
+import pytest
+
+from functions.audio_mixer import build_duck_envelope
+from functions.render_timeline import TimelineEvent
+
+SR = 1000 # 테스트용 샘플레이트 (1 샘플 = 1ms)
+
+
+def _envelope(attack=0.08, release=0.35, padding=0.0, duck_gain=0.5):
+    return build_duck_envelope([TimelineEvent(1.0, 0.5, 0)], 3 * SR, SR, duck_gain, attack, release, padding)
+
+
+def _at(env, seconds):
+    return float(env[int(round(seconds * SR))])
+
+
+def test_envelope_is_unity_before_speech_and_does_not_pre_duck():
+    env = _envelope()
+    assert len(env) == 3 * SR
+    assert _at(env, 0.5) == pytest.approx(1.0)
+    assert _at(env, 0.99) == pytest.approx(1.0) # 발화 전에 미리 내려가지 않음 (인과적)
+
+
+def test_envelope_attack_reaches_duck_gain():
+    env = _envelope()
+    assert 0.5 < _at(env, 1.04) < 1.0
+    assert _at(env, 1.1) == pytest.approx(0.5)
+    assert _at(env, 1.45) == pytest.approx(0.5)
+
+
+def test_envelope_release_ramps_back_over_release_time():
+    env = _envelope(release=0.35)
+    recovery = [_at(env, 1.5 + t) for t in (0.05, 0.1, 0.2, 0.3)]
+    assert all(a < b for a, b in zip(recovery, recovery[1:])) # 단조 증가 복귀 (유지 후 점프가 아님)
+    assert recovery[0] < 0.7 and recovery[-1] < 1.0
+    assert _at(env, 1.9) == pytest.approx(1.0)
+
+
+def test_longer_release_recovers_slower():
+    fast, slow = _envelope(release=0.1), _envelope(release=0.6)
+    assert _at(fast, 1.65) == pytest.approx(1.0)
+    assert _at(slow, 1.65) < 0.7
+
+
+def test_padding_extends_ducked_region():
+    env = _envelope(padding=0.1, attack=0.0)
+    assert _at(env, 0.95) == pytest.approx(0.5)
+    assert _at(env, 1.55) == pytest.approx(0.5)
+
+
+def test_no_speech_keeps_unity_gain():
+    env = build_duck_envelope([], SR, SR, 0.5, 0.08, 0.35, 0.05)
+    assert np.allclose(env, 1.0)
@@ -0,0 +1,46 @@
+# PaMin/tests/test_segment_render.py
+# 증분 재렌더 세그먼트 계획 (functions/segment_render.plan_segments)
+import pytest
+
+pytest.importorskip("PIL") # segment_render -> render_cache (PIL)
+
+from functions.render_timeline import Timeline
+from functions.segment_render import plan_segments
+
+
+def _timeline(starts, total_duration):
+    timeline = Timeline(total_duration)
+    timeline.sentence_starts = list(starts)
+    timeline.sentence_durations = [b - a for a, b in zip(starts, list(starts[1:]) + [total_duration])]
+    return timeline
+
+
+def _assert_contiguous(segments, total_frames):
+    assert segments[0]["start_frame"] == 0 and segments[-1]["end_frame"] == total_frames
+    for a, b in zip(segments, segments[1:]): assert a["end_frame"] == b["start_frame"]
+    assert all(seg["end_frame"] > seg["start_frame"] for seg in segments)
+
+
+def test_plan_segments_one_per_sentence():
+    segments = plan_segments(_timeline([0.0, 1.0, 2.5], 4.0), fps=30)
+    assert [seg["sentences"] for seg in segments] == [[0], [1], [2]]
+    assert [(seg["start_frame"], seg["end_frame"]) for seg in segments] == [(0, 30), (30, 75), (75, 120)]
+
+
+def test_plan_segments_merges_zero_frame_sentence_into_next():
+    # 문장 1은 1/100초 길이라 30fps에서 0프레임 -> 다음 세그먼트에 합쳐짐
+    segments = plan_segments(_timeline([0.0, 1.0, 1.01, 2.0], 3.0), fps=30)
+    _assert_contiguous(segments, 90)
+    assert [seg["sentences"] for seg in segments] == [[0], [1, 2], [3]]
+
+
+def test_plan_segments_zero_frame_last_sentence_joins_previous():
+    segments = plan_segments(_timeline([0.0, 1.0, 2.0], 2.0), fps=30)
+    _assert_contiguous(segments, 60)
+    assert sorted(i for seg in segments for i in seg["sentences"]) == [0, 1, 2]
+
+
+def test_plan_segments_all_zero_frame_sentences():
+    segments = plan_segments(_timeline([0.0, 0.0], 0.5), fps=30)
+    _assert_contiguous(segments, 15)
+    assert sorted(i for seg in segments for i in seg["sentences"]) == [0, 1]
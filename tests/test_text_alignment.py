@@ -0,0 +1,69 @@
+# PaMin/tests/test_text_alignment.py
+# 자막 정렬 엔진 (functions/text_alignment.py) - 모델 없이 numpy + rapidfuzz만으로 실행
+import pytest
+
+pytest.importorskip("rapidfuzz")
+
+from functions import text_alignment
+
+
+def _words(*items):
+    """(단어, 시작, 끝) 목록 -> Whisper 단어 dict 목록."""
+    return [{"word": w, "start": s, "end": e, "duration": round(e - s, 3), "confidence": 0.9} for w, s, e in items]
+
+
+def _flatten(assignments):
+    return [w["word"] for chunk in assignments for w in chunk]
+
+
+def test_align_sentence_exact_match_assigns_each_chunk():
+    words = _words(("오늘은", 0.0, 0.4), ("날씨가", 0.5, 0.9), ("좋습니다", 1.0, 1.6))
+    assignments, segments = text_alignment.align_sentence(words, ["오늘은 날씨가", "좋습니다"], "오늘은 날씨가 좋습니다.")
+    assert [[w["word"] for w in chunk] for chunk in assignments] == [["오늘은", "날씨가"], ["좋습니다"]]
+    assert "".join(seg["text"] for seg in segments) == "오늘은 날씨가 좋습니다."
+    assert segments[0]["start"] == 0.0 and segments[-1]["end"] == pytest.approx(1.6)
+
+
+def test_align_sentence_spoken_form_anchors_number_token():
+    # TTS는 '3개'를 '세개'로 읽으므로 Whisper도 '세개'를 돌려줌: 발음 표기로 비교해야 1:1 매칭
+    spoken = {"3개가": "세개가"}.get
+    words = _words(("사과", 0.0, 0.3), ("세개가", 0.4, 0.9), ("있다", 1.0, 1.3))
+    tokens = ["사과", "3개가", "있다"]
+    without = text_alignment._similarity_matrix([w["word"] for w in words], tokens)
+    with_spoken = text_alignment._similarity_matrix([w["word"] for w in words], tokens, [spoken(t, t) for t in tokens])
+    assert with_spoken[1, 1] >= text_alignment.HIGH_THRESHOLD > without[1, 1]
+
+    assignments, segments = text_alignment.align_sentence(words, ["사과 3개가", "있다"], "사과 3개가 있다", spoken_form=lambda t: spoken(t, t))
+    assert [[w["word"] for w in chunk] for chunk in assignments] == [["사과", "세개가"], ["있다"]]
+    number_segment = next(seg for seg in segments if "3" in seg["text"])
+    assert (number_segment["start"], number_segment["end"]) == (0.4, 0.9)
+
+
+@pytest.mark.parametrize("words", [
+    # Whisper가 토큰 하나를 두 단어로 쪼갠 경우 (단어 > 토큰)
+    _words(("안녕", 0.0, 0.2), ("하세요", 0.2, 0.6), ("여러분", 0.7, 1.1), ("반갑습니다", 1.2, 1.8)),
+    # Whisper가 두 토큰을 한 단어로 합치고 하나를 빠뜨린 경우 (단어 < 토큰)
+    _words(("안녕하세요여러분", 0.0, 1.1)),
+])
+def test_align_sentence_length_mismatch_keeps_every_word_in_order(words):
+    chunk_texts = ["안녕하세요 여러분", "반갑습니다"]
+    sentence = "안녕하세요 여러분, 반갑습니다!"
+    assignments, segments = text_alignment.align_sentence(words, chunk_texts, sentence)
+    assert len(assignments) == len(chunk_texts)
+    assert _flatten(assignments) == [w["word"] for w in words] # 모든 단어가 순서대로 정확히 한 번 배정
+    assert "".join(seg["text"] for seg in segments) == sentence
+    ends = [seg["end"] for seg in segments] # 한 Context Gap 안의 구두점(insert)은 직전 끝에 놓이므로 시작은 겹칠 수 있음
+    assert ends == sorted(ends)
+    assert all(0.0 <= seg["start"] <= seg["end"] <= words[-1]["end"] for seg in segments)
+
+
+def test_align_sentence_empty_inputs():
+    assert text_alignment.align_sentence([], ["a b"], "a b") == ([[]], [])
+    assert text_alignment.align_sentence(_words(("a", 0.0, 0.1)), [""], "") == ([[]], [])
+
+
+def test_align_path_handles_extreme_length_difference():
+    words = _words(*[(f"w{i}", i * 0.1, i * 0.1 + 0.05) for i in range(2)])
+    tokens = [f"t{i}" for i in range(60)] # 밴드가 끝점에 닿지 않는 경우
+    segments = text_alignment.align_words_to_tokens(words, tokens)
+    assert " ".join(seg["text"] for seg in segments).split() == tokens
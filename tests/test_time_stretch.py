@@ -0,0 +1,57 @@
+# PaMin/tests/test_time_stretch.py
+# 속도 조절 백엔드 (functions/time_stretch.py) - NumPy WSOLA와 에피소드 분할/타임스탬프 환산
+import numpy as np
+import pytest
+
+from functions import time_stretch
+
+
+def _sine(freq, seconds, sr):
+    return np.sin(2 * np.pi * freq * np.arange(int(seconds * sr)) / sr).astype(np.float32)
+
+
+def _peak_frequency(y, sr):
+    segment = y[len(y) // 4: len(y) // 4 + sr // 4] * np.hanning(sr // 4)
+    spectrum = np.abs(np.fft.rfft(segment, 16 * len(segment)))
+    return np.argmax(spectrum) * sr / (16 * len(segment))
+
+
+@pytest.mark.parametrize("sr", [24000, 44100])
+@pytest.mark.parametrize("rate", [0.8, 1.2, 1.5, 2.0, 2.5])
+def test_wsola_output_length_and_pitch(sr, rate):
+    y = _sine(220.0, 2.0, sr)
+    out = time_stretch._stretch_wsola(y, rate, sr)
+    assert len(out) == int(np.ceil(len(y) / rate))
+    assert _peak_frequency(out, sr) == pytest.approx(220.0, abs=3.0)
+    assert np.abs(out).max() <= 1.05 # 중첩 가산 정규화
+
+
+def test_stretch_identity_and_unknown_backend_fallback():
+    y = _sine(220.0, 0.5, 16000)
+    assert np.array_equal(time_stretch.stretch(y, 1.0, 16000, "wsola"), y)
+    assert len(time_stretch.stretch(np.zeros(0, dtype=np.float32), 1.5, 16000, "wsola")) == 0
+
+
+def test_recommended_rate_range():
+    assert time_stretch.recommended_rate_range("wsola") == (0.5, 2.0)
+    assert time_stretch.recommended_rate_range("atempo") is None
+
+
+def test_atempo_chain_splits_out_of_range_factors():
+    assert time_stretch._atempo_chain(1.25) == "atempo=1.250000"
+    assert time_stretch._atempo_chain(5.0) == "atempo=2.000000,atempo=2.000000,atempo=1.250000"
+    assert time_stretch._atempo_chain(0.2) == "atempo=0.500000,atempo=0.500000,atempo=0.800000"
+
+
+def test_stretch_concatenated_splits_back_per_sentence():
+    sr = 16000; rate = 1.25
+    arrays = [_sine(220.0, 1.0, sr), _sine(330.0, 0.5, sr), _sine(440.0, 2.0, sr)]
+    pieces, scale = time_stretch.stretch_concatenated(arrays, rate, sr, "wsola")
+    assert scale == pytest.approx(1.0 / rate, rel=0.01)
+    for original, piece in zip(arrays, pieces):
+        assert len(piece) == pytest.approx(len(original) / rate, abs=2)
+
+
+def test_rescale_word_timestamps():
+    words = [{"word": "a", "start": 1.0, "end": 2.0, "duration": 1.0, "confidence": 0.9}]
+    assert time_stretch.rescale_word_timestamps(words, 0.8) == [{"word": "a", "start": 0.8, "end": 1.6, "duration": 0.8, "confidence": 0.9}]
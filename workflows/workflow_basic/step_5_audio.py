@@ -143,6 +143,7 @@ def render_step(session_state, channels_root_dir, episode_info, workflow_definit
             st.success("✅ AUTO 모드: 음성 생성 및 타임스탬프 매핑 완료!")
             st.info(f"결과 파일: `{final_output_json_path}`")
             st.info(f"생성된 오디오 파일 경로: `{episode_audio_output_dir}`")
+            show_tts_cache_stats(final_output_json_path)
 
             next_step_number = get_next_step_number(workflow_definition, session_state.current_step)
             if next_step_number:
@@ -158,6 +159,7 @@ def render_step(session_state, channels_root_dir, episode_info, workflow_definit
     # MANUAL 모드
     elif session_state.mode == 'MANUAL':
         st.subheader("수동 음성 생성 및 확인")
+        show_model_registry()
 
         # 생성 시작/재생성 버튼
         generate_button_label = "🔄 음성 생성/재생성" if session_state.audio_generation_triggered else "▶️ 음성 생성 시작"
@@ -193,6 +195,7 @@ def render_step(session_state, channels_root_dir, episode_info, workflow_definit
             st.success("✅ 음성 생성 및 타임스탬프 매핑 완료!")
             st.info(f"결과 파일: `{final_output_json_path}`")
             st.info(f"생성된 오디오 파일 경로: `{episode_audio_output_dir}`")
+            show_tts_cache_stats(final_output_json_path)
 
             # 결과 데이터 로드 및 표시
             if session_state.audio_data_for_display is None:
@@ -221,7 +224,8 @@ def render_step(session_state, channels_root_dir, episode_info, workflow_definit
                              with open(audio_path, 'rb') as audio_file:
                                  audio_bytes = audio_file.read()
                              st.audio(audio_bytes, format='audio/wav') # WAV 형식 지정
-                             st.caption(f"길이: {sentence_data.get('sentence_duration', 0):.2f}초 | 파일: {os.path.basename(audio_path)}")
+                             cache_label = " | 캐시 재사용" if sentence_data.get('tts_cache_hit') else ""
+                             st.caption(f"길이: {sentence_data.get('sentence_duration', 0):.2f}초 | 파일: {os.path.basename(audio_path)}{cache_label}")
 
                              # (선택 사항) 단어 타임스탬프 표시
                              with st.expander("단어별 타임스탬프 보기"):
@@ -273,6 +277,34 @@ def render_step(session_state, channels_root_dir, episode_info, workflow_definit
 
 
 # --- Helper functions (다른 스텝 파일에서 복사 또는 공통 유틸리티로 분리 가능) ---
+def show_tts_cache_stats(final_output_json_path):
+     """결과 JSON의 문장 TTS 캐시 적중/미스 통계를 표시합니다 (통계가 없는 이전 결과 파일은 표시 생략)."""
+     try:
+          with open(final_output_json_path, 'r', encoding='utf-8') as f:
+               stats = json.load(f).get("tts_cache_stats")
+     except Exception:
+          return
+     if not stats: return
+     hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+     col1, col2, col3 = st.columns(3)
+     col1.metric("문장 캐시 재사용", f"{hits}개")
+     col2.metric("새로 생성 (TTS + Whisper)", f"{misses}개")
+     col3.metric("캐시 적중률", f"{hits / (hits + misses) * 100:.0f}%" if hits + misses else "-")
+
+def show_model_registry():
+     """프로세스에 로드된 TTS/ASR 모델과 메모리 사용량을 표시하고 해제 버튼을 제공합니다."""
+     model_registry = getattr(audio_generation, "model_registry", None) if libraries_available_flag else None
+     if model_registry is None: return
+     loaded = model_registry.registry.loaded()
+     with st.expander(f"🧠 로드된 모델 ({len(loaded)}개, {model_registry.registry.total_bytes / (1 << 30):.2f} GB)"):
+          for entry in loaded:
+               kind, name, device, precision = entry["key"]
+               st.caption(f"{kind} `{name}` | {device} | {precision} | {entry['bytes'] / (1 << 20):.0f} MB")
+          if not loaded: st.caption("로드된 모델 없음 (첫 음성 생성 시 로드)")
+          elif st.button("모델 메모리 해제", key="unload_audio_models_button"):
+               model_registry.registry.unload_all()
+               st.rerun()
+
 def get_next_step_number(workflow_definition, current_step_num):
     """워크플로우 정의에서 현재 단계 다음 단계의 번호를 찾습니다."""
     steps_list = workflow_definition.get("steps", [])
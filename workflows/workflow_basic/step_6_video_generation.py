@@ -76,6 +76,8 @@ def render_step(session_state, channels_root_dir, episode_info, workflow_definit
                     'bgm_volume_factor': 0.20,
                  }
                  st.info("채널 정의에 'videoTemplateConfig'가 없어 기본 설정을 사용합니다.")
+            video_config = dict(video_config)
+            video_config['channel_dir'] = channel_dir # 채널 렌더 캐시(render_cache/) 공유
             base_video_path_config = os.path.join(channel_dir, "base_video.mp4")
             bgm_path_config = os.path.join(channel_dir, "bgm.mp3")
         except Exception as e:
@@ -119,6 +121,7 @@ def render_step(session_state, channels_root_dir, episode_info, workflow_definit
 
     final_video_filename = f"final_shorts_{episode_info.get('episode_id')}.mp4"
     final_video_output_path = os.path.join(episode_path, final_video_filename)
+    preview_video_output_path = os.path.join(episode_path, f"preview_shorts_{episode_info.get('episode_id')}.mp4")
 
     if not os.path.exists(processed_data_json_path):
         st.error(f"❌ 오류: 비디오 생성을 위한 처리된 데이터 파일({processed_data_json_filename})을 찾을 수 없습니다.")
@@ -145,6 +148,8 @@ def render_step(session_state, channels_root_dir, episode_info, workflow_definit
         session_state.video_generation_result = None
     if 'final_video_path_state' not in session_state:
         session_state.final_video_path_state = None
+    if 'video_preview_path_state' not in session_state:
+        session_state.video_preview_path_state = None
 
     if session_state.mode == 'AUTO':
         if not session_state.video_generation_triggered or session_state.video_generation_result is False:
@@ -182,6 +187,35 @@ def render_step(session_state, channels_root_dir, episode_info, workflow_definit
                  complete_workflow_manual_mode(session_state, channels_root_dir)
 
     elif session_state.mode == 'MANUAL':
+        st.subheader("빠른 미리보기")
+        st.caption("저해상도·저FPS·BGM 없이 빠르게 렌더링하여 시각 자료/자막 타이밍을 확인합니다.")
+        if st.button("👀 미리보기 생성", key="manual_preview_video_button"):
+            session_state.video_preview_path_state = None
+            with st.spinner("미리보기 영상 렌더링 중..."):
+                try:
+                    preview_success = generate_complete_video_func(
+                        config=video_config,
+                        json_data_path=processed_data_json_path,
+                        base_video_path=base_video_path_config,
+                        bgm_path=bgm_path_config,
+                        output_path=preview_video_output_path,
+                        video_title_from_script=llm_generated_title,
+                        preview=True
+                    )
+                    if preview_success:
+                        session_state.video_preview_path_state = preview_video_output_path
+                    else:
+                        st.error("❌ 미리보기 생성 중 오류가 발생했습니다. 오류 로그를 확인하세요.")
+                except Exception as e:
+                    st.error(f"❌ 미리보기 생성 중 심각한 오류 발생: {e}")
+                    st.exception(e)
+        if session_state.video_preview_path_state and os.path.exists(session_state.video_preview_path_state):
+            try:
+                st.video(session_state.video_preview_path_state)
+            except Exception as e:
+                st.error(f"미리보기 표시 중 오류: {e}")
+        st.markdown("---")
+
         st.subheader("수동 최종 영상 생성")
         generate_button_label = "🔄 최종 영상 재생성" if session_state.video_generation_triggered else "▶️ 최종 영상 생성 시작"
         if st.button(generate_button_label, key="manual_generate_video_button"):
@@ -274,7 +308,7 @@ def complete_workflow_manual_mode(session_state, channels_root_dir):
                    'current_episode_info', 'generated_visual_plan', 'processed_visual_plan_final',
                    'image_processing_triggered', 'manual_selections', 'audio_generation_triggered',
                    'audio_generation_result', 'audio_data_for_display', 'video_generation_triggered',
-                   'video_generation_result', 'final_video_path_state'
+                   'video_generation_result', 'final_video_path_state', 'video_preview_path_state'
                ]
                for key in keys_to_reset:
                     if key in session_state: